@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tasks.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,10 +83,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections for a minute instead of opening one per request
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL: readers don't wait for the writer and a commit appends to the
+            # log instead of rewriting pages, NORMAL syncs at checkpoints only
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            # writers queue for the lock when their transaction begins, for up
+            # to timeout seconds, instead of failing when a read turns into a write
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# "analysis" holds /api/tasks/analyze/ results. LocMemCache is per process and
+# drops the least recently used entries past MAX_ENTRIES; with REDIS_URL set
+# every worker shares Redis (give it a maxmemory and maxmemory-policy allkeys-lru)
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "analysis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "TIMEOUT": 7 * 24 * 3600,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "analysis",
+        "TIMEOUT": 7 * 24 * 3600,
+        "OPTIONS": {"MAX_ENTRIES": 500, "CULL_FREQUENCY": 10},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,3 +164,22 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Worker processes for /api/tasks/analyze_batch/, None uses every core
+ANALYZE_BATCH_WORKERS = None
+
+# Per stage timings in a Server-Timing header and /api/tasks/metrics/ histograms
+TASK_TIMING = False
+
+# Extra ?mode= values, {name: {"urgency": w, "importance": w, "effort": w, "dependency": w}},
+# optionally with "downstream": w
+TASK_WEIGHT_MODES = {}
+
+# POST /api/tasks/add/ answers once the task is queued, a thread writes the
+# queue in batches of up to TASK_WRITE_BEHIND_BATCH tasks, one commit each,
+# waiting up to TASK_WRITE_BEHIND_DELAY seconds for a batch to fill
+TASK_WRITE_BEHIND = False
+TASK_WRITE_BEHIND_QUEUE = 10000
+TASK_WRITE_BEHIND_BATCH = 500
+TASK_WRITE_BEHIND_DELAY = 0.005
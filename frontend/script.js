@@ -224,6 +224,7 @@ async function clearAllTasks() {
 
     document.getElementById("taskList").innerHTML = "";
     showEmptyMessage();
+    document.getElementById("loadMore").hidden = true;
     clearError()
   } catch (e) {
     showError(e.message);
@@ -280,7 +281,7 @@ async function suggest(){
 
     if (!res.ok) throw new Error(json.error || "Suggestion failed");
 
-    renderResults(json.top_3 || []);
+    renderResults(json.top || []);
 
   } catch (err) {
     showError(err.message);
@@ -288,16 +289,33 @@ async function suggest(){
 
 }
 
-async function loadTasks() {
+const PAGE_SIZE = 100;
+let nextTasksPage = null;
+
+async function loadTasks(after) {
   try {
-    const res = await fetch(API + "/list/");
+    let url = API + `/list/?limit=${PAGE_SIZE}`;
+    if (after) url += `&after=${after}`;
+
+    const res = await fetch(url);
     const json = await res.json();
     if (!res.ok) throw new Error(json.error || "Failed to load");
 
-    renderTasks(json.tasks || []);
+    if (after) {
+      (json.tasks || []).forEach(task => appendTask(task));
+    } else {
+      renderTasks(json.tasks || []);
+    }
+
+    nextTasksPage = json.next;
+    document.getElementById("loadMore").hidden = !nextTasksPage;
   } catch (e) {
     showError(e.message);
   }
 }
 
+function loadMoreTasks() {
+  if (nextTasksPage) loadTasks(nextTasksPage);
+}
+
 loadTasks();
\ No newline at end of file
@@ -1,6 +1,57 @@
 from django.contrib import admin
-from .models import Task
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
+from .models import Task, TaskDependency
+from .dag import dependency_index
+from .scoring import CycleError
+from . import store
 
-admin.site.register(Task)
 
-# Register your models here.
+class DependencyFormSet(BaseInlineFormSet):
+
+    def clean(self):
+        # reject edges closing a cycle here, instead of failing every read after
+        super().clean()
+        if self.instance.pk is None:
+            return
+
+        deps = [
+            form.cleaned_data["depends_on"].pk
+            for form in self.forms
+            if form.cleaned_data.get("depends_on") and not form.cleaned_data.get("DELETE")
+        ]
+        try:
+            dependency_index().check_edges(self.instance.pk, deps)
+        except CycleError as e:
+            raise ValidationError(f"Circular dependency detected: {e}")
+
+
+class TaskDependencyInline(admin.TabularInline):
+    model = TaskDependency
+    formset = DependencyFormSet
+    fk_name = "task"
+    extra = 0
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    inlines = [TaskDependencyInline]
+
+    # admin edits can change anything about a task,
+    # so the materialized scores are rebuilt on the next read
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        store.invalidate()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        store.invalidate()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        store.invalidate()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        store.invalidate()
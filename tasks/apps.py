@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from django.conf import settings
+        from .scoring import register_weight_mode
+
+        for name, weights in getattr(settings, "TASK_WEIGHT_MODES", {}).items():
+            register_weight_mode(name, weights)
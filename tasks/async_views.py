@@ -0,0 +1,240 @@
+"""
+Async versions of the database backed views, for ASGI servers.
+
+They take the same query strings and send the same responses, ETags
+included, as the sync views, whose parsing and response building they
+share. Queries go through Django's async ORM: the task and edges of an
+add, the rows of list and the rows a full ranking or suggestion scores.
+The CPU bound part, scoring and serializing a ranking, runs on a thread
+of its own (sync_to_async with thread_sensitive=False) instead of the
+single thread every thread sensitive call, the ORM's included, waits
+for, so requests still reading don't queue behind it.
+
+What is only DB bound stays on that thread through sync_to_async: pages
+and the sql engine, the stored suggestions read off an index, the write
+behind queue and the updates a stored write makes to the scores.
+"""
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+
+from . import ingest
+from .dag import dependency_index, bump_version
+from .models import Task, TaskDependency, TaskScore
+from .scoring import validate_tasks, ValidationError, CycleError
+from .store import (
+    URGENCY_FIELDS, chunks, clean_dependency_ids, require_found, ensure_scored, rank_rows_modes,
+    record_created_task, scored_rows, task_rows, with_dependencies, edge_queries, group_edges,
+    list_rows, list_result
+)
+from .timing import stage
+from .views import (
+    SCORING_ENGINES, table_etag, store_task, as_of_date, db_ranking_query, db_ranking_options,
+    db_page, page_response, db_rankings_response, rank_db_modes, rank_loaded_modes, top_db_tasks,
+    top_loaded_tasks, suggest_query, suggest_body, list_query
+)
+
+
+def conditional(view):
+    """
+    condition(etag_func=table_etag) for an async view: the ETag reads the
+    table version (and flushes the write behind queue), in a thread
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        etag = quote_etag(await sync_to_async(table_etag)(request))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ("GET", "HEAD"):
+            response.headers.setdefault("ETag", etag)
+        return response
+    return inner
+
+def in_thread(func):
+    # CPU bound work without database access, off the thread sensitive thread
+    return sync_to_async(func, thread_sensitive=False)
+
+async def load_tasks():
+    """
+    store.load_tasks on the async ORM.
+    Return: (tasks, the dependency index they were completed from)
+    """
+    tasks = [task async for task in task_rows()]
+    # synced after the rows so it knows every one of them
+    index = await sync_to_async(dependency_index)()
+    return with_dependencies(tasks, index.deps), index
+
+async def create_task(task):
+    """
+    Insert a validated task whose dependencies are stored tasks, row and
+    edges on the async ORM (which has no transactions, see
+    store.record_created_task). Return: its id, raises ValidationError
+    """
+    deps = clean_dependency_ids(task.dependencies)
+    found = {
+        task_id
+        for chunk in chunks(deps)
+        async for task_id in Task.objects.filter(id__in=chunk).values_list("id", flat=True)
+    }
+    require_found(deps, found)
+
+    obj = await Task.objects.acreate(
+        title=task.title,
+        due_date=task.due_date,
+        estimated_hours=task.estimated_hours,
+        importance=task.importance
+    )
+    try:
+        await TaskDependency.objects.abulk_create(
+            [TaskDependency(task_id=obj.id, depends_on_id=dep) for dep in deps], batch_size=1000
+        )
+    except IntegrityError:
+        # a dependency was deleted after the check above, the task goes too
+        await obj.adelete()
+        await sync_to_async(bump_version)()
+        raise ValidationError("unknown dependency")
+
+    await sync_to_async(record_created_task)({**task, "id": obj.id, "dependencies": deps})
+    return obj.id
+
+async def rank_stored_modes(modes, engine, as_of):
+    """
+    views.rank_db_modes with the rows read on the async ORM and ranked
+    on a thread of their own. sql ranks in the database
+    """
+    if engine == "sql":
+        return await sync_to_async(rank_db_modes)(modes, engine, as_of)
+
+    if engine == "stored":
+        await sync_to_async(ensure_scored)()
+        with stage("fetch"):
+            rows = [row async for row in scored_rows()]
+            index = await sync_to_async(dependency_index)()
+        rankings, warnings, valid_until, expired = await in_thread(rank_rows_modes)(rows, modes, as_of, index.deps)
+        with stage("save"):
+            await TaskScore.objects.abulk_update(expired, URGENCY_FIELDS, batch_size=1000)
+        return rankings, warnings, valid_until
+
+    tasks, index = await load_tasks()
+    # the depths are computed on first use
+    return await in_thread(lambda: rank_loaded_modes(tasks, modes, engine, as_of, index.depths))()
+
+
+@csrf_exempt
+async def add_task(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        raw_data = data.get("task")
+        if not raw_data:
+            return JsonResponse({"message": "No task provided"})
+
+        tasks, Warnings = validate_tasks([raw_data], require_id=False)
+        if ingest.enabled():
+            return await sync_to_async(store_task)(tasks[0], Warnings)
+
+        return JsonResponse({
+            "message": 'Task added successfully',
+            "id": await create_task(tasks[0]),
+            "Warnings": Warnings
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+@csrf_exempt
+@cache_control(no_cache=True)
+@conditional
+async def analyze_db(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET allowed"}, status=405)
+
+    try:
+        modes, multiple, engine = db_ranking_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if not await Task.objects.aexists():
+        return JsonResponse({"ranked_tasks": [], "message": "No tasks available"}, status=200)
+
+    try:
+        fmt, dates, as_of, limit = db_ranking_options(request, multiple, engine)
+        if limit is not None:
+            page = await sync_to_async(db_page)(request, modes[0], engine, as_of, limit)
+            return page_response(modes[0], page, fmt, dates)
+
+        result = await rank_stored_modes(modes, engine, as_of)
+        return await in_thread(db_rankings_response)(modes, multiple, result, fmt, dates)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except CycleError as e:
+        return JsonResponse({"error": f"Circular dependency detected: {e}"}, status=400)
+
+    except Exception as e:
+        return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
+
+@csrf_exempt
+@cache_control(no_cache=True)
+@conditional
+async def suggest_tasks(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET allowed"}, status=405)
+
+    try:
+        mode, engine, k = suggest_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if not await Task.objects.aexists():
+        return JsonResponse({"k": k, "top": [], f"top_{k}": [], "message": "No tasks available"}, status=200)
+
+    try:
+        as_of = as_of_date(request)
+        if engine in SCORING_ENGINES:
+            tasks, index = await load_tasks()
+            result = await in_thread(lambda: top_loaded_tasks(tasks, mode, engine, k, as_of, index.depths))()
+        else:
+            result = await sync_to_async(top_db_tasks)(mode, engine, k, as_of)
+        return suggest_body(mode, k, *result)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except CycleError as e:
+        return JsonResponse({"error": f"Circular dependency detected: {e}"}, status=400)
+
+    except Exception as e:
+        return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
+
+@csrf_exempt
+@cache_control(no_cache=True)
+@conditional
+async def list_tasks(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET allowed"}, status=405)
+
+    try:
+        limit, after = list_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if limit is None:
+        tasks, _ = await load_tasks()
+        return JsonResponse({"tasks": tasks})
+
+    tasks = [task async for task in list_rows(limit, after)]
+    ids = [task["id"] for task in tasks[:limit]]
+    deps = group_edges([edge for query in edge_queries(ids) async for edge in query])
+    tasks, next_after = list_result(tasks, limit, deps)
+    return JsonResponse({"tasks": tasks, "next": next_after})
@@ -0,0 +1,117 @@
+"""
+Scoring of many independent task lists across a pool of worker processes.
+
+Each set is validated, cycle checked and scored on its own in a worker, so
+a bad set only fails itself and the work spreads over every core. Nothing
+here touches the database, workers don't need Django set up.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .scoring import WEIGHT_METHOD, register_weight_mode, ranking_expires, validate_tasks, score_tasks, score_tasks_modes, build_graph, detect_cycle, ValidationError, CycleError
+from .vectorized import score_tasks_vectorized, score_tasks_vectorized_modes
+
+# ?engine= selects how the ranking is computed, both give the same output
+SCORING_ENGINES = {
+    "python": score_tasks,
+    "vectorized": score_tasks_vectorized
+}
+
+# the same engines ranking for a list of modes at once, {mode: ranked}
+MULTI_MODE_ENGINES = {
+    "python": score_tasks_modes,
+    "vectorized": score_tasks_vectorized_modes
+}
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def analyze_set(tasks, mode="smart", engine="python", as_of=None):
+    """
+    Validate, cycle check and rank one task list.
+    Return: {"warnings", "ranked_tasks"} or {"error"}, never raises
+    """
+    try:
+        if not isinstance(tasks, list):
+            raise ValidationError("Tasks must be a list")
+        if not tasks:
+            return {"warnings": [], "valid_until": None, "ranked_tasks": []}
+
+        tasks, Warnings = validate_tasks(tasks, as_of=as_of)
+        graph = build_graph(tasks)
+        try:
+            depths = detect_cycle(graph)
+        except CycleError as e:
+            raise ValidationError(f"Circular dependency detected: {e}")
+
+        valid_until = ranking_expires(tasks, as_of)
+        return {
+            "warnings": Warnings,
+            "valid_until": valid_until.isoformat() if valid_until else None,
+            "ranked_tasks": SCORING_ENGINES[engine](tasks, graph, mode, depths, as_of)
+        }
+    except ValidationError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": "Internal server error", "detail": str(e)}
+
+def _analyze_item(item):
+    tasks, mode, weights, engine, as_of = item
+    # modes registered (or registered again) in the parent at runtime are
+    # missing or stale in a worker started before
+    if WEIGHT_METHOD.get(mode) != weights:
+        register_weight_mode(mode, weights)
+    return analyze_set(tasks, mode, engine, as_of)
+
+def worker_count(workers=None):
+    if workers is None:
+        from django.conf import settings
+        workers = getattr(settings, "ANALYZE_BATCH_WORKERS", None)
+    return workers or os.cpu_count() or 1
+
+def get_pool(workers):
+    """
+    One pool per process, started on first use and kept for later batches
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def analyze_sets(sets, mode="smart", engine="python", workers=None, as_of=None):
+    """
+    Rank every task list of sets ({set_id: tasks}) in parallel.
+    Return: {set_id: analyze_set result}, in the order of sets
+    """
+    workers = worker_count(workers)
+    items = [(tasks, mode, WEIGHT_METHOD[mode], engine, as_of) for tasks in sets.values()]
+
+    if workers == 1 or len(items) <= 1:
+        results = map(_analyze_item, items)
+    else:
+        # a few chunks per worker: cheap to send, still balanced when sets differ in size
+        chunksize = max(1, len(items) // (workers * 4))
+        try:
+            results = list(get_pool(workers).map(_analyze_item, items, chunksize=chunksize))
+        except BrokenProcessPool:
+            # a worker died (e.g. killed for memory), start a fresh pool next time
+            reset_pool()
+            raise
+
+    return dict(zip(sets, results))
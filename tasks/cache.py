@@ -0,0 +1,94 @@
+"""
+Result cache for /analyze/, keyed by a hash of the validated tasks and the mode.
+
+A ranking computed as of one date stays exact until its valid_until (see
+scoring.ranking_expires), so one entry answers every as_of in that window
+instead of one entry per day. Entries live in the "analysis" cache
+(settings.CACHES): per process LocMemCache by default, Redis shared by
+every worker when REDIS_URL is set. Both evict the least recently used
+entries when full. Hits and misses are counted in the cache itself so the
+counts cover every worker sharing it.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from .scoring import weights_digest
+
+CACHE_ALIAS = "analysis"
+HITS_KEY = "analyze:hits"
+MISSES_KEY = "analyze:misses"
+
+
+def get_cache():
+    try:
+        return caches[CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return None
+
+def ranking_key(tasks, mode):
+    return ranking_keys(tasks, [mode])[mode]
+
+def ranking_keys(tasks, modes):
+    """
+    {mode: key}, from one canonical hash of validated tasks: key order and
+    whitespace of the request don't matter, dates are compared as dates.
+    The weights of the mode are part of the key, a mode registered again
+    with other weights misses. The engine and the input format aren't,
+    they rank the same tasks the same
+    """
+    canonical = json.dumps([task.values() for task in tasks], separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return {mode: f"analyze:{mode}:{weights_digest([mode])}:{digest}" for mode in modes}
+
+def count(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # first count, add() so two workers racing here don't reset each other
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+def get_ranking(key, as_of):
+    """
+    Return: (ranked, valid_until) cached for a date window covering as_of, or None
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    entry = cache.get(key)
+    if entry is not None:
+        scored_as_of, valid_until, ranked = entry
+        if scored_as_of <= as_of and (valid_until is None or as_of < valid_until):
+            count(cache, HITS_KEY)
+            return ranked, valid_until
+
+    count(cache, MISSES_KEY)
+    return None
+
+def set_ranking(key, as_of, ranked, valid_until):
+    cache = get_cache()
+    if cache is not None:
+        cache.set(key, (as_of, valid_until, ranked))
+
+def stats():
+    cache = get_cache()
+    if cache is None:
+        return {"enabled": False}
+
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "enabled": True,
+        "backend": type(cache).__name__,
+        "hits": counts.get(HITS_KEY, 0),
+        "misses": counts.get(MISSES_KEY, 0),
+    }
+
+def clear():
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
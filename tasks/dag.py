@@ -0,0 +1,188 @@
+"""
+Process level index of the stored dependency graph.
+
+The edges, dependents counts and depths of every stored task are loaded
+once and then kept in step with this process' own writes: create_tasks and
+clear_tasks apply their change to the index when their transaction commits.
+TaskTableVersion, bumped by every write, tells a process its index is out
+of date (a write from another worker, an admin edit), it is then reloaded
+on the next read.
+
+Reads take the edges and depths from here instead of fetching every edge
+and rerunning the cycle check. Writes check dependencies exist against it,
+and an edge added to an existing task (the admin) is checked for cycles by
+a search from the new edges only.
+
+The depths are only computed when a ranking first asks for them. A cycle
+that got stored anyway (written to the database directly) makes them
+raise CycleError, the edges, existence checks and inserts keep working.
+"""
+
+import threading
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Task, TaskDependency, TaskTableVersion
+from .scoring import topological_depths, CycleError
+from .timing import timed
+
+_index = None
+_lock = threading.Lock()
+
+
+def bump_version():
+    # called by every write to the tasks or their dependencies
+    if not TaskTableVersion.objects.filter(pk=1).update(version=F("version") + 1):
+        TaskTableVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+    return table_version()
+
+def table_version():
+    return TaskTableVersion.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+
+class DependencyIndex:
+    """
+    deps: {task_id: [dependency ids]} of every stored task, in the order
+    they were added, dependents: {task_id: number of dependents},
+    depths: {task_id: depth}, all as of table version `version`.
+    cycle: the CycleError of the stored graph once depths found one
+    """
+    __slots__ = ("version", "deps", "dependents", "_depths", "cycle")
+
+    def __init__(self, version, deps):
+        self.version = version
+        self.deps = deps
+        self.dependents = Counter(dep for task_deps in deps.values() for dep in task_deps)
+        self._depths = None
+        self.cycle = None
+
+    @property
+    def depths(self):
+        """
+        Computed on first use. Raise CycleError if the stored graph isn't a DAG
+        """
+        if self._depths is None:
+            # add() changes deps under the module lock
+            with _lock:
+                if self._depths is None and self.cycle is None:
+                    try:
+                        self._depths = topological_depths(self.deps)
+                    except CycleError as e:
+                        self.cycle = e
+            if self.cycle is not None:
+                raise CycleError(self.cycle.path)
+        return self._depths
+
+    @classmethod
+    @timed("index")
+    def load(cls):
+        # version first: a write committing meanwhile leaves the index newer
+        # than its version, the next read reloads, never the other way round
+        version = table_version()
+        deps = {task_id: [] for task_id in Task.objects.values_list("id", flat=True)}
+        for task_id, dep in TaskDependency.objects.order_by("id").values_list("task_id", "depends_on_id"):
+            deps[task_id].append(dep)
+        return cls(version, deps)
+
+    def add(self, tasks):
+        """
+        New tasks (with id and dependencies), dependencies first.
+        Nothing depends on a new task yet, so no depth changes but theirs
+        """
+        for task in tasks:
+            task_id = task["id"]
+            deps = list(task["dependencies"])
+            # loaded after the insert committed. The async add inserts the
+            # row before its edges, a load in between has none of them
+            if task_id in self.deps and (self.deps[task_id] or not deps):
+                continue
+            self.deps[task_id] = deps
+            # depths not computed yet will be, from deps
+            if self._depths is not None:
+                self._depths[task_id] = 1 + max(self._depths.get(dep, 0) for dep in deps) if deps else 0
+            self.dependents.update(deps)
+
+    def missing(self, ids):
+        return [task_id for task_id in ids if task_id not in self.deps]
+
+    def check_edges(self, task_id, deps):
+        """
+        Raise CycleError if task_id depending on deps closes a cycle.
+        Only tasks deeper than task_id can reach it through their
+        dependencies, so the search from deps never visits the rest
+        (with a cycle stored elsewhere there are no depths, it visits
+        everything deps reach)
+        """
+        try:
+            depths = self.depths
+        except CycleError:
+            depths = None
+        floor = depths.get(task_id, 0) if depths is not None else -1
+        depth = depths.get if depths is not None else lambda dep, default: 0
+        parent = {}
+        stack = []
+
+        for dep in deps:
+            if dep == task_id:
+                raise CycleError([task_id, task_id])
+            if dep not in parent and depth(dep, 0) > floor:
+                parent[dep] = task_id
+                stack.append(dep)
+
+        while stack:
+            node = stack.pop()
+            for dep in self.deps.get(node, ()):
+                if dep == task_id:
+                    path = [task_id]
+                    while node != task_id:
+                        path.append(node)
+                        node = parent[node]
+                    raise CycleError([task_id] + path[:0:-1] + [task_id])
+                if dep not in parent and depth(dep, 0) > floor:
+                    parent[dep] = node
+                    stack.append(dep)
+
+
+def dependency_index():
+    """
+    The index of the stored graph, reloaded first when the tasks changed
+    since it was built. Inside a transaction, which may still roll back,
+    a reload isn't kept for the other requests
+    """
+    global _index
+
+    index = _index
+    if index is not None and index.version == table_version():
+        return index
+
+    index = DependencyIndex.load()
+    if not connection.in_atomic_block:
+        with _lock:
+            _index = index
+    return index
+
+def tasks_added(tasks, version):
+    """
+    Apply tasks inserted by the current transaction, which bumped the
+    table to version, once it commits
+    """
+    def apply():
+        with _lock:
+            if _index is not None and _index.version == version - 1:
+                _index.add(tasks)
+                _index.version = version
+    transaction.on_commit(apply)
+
+def tasks_cleared(version):
+    def apply():
+        global _index
+        with _lock:
+            _index = DependencyIndex(version, {})
+    transaction.on_commit(apply)
+
+def reset():
+    global _index
+    with _lock:
+        _index = None
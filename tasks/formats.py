@@ -0,0 +1,109 @@
+"""
+Compact columnar encoding of a ranking, ?format=columnar.
+
+Instead of one dict per task repeating every key, each field is sent as
+one array in ranking order. Reason strings are dictionary encoded (every
+distinct string once, tasks carry indices into that list) and due dates
+are day offsets from date_base, or ISO strings with &dates=iso. Everything
+is plain JSON types, so it is encoded without DjangoJSONEncoder, by orjson
+when it is installed.
+"""
+
+import json
+from datetime import date
+
+from django.http import HttpResponse
+
+from .scoring import ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMATS = ("json", "columnar")
+DATE_ENCODINGS = ("offset", "iso")
+
+# the ranking_entry fields, in column order
+COLUMNS = (
+    "id", "title", "due_date", "effort", "importance",
+    "priority_score", "priority_indicator", "depth", "reasons",
+)
+
+
+def response_format(request):
+    """
+    (format, dates) asked for by the request, ("json", None) by default
+    """
+    fmt = request.GET.get("format", "json")
+    if fmt not in FORMATS:
+        raise ValidationError(f"format must be one of {', '.join(FORMATS)}")
+
+    dates = request.GET.get("dates", "offset")
+    if dates not in DATE_ENCODINGS:
+        raise ValidationError(f"dates must be one of {', '.join(DATE_ENCODINGS)}")
+
+    return fmt, dates if fmt == "columnar" else None
+
+def encode_columns(ranked, dates="offset", today=None):
+    """
+    Return: {"count", "date_base", "reason_table", "columns": {field: [values]}}
+    """
+    today = today or date.today()
+    base = today.toordinal()
+
+    reason_index = {}
+    columns = {name: [] for name in COLUMNS}
+    ids, titles, due_dates, efforts = columns["id"], columns["title"], columns["due_date"], columns["effort"]
+    importances, scores, indicators = columns["importance"], columns["priority_score"], columns["priority_indicator"]
+    depths, reasons = columns["depth"], columns["reasons"]
+
+    for task in ranked:
+        ids.append(task["id"])
+        titles.append(task["title"])
+
+        due = task["due_date"]
+        if due is None:
+            due_dates.append(None)
+        elif dates == "iso":
+            due_dates.append(due.isoformat())
+        else:
+            due_dates.append(due.toordinal() - base)
+
+        efforts.append(task["effort"])
+        importances.append(task["importance"])
+        scores.append(task["priority_score"])
+        indicators.append(task["priority_indicator"])
+        depths.append(task["depth"])
+        reasons.append([reason_index.setdefault(reason, len(reason_index)) for reason in task["reasons"]])
+
+    return {
+        "count": len(ids),
+        "date_base": today.isoformat() if dates == "offset" else None,
+        "reason_table": list(reason_index),
+        "columns": columns,
+    }
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+def columnar_response(header, ranked, dates="offset", key="ranked_tasks", status=200):
+    """
+    header's keys (mode, warnings, next...) as they are, plus the ranking
+    under key in columnar form
+    """
+    payload = dict(header)
+    payload["format"] = "columnar"
+    payload[key] = encode_columns(ranked, dates)
+    return HttpResponse(dumps(payload), content_type="application/json", status=status)
+
+def columnar_rankings_response(header, rankings, dates="offset", status=200):
+    """
+    Several rankings ({mode: ranked}) under "rankings", each in columnar form
+    """
+    payload = dict(header)
+    payload["format"] = "columnar"
+    payload["rankings"] = {mode: encode_columns(ranked, dates) for mode, ranked in rankings.items()}
+    return HttpResponse(dumps(payload), content_type="application/json", status=status)
@@ -0,0 +1,257 @@
+"""
+Write behind ingestion for POST /add/, on with settings.TASK_WRITE_BEHIND.
+
+add_task still validates a task and checks its dependencies before it
+answers, but instead of a write transaction of its own (and a wait for
+SQLite's single writer lock) the task joins this process' queue with an
+id reserved up front, and the response goes out right away. A worker
+thread writes the queue out in batches: up to TASK_WRITE_BEHIND_BATCH
+tasks inserted by create_tasks in one transaction, one commit for all of
+them, waiting up to TASK_WRITE_BEHIND_DELAY seconds for a batch to fill.
+
+Ids are reserved a batch at a time by moving the AUTOINCREMENT sequence of
+the task table past them, so inserts that don't go through the queue
+(add_bulk, the admin, other processes) never take a queued id.
+
+A read sees every task whose id was returned before it started: flush()
+writes out what is queued (after the batch being written, if any) and
+the database backed views call it first, through table_etag, and so
+does add_bulk before it resolves dependencies on stored tasks. That holds
+within the process, other processes see the tasks once their batch
+commits. A full queue (TASK_WRITE_BEHIND_QUEUE tasks) is flushed by the
+request that finds it full, which slows writers down to the database.
+A task whose dependency is deleted before its batch commits is dropped
+and counted as failed.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, close_old_connections, connection, transaction
+
+from .models import Task
+from .store import clean_dependency_ids, create_tasks, existing_ids, require_found
+from .timing import Histogram
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, "TASK_WRITE_BEHIND", False)
+
+def reserve_ids(count):
+    """
+    First of count consecutive Task ids that no insert without an explicit
+    id will take: the table's AUTOINCREMENT sequence moves past them
+    """
+    if connection.vendor != "sqlite":
+        raise ImproperlyConfigured("TASK_WRITE_BEHIND reserves ids from SQLite's AUTOINCREMENT sequence")
+
+    table = Task._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        # the sequence has no row before the first insert
+        cursor.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT %s, COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)} "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+            [table, table]
+        )
+        cursor.execute("UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq", [count, table])
+        [last] = cursor.fetchone()
+    return last - count + 1
+
+
+class WriteBehindQueue:
+    """
+    Tasks waiting to be written, with their reserved ids, and the thread
+    writing them. submitted and written count tasks, written includes the
+    failed ones
+    """
+
+    def __init__(self, size, batch_size, delay):
+        self.size = size
+        self.batch_size = batch_size
+        self.delay = delay
+
+        # (TaskRecord with its id, perf_counter when queued)
+        self.pending = deque()
+        self.queued_ids = set()
+        self.next_id = self.end_id = 0
+        self.submitted = self.written = 0
+        self.failed = self.batches = self.full = 0
+        self.latency = Histogram()
+        self.commit = Histogram()
+        self.closed = False
+
+        # guards everything above, writing is held while a batch is written
+        self.changed = threading.Condition()
+        self.writing = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="task-write-behind", daemon=True)
+        self.thread.start()
+
+    def submit(self, task):
+        """
+        Queue a validated task whose dependencies are stored or queued.
+        Return: its id
+        """
+        if len(self.pending) >= self.size:
+            with self.changed:
+                self.full += 1
+            self.flush()
+
+        with self.changed:
+            if self.next_id == self.end_id:
+                self.next_id = reserve_ids(self.batch_size)
+                self.end_id = self.next_id + self.batch_size
+            task.id = self.next_id
+            self.next_id += 1
+
+            self.pending.append((task, time.perf_counter()))
+            self.queued_ids.add(task.id)
+            self.submitted += 1
+            self.changed.notify()
+        return task.id
+
+    def queued(self, ids):
+        with self.changed:
+            return self.queued_ids.intersection(ids)
+
+    def run(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.pending or self.closed)
+                # group commit: give the batch some time to fill up
+                self.changed.wait_for(lambda: len(self.pending) >= self.batch_size or self.closed, self.delay)
+                if self.closed:
+                    break
+
+            if self.written < self.submitted:
+                # no request cycle in this thread to apply CONN_MAX_AGE
+                close_old_connections()
+                self.flush()
+        connection.close()
+
+    def flush(self):
+        """
+        Write out every task queued so far, after the batch being written
+        by another thread if there is one
+        """
+        target = self.submitted
+        if self.written >= target:
+            return
+
+        with self.writing:
+            while self.written < target:
+                with self.changed:
+                    batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                if not batch:
+                    break
+                self.write(batch)
+
+    def write(self, batch):
+        tasks = [task for task, _ in batch]
+        start = time.perf_counter()
+        failed = 0
+        try:
+            with transaction.atomic():
+                create_tasks(tasks)
+        except DatabaseError:
+            # one task whose dependency is gone mustn't take the others with it
+            for task in tasks:
+                try:
+                    with transaction.atomic():
+                        create_tasks([task])
+                except DatabaseError:
+                    logger.exception("Queued task %s could not be written, dropped", task.id)
+                    failed += 1
+        done = time.perf_counter()
+
+        with self.changed:
+            self.queued_ids.difference_update(task.id for task in tasks)
+            self.written += len(batch)
+            self.failed += failed
+            self.batches += 1
+            self.commit.observe((done - start) * 1000)
+            for _, queued_at in batch:
+                self.latency.observe((done - queued_at) * 1000)
+
+    def close(self):
+        self.flush()
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        with self.changed:
+            return {
+                "enabled": True,
+                "queued": len(self.pending),
+                "submitted": self.submitted,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "full": self.full,
+                # from queued to committed, per task
+                "flush_latency_ms": self.latency.as_dict(),
+                "commit_ms": self.commit.as_dict(),
+            }
+
+
+def get_queue():
+    global _queue
+
+    with _lock:
+        if _queue is None:
+            _queue = WriteBehindQueue(
+                getattr(settings, "TASK_WRITE_BEHIND_QUEUE", 10000),
+                getattr(settings, "TASK_WRITE_BEHIND_BATCH", 500),
+                getattr(settings, "TASK_WRITE_BEHIND_DELAY", 0.005),
+            )
+        return _queue
+
+def submit(task):
+    return get_queue().submit(task)
+
+def check_dependencies(deps):
+    """
+    store.check_dependencies, counting queued tasks as stored. The queue
+    is read first: a task that has left it is committed by then
+    """
+    deps = clean_dependency_ids(deps)
+    found = get_queue().queued(deps)
+    require_found(deps, found | existing_ids(deps))
+    return deps
+
+def flush():
+    """
+    Read barrier: once it returns, every task queued by this process
+    before the call is committed
+    """
+    queue = _queue
+    if queue is not None:
+        queue.flush()
+
+def stats():
+    queue = _queue
+    if queue is None:
+        return {"enabled": enabled()}
+    return queue.stats()
+
+def reset():
+    # write out and stop the queue, the next submit starts one from the settings
+    global _queue
+    with _lock:
+        queue, _queue = _queue, None
+    if queue is not None:
+        queue.close()
+
+# queued tasks are written out before the process exits
+atexit.register(flush)
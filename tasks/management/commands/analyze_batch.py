@@ -0,0 +1,62 @@
+"""
+Rank many independent task lists from a JSON file across a process pool.
+
+    python manage.py analyze_batch sets.json --mode smart --workers 8 > results.json
+
+The file holds {"sets": {set_id: [tasks]}} (or just the {set_id: [tasks]}
+object), "-" reads it from stdin. The output is {set_id: result} as returned
+by /api/tasks/analyze_batch/.
+"""
+
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from tasks.batch import SCORING_ENGINES, analyze_sets, worker_count
+from tasks.scoring import WEIGHT_METHOD
+
+
+class Command(BaseCommand):
+    help = "Rank many independent task lists in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='JSON file of task sets, "-" for stdin')
+        parser.add_argument("--mode", default="smart", choices=list(WEIGHT_METHOD))
+        parser.add_argument("--engine", default="python", choices=list(SCORING_ENGINES))
+        parser.add_argument("--workers", type=int, help="worker processes (default: ANALYZE_BATCH_WORKERS or every core)")
+        parser.add_argument("--output", help="write the results here instead of stdout")
+
+    def handle(self, *args, path, mode, engine, workers=None, output=None, **options):
+        try:
+            if path == "-":
+                data = json.load(sys.stdin)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+        sets = data.get("sets", data) if isinstance(data, dict) else None
+        if not isinstance(sets, dict):
+            raise CommandError("Expected an object of set id to task list")
+
+        workers = worker_count(workers)
+        start = time.perf_counter()
+        results = analyze_sets(sets, mode, engine, workers)
+        elapsed = time.perf_counter() - start
+
+        encoded = json.dumps(results, cls=DjangoJSONEncoder, ensure_ascii=False)
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(encoded)
+        else:
+            self.stdout.write(encoded)
+
+        failed = sum("error" in result for result in results.values())
+        self.stderr.write(
+            f"{len(sets)} sets ({failed} failed) with {workers} workers in {elapsed:.2f}s",
+            style_func=None
+        )
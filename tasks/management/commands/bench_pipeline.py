@@ -0,0 +1,257 @@
+"""
+Time and peak memory of every stage of the scoring pipeline on generated
+task graphs (see tasks/synthetic.py), written to a JSON file so runs on
+different commits can be compared.
+
+    python manage.py bench_pipeline --sizes 100,10000,1000000 --output before.json
+    python manage.py bench_pipeline --compare before.json
+
+--db also runs the database views; it **replaces every task** in the database.
+/analyze/ is timed cold (empty analysis cache) and warm (answered from it).
+"""
+
+import gc
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import Client
+
+from tasks.scoring import (
+    BUILTIN_MODES, validate_tasks, build_graph, detect_cycle, compute_depth, score_tasks, score_tasks_modes,
+    downstream_buckets, CycleError
+)
+from tasks.cache import clear as clear_cache
+from tasks.plan import plan_tasks
+from tasks.synthetic import SHAPES
+from tasks.vectorized import score_tasks_vectorized
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+class Stage:
+    """
+    Run func once per repeat for the fastest time, then once more under
+    tracemalloc for the peak memory (tracing slows it down too much to time).
+    setup makes func's argument fresh for every run, outside the measurement
+    """
+
+    def __init__(self, repeat, memory):
+        self.repeat = repeat
+        self.memory = memory
+
+    def run(self, func, setup=None):
+        seconds = None
+        for _ in range(self.repeat):
+            args = (setup(),) if setup else ()
+            gc.collect()
+            start = time.perf_counter()
+            value = func(*args)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+        peak = None
+        if self.memory:
+            args = (setup(),) if setup else ()
+            gc.collect()
+            tracemalloc.start()
+            try:
+                func(*args)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        return value, seconds, peak
+
+
+class Command(BaseCommand):
+    help = "Benchmark the scoring pipeline stage by stage on generated task graphs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated task counts (default {DEFAULT_SIZES})")
+        parser.add_argument("--shapes", default=",".join(SHAPES), help="comma separated graph shapes")
+        parser.add_argument("--repeat", type=int, default=1, help="keep the fastest of this many runs")
+        parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+        parser.add_argument("--no-views", action="store_true", help="skip the full requests through the views")
+        parser.add_argument("--db", action="store_true", help="also run the DB views (replaces every task)")
+        parser.add_argument("--output", help="results file (default bench-<commit>.json)")
+        parser.add_argument("--compare", help="results file of an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be comma separated integers")
+        shapes = options["shapes"].split(",")
+        unknown = set(shapes) - set(SHAPES)
+        if unknown:
+            raise CommandError(f"Unknown shapes {sorted(unknown)}, choose from {list(SHAPES)}")
+
+        # the in-process client sends Host: testserver
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        # late_cycle is rejected on purpose, don't log every 400
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+
+        self.stage = Stage(max(1, options["repeat"]), not options["no_memory"])
+        self.client = Client()
+        self.results = []
+
+        for shape in shapes:
+            for size in sizes:
+                raw = SHAPES[shape](size)
+                self.bench_pipeline(shape, size, raw)
+                if not options["no_views"]:
+                    self.bench_views(shape, size, raw, options["db"])
+
+        commit, dirty = git_commit()
+        report = {
+            "commit": commit,
+            "dirty": dirty,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": self.stage.repeat,
+            "results": self.results,
+        }
+        output = options["output"] or f"bench-{(commit or 'unknown')[:12]}.json"
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Saved {len(self.results)} measurements to {output}")
+
+        if options["compare"]:
+            self.compare(options["compare"])
+
+    def record(self, shape, size, stage, func, expect=None, setup=None):
+        """
+        Measure one stage. expect is an exception type the stage is
+        supposed to raise (the cycle of late_cycle), recorded as its outcome
+        """
+        try:
+            value, seconds, peak = self.stage.run(func, setup)
+            outcome = f"HTTP {value.status_code}" if hasattr(value, "status_code") else "ok"
+        except Exception as e:
+            if expect is None or not isinstance(e, expect):
+                raise
+            value, outcome = None, type(e).__name__
+            seconds, peak = self.stage.run(lambda *args: self.raises(func, expect, *args), setup)[1:]
+
+        self.results.append({
+            "shape": shape, "size": size, "stage": stage,
+            "seconds": seconds, "peak_bytes": peak, "outcome": outcome,
+        })
+        memory = f"{peak / 2**20:9.1f} MiB" if peak is not None else ""
+        self.stdout.write(f"{shape:<11} {size:>8} {stage:<28} {seconds * 1000:10.2f} ms {memory}  {outcome}")
+        return value
+
+    @staticmethod
+    def raises(func, expect, *args):
+        try:
+            func(*args)
+        except expect:
+            return None
+
+    def bench_pipeline(self, shape, size, raw):
+        tasks, _ = self.record(shape, size, "validate_tasks", lambda: validate_tasks(raw))
+        graph = self.record(shape, size, "build_graph", lambda: build_graph(tasks))
+        depths = self.record(shape, size, "detect_cycle", lambda: detect_cycle(graph), expect=CycleError)
+        if depths is None:
+            return
+
+        def depth_of_every_task():
+            memo = {}
+            return [compute_depth(task["id"], graph, memo) for task in tasks]
+
+        self.record(shape, size, "compute_depth", depth_of_every_task)
+        ranked = self.record(shape, size, "score_tasks", lambda: score_tasks(tasks, graph, "smart", depths))
+        self.record(shape, size, "score_tasks_vectorized", lambda: score_tasks_vectorized(tasks, graph, "smart", depths))
+        self.record(shape, size, "score_tasks_modes all", lambda: score_tasks_modes(tasks, graph, BUILTIN_MODES, depths))
+        self.record(shape, size, "downstream_buckets", lambda: downstream_buckets(tasks))
+        self.record(shape, size, "plan_tasks", lambda: plan_tasks(tasks, "smart", 8))
+        self.record(shape, size, "json_serialization", lambda: json.dumps(ranked, cls=DjangoJSONEncoder))
+
+    def post(self, url, data, content_type="application/json"):
+        res = self.client.post(url, data=data, content_type=content_type)
+        if res.streaming:
+            b"".join(res.streaming_content)
+        return res
+
+    def get(self, url):
+        return self.client.get(url)
+
+    def bench_views(self, shape, size, raw, db):
+        body = json.dumps({"tasks": raw})
+        ndjson = "\n".join(json.dumps(task) for task in raw)
+
+        # the engines and input formats share the analysis cache (same
+        # tasks, same ranking): cold runs start from an empty one, warm
+        # runs are answered from it
+        analyses = [
+            ("view /analyze/", lambda: self.post("/api/tasks/analyze/", body)),
+            ("view /analyze/ vectorized", lambda: self.post("/api/tasks/analyze/?engine=vectorized", body)),
+            ("view /analyze/ ndjson", lambda: self.post("/api/tasks/analyze/", ndjson, "application/x-ndjson")),
+        ]
+        for stage, request in analyses:
+            self.record(shape, size, f"{stage} cold", lambda _, request=request: request(), setup=clear_cache)
+            request()
+            self.record(shape, size, f"{stage} warm", request)
+
+        self.record(shape, size, "view /analyze_batch/",
+                    lambda: self.post("/api/tasks/analyze_batch/", json.dumps({"sets": {shape: raw}})))
+
+        if not db or shape == "late_cycle":
+            return
+
+        # ids become refs so /add_bulk/ inserts the same graph
+        bulk = json.dumps({"tasks": [
+            {"ref": task_id, **task} for task_id, task in ((task.pop("id"), task) for task in map(dict, raw))
+        ]})
+
+        def add_bulk():
+            # through /clear/ so the table version and dependency index follow
+            self.post("/api/tasks/clear/", "")
+            return self.post("/api/tasks/add_bulk/", bulk)
+
+        self.record(shape, size, "view /add_bulk/", add_bulk)
+        self.record(shape, size, "view /analyze_db/", lambda: self.get("/api/tasks/analyze_db/"))
+        self.record(shape, size, "view /analyze_db/ page", lambda: self.get("/api/tasks/analyze_db/?limit=100"))
+        self.record(shape, size, "view /suggest/", lambda: self.get("/api/tasks/suggest/"))
+        self.record(shape, size, "view /analyze_db/ sql page", lambda: self.get("/api/tasks/analyze_db/?engine=sql&limit=100"))
+        self.record(shape, size, "view /suggest/ sql", lambda: self.get("/api/tasks/suggest/?engine=sql"))
+        self.record(shape, size, "view /plan/", lambda: self.get("/api/tasks/plan/"))
+        self.record(shape, size, "view /list/", lambda: self.get("/api/tasks/list/"))
+
+    def compare(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+        before = {(r["shape"], r["size"], r["stage"]): r for r in baseline["results"]}
+        self.stdout.write(f"\nCompared with {baseline.get('commit') or path} (time ratio, >1 is slower now)")
+        for result in self.results:
+            old = before.get((result["shape"], result["size"], result["stage"]))
+            if not old or not old["seconds"]:
+                continue
+            ratio = result["seconds"] / old["seconds"]
+            line = f"{result['shape']:<11} {result['size']:>8} {result['stage']:<28} {ratio:6.2f}x"
+            if old.get("peak_bytes") and result["peak_bytes"] is not None:
+                line += f"   memory {result['peak_bytes'] / old['peak_bytes']:6.2f}x"
+            self.stdout.write(line)
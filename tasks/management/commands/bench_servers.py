@@ -0,0 +1,108 @@
+"""
+Compare concurrent request throughput of the sync views served through
+Django's WSGI handler with the async views served through its ASGI handler.
+
+    python manage.py bench_servers --seed 2000 --requests 200 --concurrency 16
+
+--seed replaces every task in the database with a generated set first.
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.test import AsyncClient, Client
+
+from tasks.models import Task
+from tasks.store import LocalRef, create_tasks
+
+ENDPOINTS = [
+    "analyze_db/?mode=smart",
+    "suggest/?mode=smart",
+    "list/?limit=100",
+]
+
+
+def seed_tasks(count):
+    rng = random.Random(0)
+    today = date.today()
+    tasks = []
+    for i in range(count):
+        # dependencies point at earlier tasks, so the graph stays acyclic
+        deps = [LocalRef(dep) for dep in rng.sample(range(i), min(i, rng.randint(0, 2)))]
+        tasks.append({
+            "title": f"Task {i}",
+            "due_date": today + timedelta(days=rng.randint(-5, 30)) if rng.random() < 0.8 else None,
+            "estimated_hours": rng.randint(1, 12),
+            "importance": rng.randint(1, 10),
+            "dependencies": deps,
+        })
+
+    with transaction.atomic():
+        Task.objects.all().delete()
+        create_tasks(tasks)
+
+
+def run_wsgi(urls, concurrency):
+    def fetch(url):
+        try:
+            return Client().get(url).status_code
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(fetch, urls))
+
+
+async def run_asgi(urls, concurrency):
+    client = AsyncClient()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with limit:
+            return (await client.get(url)).status_code
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+class Command(BaseCommand):
+    help = "Benchmark the sync views under WSGI against the async views under ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, help="replace all tasks with this many generated ones")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def handle(self, *args, seed=None, requests=200, concurrency=16, **options):
+        # the in-process clients send Host: testserver
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        if seed:
+            seed_tasks(seed)
+
+        # warm the score store so both servers read the same materialized rows
+        Client().get("/api/tasks/analyze_db/")
+
+        for endpoint in ENDPOINTS:
+            sync_urls = [f"/api/tasks/{endpoint}"] * requests
+            async_urls = [f"/api/tasks/async/{endpoint}"] * requests
+
+            start = time.perf_counter()
+            statuses = run_wsgi(sync_urls, concurrency)
+            wsgi_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            statuses += asyncio.run(run_asgi(async_urls, concurrency))
+            asgi_time = time.perf_counter() - start
+
+            failed = sum(status != 200 for status in statuses)
+            self.stdout.write(
+                f"{endpoint:<24} WSGI {requests / wsgi_time:8.1f} req/s   "
+                f"ASGI {requests / asgi_time:8.1f} req/s"
+                + (f"   {failed} failed" if failed else "")
+            )
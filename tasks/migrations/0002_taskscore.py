@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskScore',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='tasks.task')),
+                ('urgency_score', models.FloatField()),
+                ('importance_score', models.FloatField()),
+                ('effort_score', models.FloatField()),
+                ('dependency_score', models.FloatField()),
+                ('dependents_count', models.PositiveIntegerField(default=0)),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('scored_on', models.DateField()),
+            ],
+        ),
+    ]
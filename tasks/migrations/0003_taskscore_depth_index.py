@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_taskscore'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskscore',
+            name='depth',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
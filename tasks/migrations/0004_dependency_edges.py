@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_json_to_edges(apps, schema_editor):
+    """
+    Turn every task's JSON dependency list into TaskDependency rows.
+    Duplicates, self references and ids of tasks that don't exist can't be
+    stored as edges and are dropped (they never passed validation anyway).
+    """
+    Task = apps.get_model("tasks", "Task")
+    TaskDependency = apps.get_model("tasks", "TaskDependency")
+    TaskScore = apps.get_model("tasks", "TaskScore")
+
+    existing = set(Task.objects.values_list("id", flat=True))
+    edges = []
+
+    for task_id, deps in Task.objects.order_by("id").values_list("id", "legacy_dependencies"):
+        for dep in dict.fromkeys(deps or []):
+            if isinstance(dep, int) and dep in existing and dep != task_id:
+                edges.append(TaskDependency(task_id=task_id, depends_on_id=dep))
+
+    TaskDependency.objects.bulk_create(edges, batch_size=1000)
+
+    # the graph may have changed, let the next read rebuild the scores
+    TaskScore.objects.all().delete()
+
+
+def copy_edges_to_json(apps, schema_editor):
+    Task = apps.get_model("tasks", "Task")
+    TaskDependency = apps.get_model("tasks", "TaskDependency")
+
+    deps = {}
+    for task_id, dep in TaskDependency.objects.order_by("id").values_list("task_id", "depends_on_id"):
+        deps.setdefault(task_id, []).append(dep)
+
+    tasks = list(Task.objects.filter(id__in=deps))
+    for task in tasks:
+        task.legacy_dependencies = deps[task.id]
+    Task.objects.bulk_update(tasks, ["legacy_dependencies"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_taskscore_depth_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='task',
+            old_name='dependencies',
+            new_name='legacy_dependencies',
+        ),
+        migrations.CreateModel(
+            name='TaskDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depends_on', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependent_links', to='tasks.task')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependency_links', to='tasks.task')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskdependency',
+            constraint=models.UniqueConstraint(fields=('task', 'depends_on'), name='unique_task_dependency'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskdependency',
+            constraint=models.CheckConstraint(condition=models.Q(('task', models.F('depends_on')), _negated=True), name='task_not_own_dependency'),
+        ),
+        migrations.RunPython(copy_json_to_edges, copy_edges_to_json),
+        migrations.RemoveField(
+            model_name='task',
+            name='legacy_dependencies',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='dependencies',
+            field=models.ManyToManyField(blank=True, related_name='dependents', through='tasks.TaskDependency', to='tasks.task'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+def drop_scores(apps, schema_editor):
+    # existing rows have no smart_score yet, the next read rebuilds them
+    apps.get_model("tasks", "TaskScore").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_dependency_edges'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_scores, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='taskscore',
+            name='smart_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='taskscore',
+            index=models.Index(fields=['depth', '-smart_score', 'task'], name='taskscore_smart_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='taskscore',
+            index=models.Index(fields=['depth', '-effort_score', 'task'], name='taskscore_fastest_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='taskscore',
+            index=models.Index(fields=['depth', '-importance_score', 'task'], name='taskscore_impact_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='taskscore',
+            index=models.Index(fields=['depth', '-urgency_score', 'task'], name='taskscore_deadline_rank'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:25
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def expire_next_day(apps, schema_editor):
+    # existing rows were only trusted for the day they were scored on
+    TaskScore = apps.get_model("tasks", "TaskScore")
+    TaskScore.objects.update(urgency_valid_until=models.F("scored_on") + timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_taskscore_rank_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskscore',
+            name='urgency_valid_until',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(expire_next_day, migrations.RunPython.noop),
+    ]
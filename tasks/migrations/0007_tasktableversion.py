@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model("tasks", "TaskTableVersion").objects.create(pk=1, version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_taskscore_urgency_valid_until'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_tasktableversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskscore',
+            name='scored_on',
+            field=models.DateField(db_index=True),
+        ),
+    ]
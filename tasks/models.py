@@ -12,11 +12,18 @@ class Task(models.Model):
     importance = models.PositiveIntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(10)]
     )
-    dependencies = models.JSONField(default=list, blank=True)
+    dependencies = models.ManyToManyField(
+        "self", symmetrical=False, through="TaskDependency",
+        related_name="dependents", blank=True
+    )
 
     def __str__(self):
         return f"{self.title} (#{self.id})"
 
+    def dependency_ids(self):
+        # edges come back in the order they were added
+        return [link.depends_on_id for link in self.dependency_links.order_by("id")]
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -24,5 +31,67 @@ class Task(models.Model):
             "due_date": self.due_date,
             "estimated_hours": self.estimated_hours,
             "importance": self.importance,
-            "dependencies": self.dependencies or []
-        }
\ No newline at end of file
+            "dependencies": self.dependency_ids()
+        }
+
+
+class TaskDependency(models.Model):
+    """
+    Edge of the dependency graph: task can't start before depends_on is done.
+    Both sides are indexed, so dependencies and dependents are single lookups.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="dependency_links")
+    depends_on = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="dependent_links")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["task", "depends_on"], name="unique_task_dependency"),
+            models.CheckConstraint(condition=~models.Q(task=models.F("depends_on")), name="task_not_own_dependency"),
+        ]
+
+    def __str__(self):
+        return f"#{self.task_id} depends on #{self.depends_on_id}"
+
+class TaskScore(models.Model):
+    """
+    Materialized component scores of a task, kept up to date on writes
+    so rankings can be read without rerunning the whole pipeline.
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name="score")
+    urgency_score = models.FloatField()
+    importance_score = models.FloatField()
+    effort_score = models.FloatField()
+    dependency_score = models.FloatField()
+    dependents_count = models.PositiveIntegerField(default=0)
+    depth = models.PositiveIntegerField(default=0, db_index=True)
+
+    # rounded smart mode priority, the only sort key that isn't a component score
+    smart_score = models.FloatField(default=0)
+
+    # urgency depends on the current date: it holds from scored_on until the
+    # day before urgency_valid_until (null: the bucket never changes again)
+    scored_on = models.DateField(db_index=True)
+    urgency_valid_until = models.DateField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # keyset pagination of each mode's ranking: (depth, sort key desc, id)
+        indexes = [
+            models.Index(fields=["depth", "-smart_score", "task"], name="taskscore_smart_rank"),
+            models.Index(fields=["depth", "-effort_score", "task"], name="taskscore_fastest_rank"),
+            models.Index(fields=["depth", "-importance_score", "task"], name="taskscore_impact_rank"),
+            models.Index(fields=["depth", "-urgency_score", "task"], name="taskscore_deadline_rank"),
+        ]
+
+    def __str__(self):
+        return f"Scores of task #{self.task_id}"
+
+
+class TaskTableVersion(models.Model):
+    """
+    Single row counter bumped by every write to the tasks or their
+    dependencies, a cheap token for conditional GETs.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Task table version {self.version}"
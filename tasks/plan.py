@@ -0,0 +1,261 @@
+"""
+Day by day plan of the tasks, GET /plan/.
+
+critical_path finds the chain of dependencies with the most estimated
+hours, the least time the whole backlog can take however it is ordered,
+in one topological pass. plan_days then lays the tasks out over days of a
+fixed hour budget by list scheduling: of the tasks whose dependencies are
+all planned, the best by the ranking key of the mode (then by the hours of
+the longest chain they start, critical work first, then by id) that fits
+in what's left of the day goes next.
+
+Tasks are numbered by position and only ever held as columns: what
+doesn't depend on the order tasks are taken in (scoring, the edges,
+sorting by rank) is done on NumPy arrays, the two passes that do work on
+flat lists of ints, the dependents of every task included, and the days
+come back as flat lists too. Nothing is allocated per task or per day.
+Estimated hours and the budget are whole hours.
+"""
+
+import heapq
+from collections import deque
+from datetime import date, timedelta
+from itertools import chain, repeat
+
+import numpy as np
+
+from .scoring import CycleError, ValidationError, find_cycle
+from .timing import stage, timed
+from .vectorized import rank_keys
+
+MAX_HOURS_PER_DAY = 24
+
+
+class PlanGraph:
+    """
+    Dependency edges between positions of ids: counts[i] dependencies
+    of ids[i] among ids, the positions depending on it are
+    flat[bounds[i]:bounds[i + 1]] in increasing order (arrays)
+    """
+    __slots__ = ("ids", "counts", "flat", "bounds")
+
+    def __init__(self, ids, deps):
+        count = len(ids)
+        task_deps = [deps.get(task_id, ()) for task_id in ids]
+        sizes = np.fromiter(map(len, task_deps), dtype=np.int64, count=count)
+        edges = np.fromiter(chain.from_iterable(task_deps), dtype=np.int64, count=int(sizes.sum()))
+
+        # position of every dependency, edges to tasks outside ids dropped
+        id_array = np.asarray(ids, dtype=np.int64)
+        by_id = np.argsort(id_array)
+        found = np.searchsorted(id_array, edges, sorter=by_id).clip(max=max(count - 1, 0))
+        j = by_id[found] if count else found
+        known = id_array[j] == edges if count else np.zeros(0, dtype=bool)
+        i = np.repeat(np.arange(count), sizes)[known]
+        j = j[known]
+
+        # dependents of each position in increasing order
+        order = np.argsort(j, kind="stable")
+        self.flat = i[order]
+        self.bounds = np.searchsorted(j[order], np.arange(count + 1))
+        self.ids = ids
+        self.counts = np.bincount(i, minlength=count).tolist()
+
+@timed("plan")
+def critical_path(graph, hours, deps):
+    """
+    Hours weighted critical path in O(V + E), hours[i] of graph.ids[i].
+    Return: (task ids of the path in execution order, its hours,
+    [hours of the longest chain starting with each task])
+    """
+    flat, bounds = graph.flat.tolist(), graph.bounds.tolist()
+    remaining = graph.counts[:]
+    start = [0] * len(hours)
+    via = [None] * len(hours)
+    queue = deque(i for i, count in enumerate(remaining) if not count)
+    order = []
+    node, length = None, 0
+
+    while queue:
+        j = queue.popleft()
+        order.append(j)
+        finish = start[j] + hours[j]
+        if finish > length:
+            node, length = j, finish
+        for i in flat[bounds[j]:bounds[j + 1]]:
+            if finish > start[i]:
+                start[i] = finish
+                via[i] = j
+            remaining[i] -= 1
+            if not remaining[i]:
+                queue.append(i)
+
+    if len(order) < len(hours):
+        left = {graph.ids[i]: count for i, count in enumerate(remaining)}
+        raise CycleError(find_cycle(deps, left))
+
+    tails = [0] * len(hours)
+    for j in reversed(order):
+        longest = 0
+        for i in flat[bounds[j]:bounds[j + 1]]:
+            if tails[i] > longest:
+                longest = tails[i]
+        tails[j] = hours[j] + longest
+
+    path = []
+    while node is not None:
+        path.append(graph.ids[node])
+        node = via[node]
+
+    return path[::-1], length, tails
+
+@timed("plan")
+def plan_days(graph, hours, keys, tails, hours_per_day):
+    """
+    Pack the tasks into days of hours_per_day, each after its
+    dependencies (graph must be a DAG, critical_path checks).
+    keys[i] is the mode's ranking key of graph.ids[i].
+    A task that fits in a day is never split, when the best ready one
+    doesn't fit in what's left of today the best one that does goes
+    first. Longer tasks start right away and run over as many days as
+    needed. Ready tasks wait in one heap per number of hours, so the best
+    that fits is the best of the heap tops up to what's left.
+    Return: (task ids in the order worked on, once per day they are worked on,
+    len of that list at the end of each day, hours worked each day,
+    number of the day each task ends), flat lists of ints and an array
+    """
+    count = len(graph.ids)
+    none = count
+
+    # tasks renumbered by rank, sorted once: the heaps hold the numbers,
+    # the best task is the smallest
+    order = np.lexsort((np.asarray(graph.ids), -np.asarray(tails), np.asarray(keys)))
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+
+    ids = np.asarray(graph.ids)[order].tolist()
+    hours = np.asarray(hours, dtype=np.int64)[order]
+    # ready[h] tasks of h hours, ready[0] the ones longer than a day,
+    # tops[h] the best in ready[h] (none: count)
+    bucket = np.where(hours <= hours_per_day, hours, 0).tolist()
+    hours = hours.tolist()
+    remaining = np.asarray(graph.counts, dtype=np.int64)[order].tolist()
+    # the dependents of every task, regrouped by rank:
+    # flat[bounds[r]:bounds[r + 1]] depend on r
+    sizes = np.diff(graph.bounds)[order]
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    moved = np.arange(bounds[-1]) + np.repeat(graph.bounds[:-1][order] - bounds[:-1], sizes)
+    flat = rank[graph.flat[moved]].tolist()
+    bounds = bounds.tolist()
+
+    ready = [[] for _ in range(hours_per_day + 1)]
+    for r, waits in enumerate(remaining):
+        if not waits:
+            # appended in rank order, already heaps
+            ready[bucket[r]].append(r)
+    tops = [heap[0] if heap else none for heap in ready]
+
+    worked_on, day_ends, day_hours = [], [], []
+    ends = [0] * count
+    left = hours_per_day
+    day = 0
+    heappop, heappush = heapq.heappop, heapq.heappush
+    work, end_day, worked_day = worked_on.append, day_ends.append, day_hours.append
+
+    for _ in range(count):
+        # the tops of the heaps of the sizes that fit, a day starts with all of them
+        r = min(tops) if left == hours_per_day else min(tops[:left + 1])
+        if r == none:
+            # nothing ready fits in what's left of today
+            end_day(len(worked_on))
+            worked_day(hours_per_day - left)
+            left = hours_per_day
+            day += 1
+            r = min(tops)
+
+        h = bucket[r]
+        heap = ready[h]
+        heappop(heap)
+        tops[h] = heap[0] if heap else none
+
+        needed = hours[r]
+        work(ids[r])
+        ends[r] = day
+        if needed < left:
+            left -= needed
+        else:
+            # ends today, or goes on over whole days and part of the last one
+            end_day(len(worked_on))
+            worked_day(hours_per_day)
+            day += 1
+            full, rest = divmod(needed - left, hours_per_day)
+            left = hours_per_day
+            if full:
+                done = len(worked_on)
+                worked_on.extend(repeat(ids[r], full))
+                day_ends.extend(range(done + 1, done + full + 1))
+                day_hours.extend(repeat(hours_per_day, full))
+                ends[r] = day + full - 1
+                day += full
+            if rest:
+                work(ids[r])
+                ends[r] = day
+                left -= rest
+
+        for k in flat[bounds[r]:bounds[r + 1]]:
+            remaining[k] -= 1
+            if not remaining[k]:
+                h = bucket[k]
+                heappush(ready[h], k)
+                if k < tops[h]:
+                    tops[h] = k
+
+    if left < hours_per_day:
+        end_day(len(worked_on))
+        worked_day(hours_per_day - left)
+    # back to positions
+    return worked_on, day_ends, day_hours, np.asarray(ends, dtype=np.int64)[rank]
+
+def build_plan(ids, hours, due_ordinals, keys, deps, hours_per_day, start):
+    """
+    The /plan/ payload of the tasks ids (their hours and the ordinals of
+    their due dates, 0 for none): critical path, the days and the tasks
+    planned to end after their due date. The days are three flat lists,
+    day d (start + d days) works days["hours"][d] hours on the ids
+    days["tasks"][days["ends"][d - 1]:days["ends"][d]] (from 0 on the first
+    day, a task longer than a day on each of its days).
+    keys[i] is the mode's ranking key of ids[i] without depth, readiness
+    takes care of dependencies
+    """
+    # a day works more than half its hours or is followed by one that does
+    if 2 * sum(hours) // hours_per_day + 2 > (date.max - start).days:
+        raise ValidationError(f"The tasks don't fit in a plan ending by {date.max}")
+
+    graph = PlanGraph(ids, deps)
+    path, length, tails = critical_path(graph, hours, deps)
+    worked_on, day_ends, day_hours, ends = plan_days(graph, hours, keys, tails, hours_per_day)
+
+    end_ordinals = ends + start.toordinal()
+    late = np.asarray(ids, dtype=np.int64)[(due_ordinals > 0) & (end_ordinals > due_ordinals)].tolist()
+
+    return {
+        "critical_path": {"hours": length, "tasks": path},
+        "end": start + timedelta(days=len(day_ends) - 1) if day_ends else None,
+        "late": late,
+        "days": {"hours": day_hours, "ends": day_ends, "tasks": worked_on},
+    }
+
+def plan_tasks(tasks, mode, hours_per_day, start=None, as_of=None):
+    """
+    build_plan of validated tasks (TaskRecords), scored column by column
+    """
+    as_of = as_of or date.today()
+    with stage("score"):
+        keys = rank_keys(tasks, mode, as_of)
+    due_ordinals = np.fromiter(
+        (task.due_date.toordinal() if task.due_date else 0 for task in tasks), dtype=np.int64, count=len(tasks)
+    )
+    return build_plan(
+        [task.id for task in tasks], [task.estimated_hours for task in tasks], due_ordinals, keys,
+        {task.id: task.dependencies for task in tasks}, hours_per_day, start or as_of
+    )
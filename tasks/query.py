@@ -0,0 +1,173 @@
+"""
+Scoring inside the database, engine=sql of analyze_db and suggest.
+
+The query reads the materialized TaskScore rows: the importance, effort
+and dependency scores, the dependents count and the depth don't depend on
+the date and are up to date after ensure_scored. Only the urgency as of
+the requested date, the weighted sum of the mode and the blocked penalty
+are database expressions, and the database orders and limits the ranking,
+so only the rows of the response are transferred. fastest and impact
+order by a stored column, read off its rank index.
+
+The entries themselves are built by score_task from the component scores
+the query returns, so they are the same as with the other engines. Only
+the order of smart mode ties differs: the other engines order tasks with
+the same rounded score by id, here the unrounded score decides (SQL ROUND
+doesn't round halves the way Python does, ordering on it could put a 0.29
+before a 0.3).
+"""
+
+from datetime import date, timedelta
+
+from django.db.models import Case, F, FloatField, Min, Q, Value, When
+
+from .models import Task, TaskScore
+from .scoring import WEIGHT_METHOD, BLOCKED_PENALTY, URGENCY_BOUNDARIES, ValidationError, score_task, ranking_entry, ranking_expires, weighs_downstream
+from .store import ensure_scored, dependency_lists, as_record, due_warnings, warned_tasks, encode_cursor, decode_cursor
+from .timing import stage
+
+# ranking key of each mode after depth, custom modes rank on their priority
+SORT_KEY = {
+    "smart": "priority",
+    "fastest": "effort_score",
+    "impact": "importance_score",
+    "deadline": "urgency",
+}
+
+
+def urgency_expression(as_of):
+    # urgent_score_fun, as due date ranges instead of days left
+    day = lambda days: as_of + timedelta(days=days)
+    return Case(
+        When(task__due_date__isnull=True, then=Value(0.05)),
+        When(task__due_date__lt=as_of, then=Value(1.00)),
+        When(task__due_date=as_of, then=Value(0.95)),
+        When(task__due_date=day(1), then=Value(0.85)),
+        When(task__due_date__lte=day(3), then=Value(0.65)),
+        When(task__due_date__lte=day(7), then=Value(0.40)),
+        When(task__due_date__lte=day(14), then=Value(0.20)),
+        default=Value(0.10),
+        output_field=FloatField()
+    )
+
+def priority_expression(WEIGHTS):
+    # same order of operations as priority_score_fun
+    weighted = (
+        F("urgency") * Value(WEIGHTS["urgency"]) +
+        F("importance_score") * Value(WEIGHTS["importance"]) +
+        F("effort_score") * Value(WEIGHTS["effort"]) +
+        F("dependency_score") * Value(WEIGHTS["dependency"])
+    )
+    # depth > 0 exactly when the task has dependencies, i.e. is blocked
+    return Case(
+        When(depth__gt=0, then=weighted * Value(BLOCKED_PENALTY)),
+        default=weighted,
+        output_field=FloatField()
+    )
+
+def scored_tasks(mode, as_of):
+    """
+    Stored score rows (with their task) annotated with the urgency as of
+    the date and the priority, in ranking order
+    """
+    if weighs_downstream(mode):
+        raise ValidationError("engine=sql can't weigh downstream work, use engine=python")
+    return (
+        TaskScore.objects
+        .select_related("task")
+        .annotate(urgency=urgency_expression(as_of))
+        .annotate(priority=priority_expression(WEIGHT_METHOD[mode]))
+        .order_by("depth", f"-{SORT_KEY.get(mode, 'priority')}", "task_id")
+    )
+
+def ranking_entries(rows, mode, deps):
+    WEIGHTS = WEIGHT_METHOD[mode]
+    return [
+        ranking_entry(score_task(
+            as_record(row.task, deps), row.urgency, row.importance_score,
+            row.effort_score, row.dependency_score, row.depth, WEIGHTS
+        ))
+        for row in rows
+    ]
+
+def ranking_expires_sql(tasks, as_of):
+    """
+    ranking_expires over a queryset of tasks in one aggregate: for each
+    bucket boundary, the earliest due date still beyond it
+    """
+    earliest = tasks.aggregate(**{
+        f"after_{i}": Min("due_date", filter=Q(due_date__gt=as_of + timedelta(days=boundary)))
+        for i, boundary in enumerate(URGENCY_BOUNDARIES)
+    })
+    expiries = [
+        earliest[f"after_{i}"] - timedelta(days=boundary)
+        for i, boundary in enumerate(URGENCY_BOUNDARIES)
+        if earliest[f"after_{i}"]
+    ]
+    return min(expiries, default=None)
+
+def sql_ranking(mode, as_of=None, limit=None, cursor=None):
+    """
+    The stored ranking as of a date, ordered (and keyset paginated on
+    (depth, sort key, id) when limit is given) by the database.
+    Return: (ranked, warnings, cursor of the next page or None, valid_until
+    of the ranking, of the page's tasks for a page)
+    """
+
+    ensure_scored()
+
+    as_of = as_of or date.today()
+    key = SORT_KEY.get(mode, "priority")
+    rows = scored_tasks(mode, as_of)
+
+    if cursor:
+        depth, value, last_id = decode_cursor(cursor, 3)
+        rows = rows.filter(
+            Q(depth__gt=depth) |
+            Q(depth=depth, **{f"{key}__lt": value}) |
+            Q(depth=depth, **{key: value}, task_id__gt=last_id)
+        )
+
+    with stage("fetch"):
+        rows = list(rows if limit is None else rows[:limit + 1])
+        more = limit is not None and len(rows) > limit
+        rows = rows[:limit]
+        deps = dependency_lists([row.task_id for row in rows if row.depth])
+        if limit is None:
+            warned = list(warned_tasks(as_of))
+            valid_until = ranking_expires_sql(Task.objects.all(), as_of)
+
+    with stage("score"):
+        ranked = ranking_entries(rows, mode, deps)
+    if limit is not None:
+        # a page warns about its own tasks only, like stored_page, and
+        # expires with them, so LIMIT bounds all of its work
+        warned = ranked
+        valid_until = ranking_expires([row.task for row in rows], as_of)
+
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.depth, getattr(last, key), last.task_id)
+
+    return ranked, due_warnings(warned, as_of), next_cursor, valid_until
+
+def sql_top_k(mode, k, as_of=None):
+    """
+    Best k executable (depth 0) stored tasks, LIMIT k in the database.
+    Return: (top, warnings for the top tasks, valid_until)
+    """
+
+    ensure_scored()
+
+    as_of = as_of or date.today()
+    with stage("fetch"):
+        rows = list(scored_tasks(mode, as_of).filter(depth=0)[:k])
+        # only the executable tasks compete for the top k
+        valid_until = ranking_expires_sql(Task.objects.filter(score__depth=0), as_of)
+
+    with stage("score"):
+        # depth 0 tasks have no dependencies, no edges needed
+        top = ranking_entries(rows, mode, {})
+
+    return top, due_warnings(top, as_of), valid_until
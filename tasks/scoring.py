@@ -1,44 +1,170 @@
-from datetime import datetime, date
-from collections import defaultdict
+from datetime import datetime, date, timedelta
+import hashlib
+import json
+from collections import Counter, defaultdict, deque
+from bisect import bisect_right
+import heapq
+
+from .timing import timed
 
 class ValidationError(Exception):
-    pass 
+    """
+    index: of the task the message already names ("Task 3: ..."), if any
+    """
+    def __init__(self, message="", index=None):
+        super().__init__(message)
+        self.index = index
 
 class CycleError(Exception):
-    pass
+    def __init__(self, path):
+        super().__init__(" → ".join(map(str, path)))
+        self.path = path
+
+class TaskRecord:
+    """
+    A validated task. Slotted instead of a dict, a fraction of the memory
+    per task on large lists. It still reads like a mapping (task["id"],
+    task.get(...), {**task}) for code that treats tasks as dicts
+    """
+    __slots__ = ("id", "title", "due_date", "estimated_hours", "importance", "dependencies")
+
+    def __init__(self, id, title, due_date, estimated_hours, importance, dependencies):
+        self.id = id
+        self.title = title
+        self.due_date = due_date
+        self.estimated_hours = estimated_hours
+        self.importance = importance
+        self.dependencies = dependencies
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
 
-def validate_tasks(tasks, require_id=True):
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def as_dict(self):
+        return dict(zip(self.__slots__, self.values()))
+
+    def __repr__(self):
+        return f"TaskRecord({self.as_dict()!r})"
+
+def validate_tasks(tasks, require_id=True, collect_errors=False, as_of=None):
 
     """
     validate the list of tasks.
     Apply safe defaults for missing values
     Return: (normalized_tasks, warnings)
     Raise validationError on missing required fields 
+    (with collect_errors, after checking every task, .errors lists them all)
+    as_of is the date overdue is judged against, today by default
     """
 
     if not isinstance(tasks, list):
         raise ValidationError("tasks must be a list")
 
+    return validate_task_stream(tasks, require_id, collect_errors, as_of)
+
+@timed("validate")
+def validate_task_stream(tasks, require_id=True, collect_errors=False, as_of=None):
+    """
+    Same as validate_tasks for any iterable of tasks,
+    each task is validated as soon as it is read
+    """
+
+    validator = TaskValidator(require_id, as_of)
     normalized = []
     Warnings = []
     seen_ids = set()
+    errors = []
 
     for index, task in enumerate(tasks):
+        try:
+            normalized.append(validator.validate(task, index, seen_ids, Warnings))
+        except ValidationError as e:
+            if not collect_errors:
+                raise
+            errors.append(str(e) if e.index == index else f"Task {index+1}: {e}")
+
+    # Dependency existence check (only when IDs required)
+    if require_id:
+        all_ids = seen_ids
+        for task in normalized:
+            for dep in task["dependencies"]:
+                if dep not in all_ids:
+                    error = ValidationError(f"Task {task['id']}: unknown dependency '{dep}'")
+                    if not collect_errors:
+                        raise error
+                    errors.append(str(error))
+
+    if errors:
+        error = ValidationError(errors[0] if len(errors) == 1 else f"{len(errors)} errors: {errors[0]} ...")
+        error.errors = errors
+        raise error
+
+    return normalized, Warnings
+
+class TaskValidator:
+    """
+    Validates tasks one by one, with everything that doesn't depend on the
+    task worked out once: the required fields, today, and every due date
+    string parsed so far (task lists repeat the same few dates a lot)
+    """
+
+    def __init__(self, require_id=True, today=None):
+        self.require_id = require_id
+        self.required = ("id", "title", "estimated_hours", "dependencies") if require_id else ("title", "estimated_hours", "dependencies")
+        self.today = today or date.today()
+        self.dates = {}
+
+    def parse_date(self, value):
+        parsed = self.dates.get(value)
+        if parsed is None:
+            try:
+                # fast path for canonical YYYY-MM-DD, strptime decides everything else
+                year, month, day = value[:4], value[5:7], value[8:]
+                if (len(value) == 10 and value[4] == "-" and value[7] == "-" and value.isascii()
+                        and year.isdigit() and month.isdigit() and day.isdigit()):
+                    parsed = date(int(year), int(month), int(day))
+                else:
+                    raise ValueError
+            except ValueError:
+                try:
+                    parsed = datetime.strptime(value, "%Y-%m-%d").date()
+                except ValueError:
+                    raise ValidationError("invalid due_date format (use YYYY-MM-DD)")
+            self.dates[value] = parsed
+        return parsed
+
+    def validate(self, task, index, seen_ids, Warnings):
+        """
+        Validate one task dict, appending its warnings.
+        Return: its TaskRecord, with the defaults applied (the dict is left as it is)
+        """
+
         if not isinstance(task, dict):
             raise ValidationError("Task must be an object")
 
-        # Required base fields
-        required = ["title", "estimated_hours", "dependencies"]
-        if require_id:
-            required = ["id"] + required
-
-        for field in required:
+        for field in self.required:
             if field not in task:
-                raise ValidationError(f"Task {index+1}: missing field '{field}'")
+                raise ValidationError(f"Task {index+1}: missing field '{field}'", index)
 
         # Handle ID only if required
         task_id = None
-        if require_id:
+        if self.require_id:
             task_id = task["id"]
             if not isinstance(task_id, (str, int)):
                 raise ValidationError("id must be string or number")
@@ -47,7 +173,8 @@ def validate_tasks(tasks, require_id=True):
             seen_ids.add(task_id)
 
         # Title
-        if not isinstance(task["title"], str) or not task["title"].strip():
+        title = task["title"]
+        if not isinstance(title, str) or not title.strip():
             raise ValidationError("Invalid title")
 
         # Estimated hours
@@ -58,107 +185,207 @@ def validate_tasks(tasks, require_id=True):
         # Importance (default)
         importance = task.get("importance")
         if importance is None:
-            task["importance"] = 5
-            Warnings.append(f"'{task['title']}': importance defaulted to 5")
+            importance = 5
+            Warnings.append(f"'{title}': importance defaulted to 5")
         elif not isinstance(importance, int) or not (1 <= importance <= 10):
             raise ValidationError("importance must be integer 1-10")
 
         # Due date (optional)
         due = task.get("due_date")
         if due:
-            if isinstance(due, date):
-                task["due_date"] = due
-            elif isinstance(due, str):
-                try:
-                    task["due_date"] = datetime.strptime(due, "%Y-%m-%d").date()
-                except ValueError:
-                    raise ValidationError("invalid due_date format (use YYYY-MM-DD)")
-            else:
+            if isinstance(due, str):
+                due = self.parse_date(due)
+            elif not isinstance(due, date):
                 raise ValidationError("due_date must be string or date")
 
-            if task["due_date"] < date.today():
-                Warnings.append(f"'{task['title']}': task is overdue")
+            if due < self.today:
+                Warnings.append(f"'{title}': task is overdue")
         else:
-            task["due_date"] = None
-            Warnings.append(f"'{task['title']}': due_date missing")
-
-
+            due = None
+            Warnings.append(f"'{title}': due_date missing")
 
         # Dependencies
         deps = task["dependencies"]
         if not isinstance(deps, list):
             raise ValidationError("dependencies must be a list")
 
-        if require_id and task_id in deps:
+        if task_id is not None and task_id in deps:
             raise ValidationError("task cannot depend on itself")
 
-        normalized.append(task)
+        return TaskRecord(task_id, title, due, hours, importance, deps)
 
-    # Dependency existence check (only when IDs required)
-    if require_id:
-        all_ids = {task["id"] for task in normalized}
-        for task in normalized:
-            for dep in task["dependencies"]:
-                if dep not in all_ids:
-                    raise ValidationError(f"Task {task['id']}: unknown dependency '{dep}'")
+# Every component score comes from a few fixed levels. The *_bucket
+# functions classify a task into its level's index, so a weight mode's
+# priorities can all be worked out ahead of time (see PriorityTable)
 
-    return normalized, Warnings
+URGENCY_LEVELS = (0.05, 0.10, 0.20, 0.40, 0.65, 0.85, 0.95, 1.00)
+IMPORTANCE_LEVELS = tuple(importance/10 for importance in range(1, 11))
+EFFORT_LEVELS = (1.00, 0.70, 0.40, 0.20)
+DEPENDENCY_LEVELS = (0.0, 0.4, 0.7, 1.0)
+DOWNSTREAM_LEVELS = (0.0, 0.25, 0.5, 0.75, 1.0)
 
-def urgent_score_fun(due_date):
+def urgency_bucket(due_date, as_of=None):
     if not due_date:
-        return 0.05
-    
-    days_left = (due_date - date.today()).days
+        return 0
+
+    days_left = (due_date - (as_of or date.today())).days
 
     if days_left < 0: # Overdue
-        return 1.00
+        return 7
     elif days_left == 0: # Due today
-        return 0.95
+        return 6
     elif days_left == 1: # Due tomorrow
-        return 0.85
+        return 5
     elif 2 <= days_left <= 3:
-        return 0.65
+        return 4
     elif 4 <= days_left <= 7:
-        return 0.40
+        return 3
     elif 8 <= days_left <= 14:
-        return 0.20
-    return 0.10
+        return 2
+    return 1
+
+def urgent_score_fun(due_date, as_of=None):
+    return URGENCY_LEVELS[urgency_bucket(due_date, as_of)]
+
+# days left at which each urgency bucket above starts, from far away to overdue
+URGENCY_BOUNDARIES = (14, 7, 3, 1, 0, -1)
+
+def urgency_expires(due_date, as_of=None):
+    """
+    First date after as_of on which urgent_score_fun(due_date) changes,
+    None if it never does (no due date, already overdue)
+    """
+    if not due_date:
+        return None
+
+    days_left = (due_date - (as_of or date.today())).days
+    for boundary in URGENCY_BOUNDARIES:
+        if days_left > boundary:
+            return due_date - timedelta(days=boundary)
+    return None
+
+def ranking_expires(tasks, as_of=None):
+    """
+    First date on which the urgency of any of tasks changes, i.e. until
+    when a ranking of them computed as_of stays exact. None: never
+    """
+    as_of = as_of or date.today()
+    dates = {task.due_date for task in tasks}
+    dates.discard(None)
+    expiries = [expiry for expiry in (urgency_expires(due, as_of) for due in dates) if expiry]
+    return min(expiries, default=None)
 
 def important_score_fun(importance):
     # normalize the user given importance
 
     return importance/10
 
-def effor_score_fun(estimated_hours):
+def effort_bucket(estimated_hours):
     # lesser the time required to complete the task higher the effort_score
 
     if estimated_hours <= 1:
-        return 1.00
+        return 0
     elif 2 <= estimated_hours <= 4:
-        return 0.70
+        return 1
     elif 5 <= estimated_hours <= 8:
-        return 0.40
-    return 0.20
+        return 2
+    return 3
+
+def effor_score_fun(estimated_hours):
+    return EFFORT_LEVELS[effort_bucket(estimated_hours)]
+
+def dependency_bucket(no_of_dependents):
+    # more dependent tasks higher priority, 3 or more all count the same
+    return min(no_of_dependents, 3)
 
 def dependency_score_fun(no_of_dependents):
-    # more dependent tasks higher priority
+    return DEPENDENCY_LEVELS[dependency_bucket(no_of_dependents)]
 
-    if no_of_dependents == 0:
-        return 0.0
-    elif no_of_dependents == 1:
-        return 0.4
-    elif no_of_dependents == 2:
-        return 0.7
-    return 1.0
+def dependents_counts(tasks):
+    # number of tasks depending on each id, the only use of the dependents
+    return Counter(dep for task in tasks for dep in task.dependencies)
 
-def build_dependents_map(tasks):
-    depentents = defaultdict(list)
+# downstream tasks and hours where each downstream level after the first
+# starts: hours up to two days, two weeks, two months of work
+DOWNSTREAM_TASKS = (1, 3, 10, 50)
+DOWNSTREAM_HOURS = (1, 16, 80, 320)
 
-    for task in tasks:
-        for dep in task["dependencies"]:
-            depentents[dep].append(task["id"])
+def downstream_bucket(downstream_tasks, downstream_hours):
+    # the higher of the levels of the number and of the hours of the tasks
+    return max(bisect_right(DOWNSTREAM_TASKS, downstream_tasks), bisect_right(DOWNSTREAM_HOURS, downstream_hours))
 
-    return depentents
+@timed("graph")
+def downstream_buckets(tasks):
+    """
+    {task_id: downstream bucket} of validated tasks, from every task
+    waiting on each one directly or not. One pass from the tasks nothing
+    depends on back to their dependencies: the ids downstream of a task
+    are its dependents and the ids downstream of them.
+    Only levels below the top need the exact ids. A task reaching the top
+    level (DOWNSTREAM_TASKS[-1] ids at most) drops its set and so do all
+    its dependencies, and a set is freed once every dependency read it, so
+    time and memory stay O((V + E) * DOWNSTREAM_TASKS[-1]) where full
+    reachability is O(V²). Tasks on a cycle get 0
+    """
+    position = {task.id: i for i, task in enumerate(tasks)}
+    hours = [task.estimated_hours for task in tasks]
+    dependents = [[] for _ in tasks]
+    # number of dependents not done yet, of dependencies not done reading
+    waiting = [0] * len(tasks)
+    readers = [0] * len(tasks)
+    deps = []
+    for i, task in enumerate(tasks):
+        task_deps = [position[dep] for dep in task.dependencies if dep in position]
+        deps.append(task_deps)
+        readers[i] = len(task_deps)
+        for j in task_deps:
+            dependents[j].append(i)
+            waiting[j] += 1
+
+    queue = [i for i, count in enumerate(waiting) if not count]
+    top = len(DOWNSTREAM_LEVELS) - 1
+    cap = DOWNSTREAM_TASKS[-1]
+    # downstream positions of the tasks not read by all their dependencies yet, None at the top level
+    downstream = {}
+    buckets = [0] * len(tasks)
+
+    while queue:
+        i = queue.pop()
+
+        reach = set()
+        for j in dependents[i]:
+            if reach is not None:
+                below = downstream[j]
+                if below is None:
+                    reach = None
+                else:
+                    reach.add(j)
+                    reach |= below
+                    if len(reach) >= cap:
+                        reach = None
+            readers[j] -= 1
+            if not readers[j]:
+                del downstream[j]
+
+        if reach is None:
+            buckets[i] = top
+        elif reach:
+            buckets[i] = downstream_bucket(len(reach), sum([hours[j] for j in reach]))
+            if buckets[i] == top:
+                reach = None
+        if readers[i]:
+            downstream[i] = reach
+
+        for j in deps[i]:
+            waiting[j] -= 1
+            if not waiting[j]:
+                queue.append(j)
+
+    return dict(zip(position, buckets))
+
+def weighs_downstream(mode):
+    # the downstream component is optional, only computed for modes giving it a weight
+    return bool(WEIGHT_METHOD[mode].get("downstream"))
 
 def is_blocked(task):
     return len(task["dependencies"]) > 0
@@ -204,98 +431,353 @@ WEIGHT_METHOD = {
     "deadline": DEADLINE_WEIGHT
 }
 
-def compute_depth(task_id, graph, memo):
-    if task_id in memo:
-        return memo[task_id]
+BUILTIN_MODES = tuple(WEIGHT_METHOD)
 
-    if task_id not in graph or not graph[task_id]:
-        memo[task_id] = 0
-        return 0
+@timed("cycle")
+def topological_depths(graph):
+    """
+    Single iterative pass (Kahn's algorithm) over graph: task -> dependencies.
+    Return: {task_id: depth}, depth 0 means the task can be started right away
+    Raise CycleError with the exact cycle path if the graph is not a DAG
+    """
+
+    remaining = {}
+    dependents = defaultdict(list)
+    queue = deque()
+    depths = {}
+    processed = 0
+
+    for node, deps in graph.items():
+        remaining[node] = len(deps)
+        for dep in deps:
+            dependents[dep].append(node)
+        if not deps:
+            queue.append(node)
+            depths[node] = 0
+
+    # dependencies that are not tasks themselves behave like finished leaves
+    for dep in dependents:
+        if dep not in remaining:
+            queue.append(dep)
+            depths[dep] = 0
+    total = len(queue) + sum(1 for count in remaining.values() if count)
+
+    while queue:
+        node = queue.popleft()
+        processed += 1
+        next_depth = depths[node] + 1
+        for dependent in dependents[node]:
+            if next_depth > depths.get(dependent, 0):
+                depths[dependent] = next_depth
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                queue.append(dependent)
+
+    if processed < total:
+        raise CycleError(find_cycle(graph, remaining))
+
+    return depths
+
+def find_cycle(graph, remaining):
+    # every unresolved task still waits on at least one unresolved dependency,
+    # so following those edges from any of them must come back around
+    start = next(node for node, count in remaining.items() if count > 0)
+
+    path = []
+    position = {}
+    node = start
+    while node not in position:
+        position[node] = len(path)
+        path.append(node)
+        node = next(dep for dep in graph[node] if remaining.get(dep, 0) > 0)
+
+    return path[position[node]:] + [node]
 
-    max_dependency_depth = 0
-    for dependency in graph[task_id]:
-        max_dependency_depth = max(max_dependency_depth, compute_depth(dependency, graph, memo))
-    
-    memo[task_id] = 1 + max_dependency_depth
-    return memo[task_id]
+def compute_depth(task_id, graph, memo):
+    if task_id not in memo:
+        memo.update(topological_depths(graph))
+    return memo.get(task_id, 0)
 
 
-def score_tasks(tasks, graph, mode):
-    dependents_map = build_dependents_map(tasks)
-    depth_cache = {}
-    results = []
-    WEIGHTS = WEIGHT_METHOD[mode]
+@timed("graph")
+def build_graph(tasks):
+    """
+    Returns adjacency list: task -> dependencies
+    """
+    graph = defaultdict(list)
 
     for task in tasks:
-        urgent_score = urgent_score_fun(task["due_date"])
-        important_score = important_score_fun(task["importance"])
-        effor_score = effor_score_fun(task["estimated_hours"])
-        dependency_score = dependency_score_fun(len(dependents_map[task["id"]]))
-
-        priority_score = (
-            urgent_score * WEIGHTS["urgency"] +
-            important_score * WEIGHTS["importance"] + 
-            effor_score * WEIGHTS["effort"] +
-            dependency_score * WEIGHTS["dependency"]
-        )
+        graph[task.id] = task.dependencies
 
-        blocked = is_blocked(task)
-        if blocked:
-            priority_score *= BLOCKED_PENALTY
-
-        depth = compute_depth(task["id"], graph, depth_cache)
-
-        reasons = []
-        if urgent_score >= 0.85:
-            if urgent_score == 1.0:
-                reasons.append(f"Deadline crossed")
-            else:
-                reasons.append(f"Urgent Deadline {task["due_date"]}")
-        if important_score >= 0.8:
-            reasons.append("High importance")
-        if effor_score >= 0.7:
-            reasons.append("Quick win")
-        if dependency_score >= 0.7:
-            reasons.append("Unblocks other tasks")  
-        if blocked:
-            reasons.append(f"Currently blocked by task/s {task["dependencies"]}")
-        
-        results.append({
-            "id": task["id"],
-            "title": task["title"],
-            "due_date": task["due_date"],
-            "effort": task["estimated_hours"],
-            "importance": task["importance"],
-            "score": round(priority_score, 2),
-            "priority_indicator": "High" if priority_score >= 0.75 else "Medium" if priority_score >= 0.40 else "Low",
-            "depth": depth,
-            "urgency_score": urgent_score,
-            "importance_score": important_score,
-            "effort_score": effor_score,
-            "dependency_score": dependency_score,
-            "reasons": reasons
-        })
+    return graph
+
+def detect_cycle(graph):
+    """
+    Raise CycleError with the cycle path, otherwise
+    return the depth of every task from the same pass
+    """
+    return topological_depths(graph)
+
+
+def priority_score_fun(urgent_score, important_score, effor_score, dependency_score, blocked, WEIGHTS, downstream_score=0.0):
+    priority_score = (
+        urgent_score * WEIGHTS["urgency"] +
+        important_score * WEIGHTS["importance"] + 
+        effor_score * WEIGHTS["effort"] +
+        dependency_score * WEIGHTS["dependency"] +
+        downstream_score * WEIGHTS.get("downstream", 0.0)
+    )
+
+    if blocked:
+        priority_score *= BLOCKED_PENALTY
+
+    return priority_score
+
+def bucket_index(urgency, importance, effort, dependency, downstream, blocked):
+    # position of a combination of level indexes in a PriorityTable
+    return ((((urgency * 10 + importance) * 4 + effort) * 4 + dependency) * 5 + downstream) * 2 + blocked
+
+class PriorityTable:
+    """
+    priority_score_fun of one weight mode for every combination of
+    component levels and blocked flag (8 * 10 * 4 * 4 * 5 * 2 of them),
+    indexed by bucket_index, with the two decimal scores alongside
+    """
+    __slots__ = ("weights", "priority", "score")
+
+    def __init__(self, WEIGHTS):
+        self.weights = WEIGHTS
+        self.priority = [
+            priority_score_fun(urgency, importance, effort, dependency, blocked, WEIGHTS, downstream)
+            for urgency in URGENCY_LEVELS
+            for importance in IMPORTANCE_LEVELS
+            for effort in EFFORT_LEVELS
+            for dependency in DEPENDENCY_LEVELS
+            for downstream in DOWNSTREAM_LEVELS
+            for blocked in (False, True)
+        ]
+        self.score = [round(priority, 2) for priority in self.priority]
+
+PRIORITY_TABLES = {mode: PriorityTable(WEIGHTS) for mode, WEIGHTS in WEIGHT_METHOD.items()}
+
+def register_weight_mode(name, weights):
+    """
+    Add a weight mode (or replace a custom one) at runtime, ranked by its
+    priority score like smart. weights: {"urgency", "importance", "effort", "dependency"}
+    and optionally "downstream"
+    """
+    if name in BUILTIN_MODES:
+        raise ValueError(f"'{name}' is a built-in mode")
+    if not {"urgency", "importance", "effort", "dependency"} <= set(weights) <= {"urgency", "importance", "effort", "dependency", "downstream"}:
+        raise ValueError("weights must give exactly urgency, importance, effort and dependency, and optionally downstream")
+    if not all(isinstance(weight, (int, float)) and not isinstance(weight, bool) for weight in weights.values()):
+        raise ValueError("weights must be numbers")
+
+    WEIGHTS = {key: float(weight) for key, weight in weights.items()}
+    PRIORITY_TABLES[name] = PriorityTable(WEIGHTS)
+    WEIGHT_METHOD[name] = WEIGHTS
+
+def weights_digest(modes):
+    """
+    Short hash of the weights of modes, for cache keys and ETags: it
+    changes when register_weight_mode replaces a custom mode
+    """
+    weights = json.dumps([[mode, WEIGHT_METHOD[mode]] for mode in modes], sort_keys=True)
+    return hashlib.sha1(weights.encode()).hexdigest()[:16]
 
+class ScoredTask:
+    """
+    Component scores and priority of one task, ranked as they are and
+    turned into a response entry (reasons included) by ranking_entry
+    only once they are returned
+    """
+    __slots__ = (
+        "task", "urgency_score", "importance_score", "effort_score",
+        "dependency_score", "depth", "blocked", "priority", "score"
+    )
+
+    def __init__(self, task, urgency_score, importance_score, effort_score, dependency_score, depth, blocked, priority, score):
+        self.task = task
+        self.urgency_score = urgency_score
+        self.importance_score = importance_score
+        self.effort_score = effort_score
+        self.dependency_score = dependency_score
+        self.depth = depth
+        self.blocked = blocked
+        self.priority = priority
+        self.score = score
+
+def score_task(task, urgent_score, important_score, effor_score, dependency_score, depth, WEIGHTS, downstream_score=0.0):
+    """
+    Combine the component scores of one task (a TaskRecord or dict)
+    """
+
+    blocked = is_blocked(task)
+    priority_score = priority_score_fun(urgent_score, important_score, effor_score, dependency_score, blocked, WEIGHTS, downstream_score)
+
+    return ScoredTask(
+        task, urgent_score, important_score, effor_score, dependency_score,
+        depth, blocked, priority_score, round(priority_score, 2)
+    )
+
+def score_record(task, dependents, depth, as_of, table, downstream=0):
+    """
+    score_task of a validated TaskRecord: classify it into its levels
+    and look its priority up in the mode's PriorityTable. downstream is
+    its downstream bucket, 0 when no mode weighs it.
+    Return: (ScoredTask, its bucket_index)
+    """
+    urgency = urgency_bucket(task.due_date, as_of)
+    importance = task.importance - 1
+    effort = effort_bucket(task.estimated_hours)
+    dependency = dependency_bucket(dependents)
+    blocked = bool(task.dependencies)
+    index = bucket_index(urgency, importance, effort, dependency, downstream, blocked)
+
+    return ScoredTask(
+        task, URGENCY_LEVELS[urgency], IMPORTANCE_LEVELS[importance], EFFORT_LEVELS[effort],
+        DEPENDENCY_LEVELS[dependency], depth, blocked, table.priority[index], table.score[index]
+    ), index
+
+def rescore(scored, index, table):
+    # the same task with the priority of another mode
+    return ScoredTask(
+        scored.task, scored.urgency_score, scored.importance_score, scored.effort_score,
+        scored.dependency_score, scored.depth, scored.blocked, table.priority[index], table.score[index]
+    )
+
+def reasons_of(scored):
+    task = scored.task
+    reasons = []
+    if scored.urgency_score >= 0.85:
+        if scored.urgency_score == 1.0:
+            reasons.append(f"Deadline crossed")
+        else:
+            reasons.append(f"Urgent Deadline {task["due_date"]}")
+    if scored.importance_score >= 0.8:
+        reasons.append("High importance")
+    if scored.effort_score >= 0.7:
+        reasons.append("Quick win")
+    if scored.dependency_score >= 0.7:
+        reasons.append("Unblocks other tasks")  
+    if scored.blocked:
+        reasons.append(f"Currently blocked by task/s {task["dependencies"]}")
+    return reasons
+
+def priority_indicator(priority_score):
+    return "High" if priority_score >= 0.75 else "Medium" if priority_score >= 0.40 else "Low"
+
+def rank_key(mode):
+    # depth first so blocked tasks never outrank their blockers
     if mode == "fastest":
-        results.sort(key=lambda x: (x["depth"], -x["effort_score"]))
+        return lambda x: (x.depth, -x.effort_score)
     elif mode == "impact":
-        results.sort(key=lambda x: (x["depth"], -x["importance_score"]))
+        return lambda x: (x.depth, -x.importance_score)
     elif mode == "deadline":
-        results.sort(key=lambda x: (x["depth"], -x["urgency_score"]))
-    else:
-        results.sort(key=lambda x: (x["depth"], -x["score"]))
+        return lambda x: (x.depth, -x.urgency_score)
+    return lambda x: (x.depth, -x.score)
 
-    final_modified_result = [{
+def ranking_entry(scored):
+    """
+    The response dict of a ScoredTask
+    """
+    task = scored.task
+    return {
         "id": task["id"],
         "title": task["title"],
         "due_date": task["due_date"],
-        "effort": task["effort"],
+        "effort": task["estimated_hours"],
         "importance": task["importance"],
-        "priority_score": task["score"],
-        "priority_indicator": task["priority_indicator"],
-        "depth": task["depth"],
-        "reasons": task["reasons"]
-    } for task in results]
+        "priority_score": scored.score,
+        "priority_indicator": priority_indicator(scored.priority),
+        "depth": scored.depth,
+        "reasons": reasons_of(scored)
+    }
+
+def mode_entry(entry, scored):
+    # copy of another mode's entry for the same task with this mode's priority
+    entry = entry.copy()
+    entry["priority_score"] = scored.score
+    entry["priority_indicator"] = priority_indicator(scored.priority)
+    return entry
+
+def rank_results(results, mode):
+    """
+    Sort scored tasks for the mode (depth first) and shape the response entries
+    """
+
+    results.sort(key=rank_key(mode))
 
+    return [ranking_entry(task) for task in results]
 
-    return final_modified_result
\ No newline at end of file
+def top_results(results, mode, k):
+    """
+    Best k scored tasks with a bounded heap instead of a full sort,
+    same order (ties included) as rank_results(results, mode)[:k]
+    """
+
+    return [ranking_entry(task) for task in heapq.nsmallest(k, results, key=rank_key(mode))]
+
+@timed("score")
+def top_executable(tasks, mode, k, as_of=None):
+    """
+    Best k tasks that can be started now (no dependencies).
+    Only those are scored, the rest just feed the dependents counts
+    """
+
+    dependents = dependents_counts(tasks)
+    downstream = downstream_buckets(tasks) if weighs_downstream(mode) else {}
+    table = PRIORITY_TABLES[mode]
+    as_of = as_of or date.today()
+
+    results = [
+        score_record(task, dependents[task.id], 0, as_of, table, downstream.get(task.id, 0))[0]
+        for task in tasks if not task.dependencies
+    ]
+
+    return top_results(results, mode, k)
+
+@timed("score")
+def score_tasks(tasks, graph, mode, depths=None, as_of=None):
+    return score_tasks_modes(tasks, graph, [mode], depths, as_of)[mode]
+
+@timed("score")
+def score_tasks_modes(tasks, graph, modes, depths=None, as_of=None):
+    """
+    Rankings of the same tasks for several modes. Dependents, depths and
+    the levels of every task are worked out once, the other modes only
+    look up their priorities
+    Return: {mode: ranked}
+    """
+    dependents = dependents_counts(tasks)
+    if depths is None:
+        depths = topological_depths(graph)
+    downstream = downstream_buckets(tasks) if any(map(weighs_downstream, modes)) else {}
+    as_of = as_of or date.today()
+
+    first, *others = modes
+    table = PRIORITY_TABLES[first]
+    results, indexes = [], []
+    for task in tasks:
+        scored, index = score_record(
+            task, dependents[task.id], depths.get(task.id, 0), as_of, table, downstream.get(task.id, 0)
+        )
+        results.append(scored)
+        indexes.append(index)
+
+    if not others:
+        return {first: rank_results(results, first)}
+
+    rankings = {}
+    for mode in others:
+        table = PRIORITY_TABLES[mode]
+        rankings[mode] = [rescore(scored, index, table) for scored, index in zip(results, indexes)]
+    rankings[first] = results
+
+    # everything but the priority is the same in every mode, reasons included
+    entries = {scored.task.id: ranking_entry(scored) for scored in results}
+    ranked = {}
+    for mode in modes:
+        rankings[mode].sort(key=rank_key(mode))
+        ranked[mode] = [mode_entry(entries[scored.task.id], scored) for scored in rankings[mode]]
+    return ranked
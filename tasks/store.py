@@ -0,0 +1,625 @@
+"""
+Materialized scores for the tasks stored in the database.
+
+Writes keep one TaskScore row per task up to date, touching only the
+tasks they affect. analyze_db and suggest then rank from a single query
+instead of validating, graph building and scoring every row on each GET.
+"""
+
+from datetime import date
+from collections import defaultdict
+import base64
+import json
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import CharField, Q, Min
+from django.db.models.functions import Cast
+import numpy as np
+
+from .dag import dependency_index, tasks_added, bump_version, table_version
+from .models import Task, TaskDependency, TaskScore
+from .scoring import (
+    ValidationError, TaskRecord, validate_tasks, detect_cycle,
+    urgent_score_fun, important_score_fun, effor_score_fun, dependency_score_fun,
+    priority_score_fun, score_task, rank_results, top_results, ranking_entry, WEIGHT_METHOD,
+    urgency_expires, downstream_buckets, weighs_downstream, DOWNSTREAM_LEVELS
+)
+from .plan import build_plan
+from .vectorized import EFFORT_CAP, column_buckets, bucket_rank_keys, date_ordinals, urgency_expiry
+from .timing import stage, timed
+
+
+TASK_FIELDS = ("id", "title", "due_date", "estimated_hours", "importance")
+
+def chunks(ids, size=900):
+    # stay under SQLite's limit on query parameters
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def edge_queries(task_ids):
+    # the edges of task_ids as (id, task_id, depends_on_id), a query per chunk
+    return [
+        TaskDependency.objects.filter(task_id__in=chunk).values_list("id", "task_id", "depends_on_id")
+        for chunk in chunks(task_ids)
+    ]
+
+def group_edges(edges):
+    """
+    {task_id: [dependency ids]} of edge_queries rows, in the order the
+    edges were added
+    """
+    deps = defaultdict(list)
+    for _, task_id, dep in sorted(edges):
+        deps[task_id].append(dep)
+    return deps
+
+def dependency_lists(task_ids):
+    """
+    {task_id: [dependency ids]} of task_ids, in the order they were added
+    """
+    return group_edges(edge for query in edge_queries(task_ids) for edge in query)
+
+def as_record(task, deps):
+    return TaskRecord(task.id, task.title, task.due_date, task.estimated_hours, task.importance, deps.get(task.id, []))
+
+def task_rows():
+    # every stored task as a dict without its dependencies, in id order
+    return Task.objects.order_by("id").values(*TASK_FIELDS)
+
+def with_dependencies(tasks, deps):
+    for task in tasks:
+        task["dependencies"] = list(deps.get(task["id"], ()))
+    return tasks
+
+@timed("fetch")
+def load_tasks():
+    """
+    All stored tasks as the dicts validate_tasks expects
+    """
+    tasks = list(task_rows())
+    # edges from the index, synced after the rows so it knows every one of them
+    return with_dependencies(tasks, dependency_index().deps)
+
+def existing_ids(ids):
+    """
+    The subset of ids that are stored tasks
+    """
+    index = dependency_index()
+    return set(ids) - set(index.missing(ids))
+
+def clean_dependency_ids(deps):
+    """
+    Return: deps without duplicates, all of them must be task ids
+    """
+    deps = list(dict.fromkeys(deps))
+
+    for dep in deps:
+        if not isinstance(dep, int) or isinstance(dep, bool):
+            raise ValidationError("dependencies must be a list of task ids")
+
+    return deps
+
+def require_found(deps, found):
+    for dep in deps:
+        if dep not in found:
+            raise ValidationError(f"unknown dependency '{dep}'")
+
+def check_dependencies(deps):
+    """
+    Dependencies of a new task must be ids of stored tasks.
+    Return: deps without duplicates, one indexed lookup for the whole list
+    """
+    deps = clean_dependency_ids(deps)
+    require_found(deps, existing_ids(deps))
+    return deps
+
+class LocalRef:
+    """
+    Dependency on another task of the same batch, by its position.
+    create_tasks swaps it for that task's new id.
+    """
+    __slots__ = ("index",)
+
+    def __init__(self, index):
+        self.index = index
+
+def create_tasks(tasks, batch_size=1000):
+    """
+    Insert validated tasks (dependencies already checked) and their edges
+    in chunks of batch_size, then score them. Call inside a transaction.
+    Dependencies are stored ids or LocalRef to tasks of the same list,
+    which must not form a cycle.
+    Return: the new ids, in order
+    """
+
+    objs = Task.objects.bulk_create([
+        Task(
+            # an id reserved by the write behind queue, None for a new one
+            id=task.get("id"),
+            title=task["title"],
+            due_date=task.get("due_date"),
+            estimated_hours=task["estimated_hours"],
+            importance=task["importance"]
+        )
+        for task in tasks
+    ], batch_size=batch_size)
+    ids = [obj.id for obj in objs]
+
+    created = [
+        {**task, "id": task_id, "dependencies": [
+            ids[dep.index] if isinstance(dep, LocalRef) else dep
+            for dep in task["dependencies"]
+        ]}
+        for task_id, task in zip(ids, tasks)
+    ]
+
+    TaskDependency.objects.bulk_create([
+        TaskDependency(task_id=task["id"], depends_on_id=dep)
+        for task in created
+        for dep in task["dependencies"]
+    ], batch_size=batch_size)
+
+    # record_new_tasks wants dependencies before their dependents
+    local_graph = {
+        i: [dep.index for dep in task["dependencies"] if isinstance(dep, LocalRef)]
+        for i, task in enumerate(tasks)
+    }
+    local_depths = detect_cycle(local_graph)
+    order = sorted(range(len(created)), key=local_depths.__getitem__)
+    record_new_tasks([created[i] for i in order])
+
+    return ids
+
+def smart_score_of(row):
+    # depth > 0 exactly when the task has dependencies, i.e. is blocked
+    return round(priority_score_fun(
+        row.urgency_score, row.importance_score, row.effort_score,
+        row.dependency_score, row.depth > 0, WEIGHT_METHOD["smart"]
+    ), 2)
+
+def score_row(task, dependents_count, depth, today):
+    row = TaskScore(
+        task_id=task["id"],
+        urgency_score=urgent_score_fun(task["due_date"], today),
+        importance_score=important_score_fun(task["importance"]),
+        effort_score=effor_score_fun(task["estimated_hours"]),
+        dependency_score=dependency_score_fun(dependents_count),
+        dependents_count=dependents_count,
+        depth=depth,
+        scored_on=today,
+        urgency_valid_until=urgency_expires(task["due_date"], today)
+    )
+    row.smart_score = smart_score_of(row)
+    return row
+
+def rescore_urgency(row, due_date, today):
+    row.urgency_score = urgent_score_fun(due_date, today)
+    row.smart_score = smart_score_of(row)
+    row.scored_on = today
+    row.urgency_valid_until = urgency_expires(due_date, today)
+
+def urgency_current(row, as_of):
+    # the stored urgency still holds on as_of
+    return row.scored_on <= as_of and (row.urgency_valid_until is None or as_of < row.urgency_valid_until)
+
+def rows_expire(rows):
+    # first day any of rows (all current) needs a new urgency, None: never
+    return min((row.urgency_valid_until for row in rows if row.urgency_valid_until), default=None)
+
+URGENCY_FIELDS = ["urgency_score", "smart_score", "scored_on", "urgency_valid_until"]
+
+@timed("rebuild")
+def rebuild_scores():
+    """
+    Recompute every row from scratch.
+    Raise ValidationError / CycleError like the full pipeline would
+    """
+
+    tasks, _ = validate_tasks(load_tasks(), require_id=True)
+    # the index has the depths already, they raise CycleError on a stored cycle
+    index = dependency_index()
+    depths, dependents = index.depths, index.dependents
+    today = date.today()
+
+    rows = [
+        score_row(task, dependents[task.id], depths.get(task.id, 0), today)
+        for task in tasks
+    ]
+
+    with transaction.atomic():
+        TaskScore.objects.all().delete()
+        TaskScore.objects.bulk_create(rows, batch_size=1000)
+
+def record_new_tasks(tasks):
+    """
+    Score freshly inserted tasks (dicts with their new id) and bump the
+    dependents count of the tasks they depend on. Dependencies inside
+    tasks must come first.
+
+    A task depending on something without a score row (unknown id or an
+    already stale store) is left unscored, the next read rebuilds instead.
+    """
+
+    dep_ids = {dep for task in tasks for dep in task["dependencies"]}
+    known = {row.task_id: row for row in TaskScore.objects.filter(task_id__in=dep_ids)}
+    existing = set(known)
+    created = []
+    today = date.today()
+
+    for task in tasks:
+        deps = task["dependencies"]
+        if not all(dep in known for dep in deps):
+            continue
+
+        depth = 1 + max(known[dep].depth for dep in deps) if deps else 0
+        row = score_row(task, 0, depth, today)
+        known[task["id"]] = row
+        created.append(row)
+
+        for dep in deps:
+            dep_row = known[dep]
+            dep_row.dependents_count += 1
+            dep_row.dependency_score = dependency_score_fun(dep_row.dependents_count)
+            dep_row.smart_score = smart_score_of(dep_row)
+
+    TaskScore.objects.bulk_create(created, batch_size=1000)
+    TaskScore.objects.bulk_update(
+        [known[dep] for dep in existing],
+        ["dependents_count", "dependency_score", "smart_score"],
+        batch_size=1000
+    )
+    tasks_added(tasks, bump_version())
+
+def record_created_task(task):
+    """
+    record_new_tasks for a task the async ORM inserted outside a
+    transaction, its row first and then its edges. A write from elsewhere
+    may have had every row rebuilt in between, this task's included: the
+    rows are then left to the next read to rebuild
+    """
+    try:
+        with transaction.atomic():
+            record_new_tasks([task])
+    except IntegrityError:
+        invalidate()
+
+def invalidate():
+    # for writes that don't go through record_new_tasks (admin edits),
+    # the next read rebuilds every row
+    TaskScore.objects.all().delete()
+    bump_version()
+
+# table version every task was last seen to have a score row at
+_complete_at = None
+
+def is_stale():
+    """
+    Whether some task has no score row. Only writes change that and each
+    write bumps the table version, so the check over every task runs once
+    per version, later reads cost one indexed lookup
+    """
+    global _complete_at
+
+    version = table_version()
+    if version == _complete_at:
+        return False
+    if Task.objects.filter(score__isnull=True).exists():
+        return True
+    if not connection.in_atomic_block:
+        # a transaction may still roll back to another state of this version
+        _complete_at = version
+    return False
+
+def ensure_scored():
+    # every task gets its score row back, see is_stale
+    if is_stale():
+        rebuild_scores()
+
+def due_warnings(tasks, today):
+    # the only warnings validate_tasks can raise for stored rows
+    warnings = []
+    for task in tasks:
+        if task["due_date"] is None:
+            warnings.append(f"'{task['title']}': due_date missing")
+        elif task["due_date"] < today:
+            warnings.append(f"'{task['title']}': task is overdue")
+    return warnings
+
+def row_downstream(rows, deps):
+    # downstream buckets of the stored tasks, from the rows of every task
+    return downstream_buckets([as_record(row.task, deps) for row in rows])
+
+def score_rows(rows, WEIGHTS, as_of, deps, downstream=None):
+    """
+    Scored entries for TaskScore rows (with their task selected) as of a date.
+    Rows whose urgency doesn't hold on as_of get it refreshed in memory,
+    they only need saving when as_of is today. downstream: row_downstream
+    of every row, for modes weighing it.
+    Return: (results, expired rows to save), no database access
+    """
+
+    results = []
+    expired = []
+    save = as_of == date.today()
+    downstream = downstream or {}
+
+    for row in rows:
+        task = as_record(row.task, deps)
+
+        if not urgency_current(row, as_of):
+            rescore_urgency(row, task.due_date, as_of)
+            if save:
+                expired.append(row)
+
+        results.append(score_task(
+            task, row.urgency_score, row.importance_score, row.effort_score,
+            row.dependency_score, row.depth, WEIGHTS, DOWNSTREAM_LEVELS[downstream.get(task.id, 0)]
+        ))
+
+    return results, expired
+
+def scored_results(rows, WEIGHTS, today, deps):
+    results, expired = score_rows(rows, WEIGHTS, today, deps)
+    TaskScore.objects.bulk_update(expired, URGENCY_FIELDS, batch_size=1000)
+    return results
+
+def refresh_expired(today):
+    """
+    Bring the urgency of every row whose urgency bucket changed by today
+    up to date, so the database can order by it
+    """
+    rows = TaskScore.objects.select_related("task")
+    # two indexed range reads of the expired rows only, the OR of both
+    # conditions would read every row
+    expired = list(rows.filter(urgency_valid_until__lte=today))
+    expired += rows.filter(scored_on__gt=today).exclude(urgency_valid_until__lte=today)
+    for row in expired:
+        rescore_urgency(row, row.task.due_date, today)
+    TaskScore.objects.bulk_update(expired, URGENCY_FIELDS, batch_size=1000)
+
+@timed("score")
+def rank_rows_modes(rows, modes, today, deps):
+    """
+    Full rankings of TaskScore rows as of today in several modes, no
+    database access. The rows are brought up to date once and only the
+    weighted sum is redone per mode.
+    Return: ({mode: ranked}, warnings, valid_until, expired rows to save)
+    """
+    first, *others = modes
+    downstream = row_downstream(rows, deps) if any(map(weighs_downstream, modes)) else {}
+    results, expired = score_rows(rows, WEIGHT_METHOD[first], today, deps, downstream)
+    warnings = due_warnings([result.task for result in results], today)
+
+    rankings = {first: results}
+    for mode in others:
+        WEIGHTS = WEIGHT_METHOD[mode]
+        rankings[mode] = [
+            score_task(
+                result.task, result.urgency_score, result.importance_score,
+                result.effort_score, result.dependency_score, result.depth, WEIGHTS,
+                DOWNSTREAM_LEVELS[downstream.get(result.task.id, 0)]
+            )
+            for result in results
+        ]
+
+    return {mode: rank_results(rankings[mode], mode) for mode in modes}, warnings, rows_expire(rows), expired
+
+@timed("score")
+def top_rows(rows, mode, k, today):
+    """
+    Best k of depth 0 TaskScore rows as of today, no database access.
+    Return: (top, valid_until, expired rows to save)
+    """
+    if weighs_downstream(mode):
+        raise ValidationError("Suggestions from stored scores can't weigh downstream work, use engine=python")
+    # depth 0 tasks have no dependencies, no edges needed
+    results, expired = score_rows(rows, WEIGHT_METHOD[mode], today, {})
+
+    return top_results(results, mode, k), rows_expire(rows), expired
+
+def warned_tasks(today):
+    # tasks that get a warning: no due date or overdue
+    return (
+        Task.objects.filter(Q(due_date__isnull=True) | Q(due_date__lt=today))
+        .order_by("id").values("title", "due_date")
+    )
+
+def scored_rows():
+    # every TaskScore row with its task, in id order
+    return TaskScore.objects.select_related("task").order_by("task_id")
+
+def stored_rankings(modes, as_of=None):
+    """
+    Rank the stored tasks from their materialized scores in several modes,
+    from a single fetch.
+    Return: ({mode: ranked}, warnings, valid_until) exactly as the full pipeline would
+    """
+
+    ensure_scored()
+
+    today = as_of or date.today()
+    with stage("fetch"):
+        rows = list(scored_rows())
+        deps = dependency_index().deps
+
+    rankings, warnings, valid_until, expired = rank_rows_modes(rows, modes, today, deps)
+    with stage("save"):
+        TaskScore.objects.bulk_update(expired, URGENCY_FIELDS, batch_size=1000)
+
+    return rankings, warnings, valid_until
+
+# columns a plan is made from, no task or row objects are built; the due
+# dates as their ISO text, NumPy parses them all at once
+PLAN_COLUMNS = ("task_id", "task__estimated_hours", "due", "task__importance", "dependents_count", "depth")
+
+def stored_plan(mode, hours_per_day, start, as_of=None):
+    """
+    Day by day plan (see plan.build_plan) of every stored task, ranked
+    column by column from the task fields and the materialized dependents
+    counts and depths, edges from the dependency index.
+    Return: (plan, warnings, valid_until)
+    """
+
+    ensure_scored()
+
+    today = as_of or date.today()
+    with stage("fetch"):
+        rows = list(
+            TaskScore.objects.order_by("task_id")
+            .annotate(due=Cast("task__due_date", CharField()))
+            .values_list(*PLAN_COLUMNS)
+        )
+        ids, hours, due_dates, importance, dependents, depth = zip(*rows) if rows else [()] * len(PLAN_COLUMNS)
+        warnings = due_warnings(warned_tasks(today), today)
+        deps = dependency_index().deps
+
+    with stage("score"):
+        count = len(ids)
+        due_ordinals = date_ordinals(due_dates)
+        if weighs_downstream(mode):
+            # downstream_buckets only reads the ids, hours and dependencies
+            levels = downstream_buckets([
+                TaskRecord(task_id, None, None, task_hours, None, deps.get(task_id, []))
+                for task_id, task_hours in zip(ids, hours)
+            ])
+            downstream = np.fromiter((levels.get(task_id, 0) for task_id in ids), dtype=np.int64, count=count)
+        else:
+            downstream = np.zeros(count, dtype=np.int64)
+        buckets, index = column_buckets(
+            due_ordinals, due_ordinals > 0,
+            np.fromiter((min(task_hours, EFFORT_CAP) for task_hours in hours), dtype=np.int64, count=count),
+            np.asarray(importance, dtype=np.int64), np.asarray(dependents, dtype=np.int64), downstream,
+            np.asarray(depth, dtype=np.int64) > 0, today
+        )
+        # the mode's key without depth, the plan follows the dependencies themselves
+        keys = bucket_rank_keys(buckets, index, mode)
+
+    plan = build_plan(list(ids), list(hours), due_ordinals, keys, deps, hours_per_day, start or today)
+    return plan, warnings, urgency_expiry(due_ordinals, today)
+
+# column each mode's ranking is ordered by, after depth
+RANK_COLUMN = {
+    "smart": "smart_score",
+    "fastest": "effort_score",
+    "impact": "importance_score",
+    "deadline": "urgency_score",
+}
+
+def stored_top_k(mode, k, as_of=None):
+    """
+    Best k executable (depth 0) stored tasks. As of today in a built-in
+    mode the database reads them off the mode's rank index, otherwise
+    every executable row is scored.
+    Return: (top, warnings for the top tasks, valid_until)
+    """
+
+    ensure_scored()
+
+    today = as_of or date.today()
+    executable = TaskScore.objects.select_related("task").filter(depth=0)
+
+    if mode in RANK_COLUMN and today == date.today():
+        refresh_expired(today)
+        with stage("fetch"):
+            # (depth, -column, task) ties in id order, like top_results
+            rows = list(executable.order_by(f"-{RANK_COLUMN[mode]}", "task_id")[:k])
+            # every row is current after refresh_expired
+            valid_until = executable.aggregate(first=Min("urgency_valid_until"))["first"]
+        with stage("score"):
+            top = [ranking_entry(result) for result in scored_results(rows, WEIGHT_METHOD[mode], today, {})]
+        return top, due_warnings(top, today), valid_until
+
+    with stage("fetch"):
+        rows = list(executable.order_by("task_id"))
+
+    top, valid_until, expired = top_rows(rows, mode, k, today)
+    with stage("save"):
+        TaskScore.objects.bulk_update(expired, URGENCY_FIELDS, batch_size=1000)
+
+    return top, due_warnings(top, today), valid_until
+
+def encode_cursor(*key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor, size):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValidationError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != size or not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) for value in key
+    ):
+        raise ValidationError("Invalid cursor")
+    return key
+
+def stored_page(mode, limit, cursor=None):
+    """
+    One page of the stored ranking, keyset paginated on (depth, sort key, id)
+    so the database only reads the rows it returns.
+    Return: (page, warnings for the page's tasks, cursor of the next page or None,
+    valid_until of the whole ranking)
+    """
+
+    if mode not in RANK_COLUMN:
+        raise ValidationError("Pagination with the stored engine only supports the built-in modes")
+
+    ensure_scored()
+
+    today = date.today()
+    refresh_expired(today)
+
+    column = RANK_COLUMN[mode]
+    rows = TaskScore.objects.select_related("task").order_by("depth", f"-{column}", "task_id")
+
+    if cursor:
+        depth, key, last_id = decode_cursor(cursor, 3)
+        rows = rows.filter(
+            Q(depth__gt=depth) |
+            Q(depth=depth, **{f"{column}__lt": key}) |
+            Q(depth=depth, **{column: key}, task_id__gt=last_id)
+        )
+
+    with stage("fetch"):
+        rows = list(rows[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        deps = dependency_lists([row.task_id for row in rows if row.depth])
+
+    with stage("score"):
+        results = scored_results(rows, WEIGHT_METHOD[mode], today, deps)
+
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.depth, getattr(last, column), last.task_id)
+
+    # every row is current after refresh_expired, the earliest expiry ends the ranking
+    valid_until = TaskScore.objects.aggregate(first=Min("urgency_valid_until"))["first"]
+
+    warnings = due_warnings([result.task for result in results], today)
+    return [ranking_entry(result) for result in results], warnings, next_cursor, valid_until
+
+def list_rows(limit, after=None):
+    # stored tasks with id > after, in id order, one more than limit
+    tasks = task_rows()
+    if after is not None:
+        tasks = tasks.filter(id__gt=after)
+    return tasks[:limit + 1]
+
+def list_result(tasks, limit, deps):
+    """
+    list_rows' tasks with their deps (dependency_lists of them).
+    Return: (tasks, id to pass as after for the next page or None)
+    """
+    more = len(tasks) > limit
+    tasks = with_dependencies(tasks[:limit], deps)
+    return tasks, (tasks[-1]["id"] if more else None)
+
+def list_page(limit, after=None):
+    """
+    Stored tasks with id > after, in id order.
+    Return: (tasks, id to pass as after for the next page or None)
+    """
+    tasks = list(list_rows(limit, after))
+    return list_result(tasks, limit, dependency_lists([task["id"] for task in tasks[:limit]]))
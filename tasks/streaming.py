@@ -0,0 +1,44 @@
+"""
+Newline-delimited JSON (one object per line) input and output.
+
+Records are decoded one line at a time so the raw request body is never
+held in memory, and responses are encoded one line at a time as the
+client reads them.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .scoring import ValidationError
+
+NDJSON = "application/x-ndjson"
+
+
+def is_ndjson(request):
+    return request.content_type == NDJSON
+
+def read_ndjson(stream):
+    """
+    Yield one decoded object per non-empty line of a file-like stream
+    """
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            raise ValidationError(f"Invalid JSON on line {line_no}")
+
+def ndjson_lines(header, records):
+    encoder = DjangoJSONEncoder()
+    yield encoder.encode(header) + "\n"
+    for record in records:
+        yield encoder.encode(record) + "\n"
+
+def ndjson_response(header, records, status=200):
+    """
+    Stream header as the first line, then one line per record
+    """
+    return StreamingHttpResponse(ndjson_lines(header, records), content_type=NDJSON, status=status)
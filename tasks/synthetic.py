@@ -0,0 +1,77 @@
+"""
+Generated task lists for benchmarks, in the raw /analyze/ input format.
+
+Every generator is deterministic for a given seed, ids run from 1 to n and
+dependencies always point at lower ids unless stated otherwise.
+"""
+
+import random
+from datetime import date, timedelta
+
+
+def make_task(task_id, rng, dependencies, today):
+    due = today + timedelta(days=rng.randint(-5, 30)) if rng.random() < 0.8 else None
+    return {
+        "id": task_id,
+        "title": f"Task {task_id}",
+        "due_date": due.isoformat() if due else None,
+        "estimated_hours": rng.randint(1, 12),
+        "importance": rng.randint(1, 10),
+        "dependencies": dependencies,
+    }
+
+def chain(n, seed=0):
+    """
+    1 ← 2 ← 3 ... every task depends on the one before, depth n - 1
+    """
+    rng, today = random.Random(seed), date.today()
+    return [make_task(i, rng, [i - 1] if i > 1 else [], today) for i in range(1, n + 1)]
+
+def fan_out(n, seed=0):
+    """
+    One root every other task depends on
+    """
+    rng, today = random.Random(seed), date.today()
+    return [make_task(i, rng, [1] if i > 1 else [], today) for i in range(1, n + 1)]
+
+def random_dag(n, seed=0, max_deps=3):
+    """
+    Every task depends on up to max_deps random earlier tasks
+    """
+    rng, today = random.Random(seed), date.today()
+    tasks = []
+    for i in range(1, n + 1):
+        count = min(i - 1, rng.randint(0, max_deps))
+        tasks.append(make_task(i, rng, sorted(rng.sample(range(1, i), count)) if count else [], today))
+    return tasks
+
+def components(n, seed=0, size=10):
+    """
+    Many small random DAGs of about size tasks with no edges between them
+    """
+    rng, today = random.Random(seed), date.today()
+    tasks = []
+    for i in range(1, n + 1):
+        start = i - (i - 1) % size
+        count = min(i - start, rng.randint(0, 2))
+        tasks.append(make_task(i, rng, sorted(rng.sample(range(start, i), count)) if count else [], today))
+    return tasks
+
+def late_cycle(n, seed=0):
+    """
+    A random DAG plus one edge from the first task to the last, closing
+    a cycle only found after nearly the whole graph has been processed
+    """
+    tasks = random_dag(n, seed)
+    if n > 1:
+        tasks[-1]["dependencies"] = sorted(set(tasks[-1]["dependencies"]) | {1})
+        tasks[0]["dependencies"] = [n]
+    return tasks
+
+SHAPES = {
+    "chain": chain,
+    "fan_out": fan_out,
+    "random_dag": random_dag,
+    "components": components,
+    "late_cycle": late_cycle,
+}
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from .scoring import score_tasks, validate_tasks
 from .views import build_graph, detect_cycle, CycleError
 
@@ -83,3 +83,1266 @@ class DependencyValidationTests(TestCase):
 
         with self.assertRaises(Exception):
             detect_cycle(graph)
+
+
+class VectorizedEngineTests(TestCase):
+
+    def test_matches_python_engine_in_every_mode(self):
+        """
+        The NumPy engine must return exactly what score_tasks returns.
+        """
+        from datetime import date, timedelta
+        from .vectorized import score_tasks_vectorized
+
+        today = date.today()
+        tasks = [
+            {"id": i, "title": f"Task {i}", "estimated_hours": (i % 12) + 1, "importance": (i % 10) + 1,
+             "due_date": str(today + timedelta(days=(i % 20) - 3)) if i % 4 else None,
+             "dependencies": [i - 1] if i % 3 == 0 else ([1, 2] if i > 5 and i % 5 == 0 else [])}
+            for i in range(1, 60)
+        ]
+
+        for mode in ["smart", "fastest", "impact", "deadline"]:
+            normalized, _ = validate_tasks([dict(t) for t in tasks])
+            graph = build_graph(normalized)
+            detect_cycle(graph)
+
+            self.assertEqual(
+                score_tasks_vectorized(normalized, graph, mode),
+                score_tasks(normalized, graph, mode)
+            )
+
+    def test_hours_beyond_int64(self):
+        tasks = [
+            {"id": 1, "title": "Huge", "estimated_hours": 2**70, "importance": 5, "dependencies": []},
+            {"id": 2, "title": "Small", "estimated_hours": 1, "importance": 5, "dependencies": [1]},
+        ]
+        results = [
+            self.client.post(f"/api/tasks/analyze/?engine={engine}", data={"tasks": tasks}, content_type="application/json")
+            for engine in ["python", "vectorized"]
+        ]
+        self.assertEqual([res.status_code for res in results], [200, 200])
+        self.assertEqual(results[0].json()["ranked_tasks"], results[1].json()["ranked_tasks"])
+
+
+class TopologicalDepthTests(TestCase):
+
+    def test_cycle_path_is_reported(self):
+        graph = {1: [2], 2: [3], 3: [4], 4: [2], 5: []}
+
+        with self.assertRaises(CycleError) as ctx:
+            detect_cycle(graph)
+
+        self.assertEqual(str(ctx.exception), "2 → 3 → 4 → 2")
+
+    def test_deep_chain_does_not_recurse(self):
+        """
+        100k-level chain: every task depends on the previous one.
+        """
+        size = 100_000
+        graph = {i: ([i - 1] if i else []) for i in range(size)}
+
+        depths = detect_cycle(graph)
+
+        self.assertEqual(depths[0], 0)
+        self.assertEqual(depths[size - 1], size - 1)
+
+    def test_late_cycle_in_large_graph(self):
+        size = 100_000
+        graph = {i: ([i - 1] if i else []) for i in range(size)}
+        graph[0] = [size - 1]
+
+        with self.assertRaises(CycleError):
+            detect_cycle(graph)
+
+
+class MaterializedScoreTests(TestCase):
+
+    def add(self, **task):
+        task.setdefault("estimated_hours", 2)
+        task.setdefault("importance", 5)
+        task.setdefault("dependencies", [])
+        res = self.client.post("/api/tasks/add/", data={"task": task}, content_type="application/json")
+        return res.json()["id"]
+
+    def test_stored_ranking_matches_full_pipeline(self):
+        a = self.add(title="A", due_date="2024-01-01")
+        b = self.add(title="B", dependencies=[a], estimated_hours=9)
+        self.add(title="C", dependencies=[a, b], importance=9)
+
+        for mode in ["smart", "fastest", "impact", "deadline"]:
+            stored = self.client.get(f"/api/tasks/analyze_db/?mode={mode}").json()
+            full = self.client.get(f"/api/tasks/analyze_db/?mode={mode}&engine=python").json()
+            self.assertEqual(stored, full)
+
+    def test_write_updates_only_affected_rows(self):
+        from .models import TaskScore
+
+        a = self.add(title="A")
+        b = self.add(title="B", dependencies=[a])
+
+        self.assertEqual(TaskScore.objects.get(task_id=a).dependents_count, 1)
+        self.assertEqual(TaskScore.objects.get(task_id=b).depth, 1)
+
+    def test_missing_rows_are_rebuilt_on_read(self):
+        from .models import TaskScore
+
+        a = self.add(title="A")
+        self.add(title="B", dependencies=[a])
+        TaskScore.objects.all().delete()
+
+        res = self.client.get("/api/tasks/suggest/")
+
+        self.assertEqual(res.json()["top"][0]["id"], a)
+        self.assertEqual(TaskScore.objects.count(), 2)
+
+
+class TopKSuggestTests(TestCase):
+
+    def test_top_results_matches_full_sort(self):
+        from .scoring import top_results, rank_results, score_task, WEIGHT_METHOD
+
+        results = [
+            score_task({"id": i, "title": str(i), "due_date": None, "estimated_hours": i % 9 + 1,
+                        "importance": i % 4 + 1, "dependencies": []},
+                       0.05, (i % 4 + 1) / 10, 0.7, 0.0, 0, WEIGHT_METHOD["smart"])
+            for i in range(50)
+        ]
+
+        for mode in ["smart", "fastest", "impact", "deadline"]:
+            self.assertEqual(top_results(list(results), mode, 7), rank_results(list(results), mode)[:7])
+
+    def test_suggest_k_parameter(self):
+        ids = []
+        for i in range(6):
+            res = self.client.post("/api/tasks/add/", data={"task": {
+                "title": f"T{i}", "estimated_hours": i + 1, "importance": 5, "dependencies": ids[:1] if i == 5 else []
+            }}, content_type="application/json")
+            ids.append(res.json()["id"])
+
+        for engine in ["stored", "python", "vectorized"]:
+            res = self.client.get(f"/api/tasks/suggest/?k=10&engine={engine}").json()
+            self.assertEqual((res["k"], len(res["top"])), (10, 5))
+
+        res = self.client.get("/api/tasks/suggest/").json()
+        self.assertEqual(len(res["top"]), 3)
+        self.assertEqual(res["top_3"], res["top"])
+
+        # warnings only name the returned tasks, none of these has a due date
+        for engine in ["stored", "sql", "python", "vectorized"]:
+            res = self.client.get(f"/api/tasks/suggest/?k=2&engine={engine}").json()
+            self.assertEqual(res["warnings"], [f"'{task['title']}': due_date missing" for task in res["top"]])
+
+        for k in ["0", "-1", "²", "3.5"]:
+            self.assertEqual(self.client.get(f"/api/tasks/suggest/?k={k}").status_code, 400)
+
+
+class DependencyEdgeTests(TestCase):
+
+    def add(self, **task):
+        task.setdefault("estimated_hours", 1)
+        task.setdefault("importance", 5)
+        task.setdefault("dependencies", [])
+        return self.client.post("/api/tasks/add/", data={"task": task}, content_type="application/json")
+
+    def test_unknown_dependency_is_rejected(self):
+        res = self.add(title="A", dependencies=[12345])
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("unknown dependency", res.json()["error"])
+
+    def test_edges_are_listed_and_reverse_lookups_work(self):
+        from .models import Task
+
+        a = self.add(title="A").json()["id"]
+        b = self.add(title="B").json()["id"]
+        c = self.add(title="C", dependencies=[b, a, b]).json()["id"]
+
+        tasks = {t["id"]: t for t in self.client.get("/api/tasks/list/").json()["tasks"]}
+
+        self.assertEqual(tasks[c]["dependencies"], [b, a])
+        self.assertEqual(list(Task.objects.get(id=a).dependents.values_list("id", flat=True)), [c])
+
+
+class NDJSONStreamingTests(TestCase):
+
+    def test_ndjson_round_trip_matches_json(self):
+        import json
+
+        tasks = [
+            {"id": 1, "title": "Deploy", "estimated_hours": 1, "importance": 9, "dependencies": [2]},
+            {"id": 2, "title": "Fix bug", "due_date": "2024-01-01", "estimated_hours": 2, "dependencies": []},
+        ]
+        body = "\n".join(json.dumps(t) for t in tasks) + "\n"
+
+        res = self.client.post("/api/tasks/analyze/?mode=impact", data=body, content_type="application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+
+        expected = self.client.post("/api/tasks/analyze/?mode=impact", data={"tasks": tasks},
+                                    content_type="application/json").json()
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual(lines[0], {"warnings": expected["warnings"], "valid_until": expected["valid_until"]})
+        self.assertEqual(lines[1:], expected["ranked_tasks"])
+
+    def test_bad_line_is_reported(self):
+        body = '{"id": 1, "title": "A", "estimated_hours": 1, "dependencies": []}\nnot json\n'
+        res = self.client.post("/api/tasks/analyze/", data=body, content_type="application/x-ndjson")
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json()["error"], "Invalid JSON on line 2")
+
+
+class BulkIngestionTests(TestCase):
+
+    def post(self, tasks):
+        return self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json")
+
+    def test_local_refs_resolve_to_new_ids(self):
+        existing = self.client.post("/api/tasks/add/", data={"task": {
+            "title": "Stored", "estimated_hours": 1, "importance": 5, "dependencies": []
+        }}, content_type="application/json").json()["id"]
+
+        res = self.post([
+            {"ref": "deploy", "title": "Deploy", "estimated_hours": 1, "importance": 9, "dependencies": ["build"]},
+            {"ref": "build", "title": "Build", "estimated_hours": 2, "dependencies": [existing]},
+        ]).json()
+        deploy, build = res["ids"]
+
+        tasks = {t["id"]: t for t in self.client.get("/api/tasks/list/").json()["tasks"]}
+        self.assertEqual(tasks[deploy]["dependencies"], [build])
+        self.assertEqual(tasks[build]["dependencies"], [existing])
+        self.assertEqual(res["results"][1]["warnings"], ["'Build': importance defaulted to 5", "'Build': due_date missing"])
+
+        stored = self.client.get("/api/tasks/analyze_db/").json()
+        full = self.client.get("/api/tasks/analyze_db/?engine=python").json()
+        self.assertEqual(stored, full)
+
+    def test_errors_are_reported_per_item_and_nothing_is_inserted(self):
+        from .models import Task
+
+        res = self.post([
+            {"title": "Fine", "estimated_hours": 1, "dependencies": []},
+            {"title": "", "estimated_hours": 1, "dependencies": []},
+            {"title": "Orphan", "estimated_hours": 1, "dependencies": [99999]},
+        ])
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([bool(r["errors"]) for r in res.json()["results"]], [False, True, True])
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_cycle_between_refs_is_rejected(self):
+        res = self.post([
+            {"ref": "a", "title": "A", "estimated_hours": 1, "dependencies": ["b"]},
+            {"ref": "b", "title": "B", "estimated_hours": 1, "dependencies": ["a"]},
+        ])
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("a → b → a", res.json()["results"][0]["errors"][0])
+
+    def test_bare_list_body(self):
+        tasks = [{"title": "Listed", "estimated_hours": 1, "importance": 5, "dependencies": []}]
+        res = self.client.post("/api/tasks/add_bulk/", data=tasks, content_type="application/json")
+        self.assertEqual(len(res.json()["ids"]), 1)
+
+        for body in ["5", '"tasks"', "null", "true"]:
+            res = self.client.post("/api/tasks/add_bulk/", data=body, content_type="application/json")
+            self.assertEqual(res.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        from datetime import date, timedelta
+
+        today = date.today()
+        tasks = [
+            {"ref": i, "title": f"T{i}", "estimated_hours": i % 10 + 1, "importance": i % 3 + 4,
+             "due_date": str(today + timedelta(days=i % 9 - 2)) if i % 2 else None,
+             "dependencies": [i - 7] if i >= 7 and i % 4 == 0 else []}
+            for i in range(40)
+        ]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json")
+
+    def test_ranking_pages_concatenate_to_full_ranking(self):
+        for mode in ["smart", "fastest", "impact", "deadline"]:
+            full = self.client.get(f"/api/tasks/analyze_db/?mode={mode}").json()["ranked_tasks"]
+
+            pages = []
+            url = f"/api/tasks/analyze_db/?mode={mode}&limit=6"
+            while url:
+                res = self.client.get(url).json()
+                pages.extend(res["ranked_tasks"])
+                url = res["next"] and f"/api/tasks/analyze_db/?mode={mode}&limit=6&cursor={res['next']}"
+
+            self.assertEqual(pages, full)
+
+    def test_list_pages(self):
+        full = self.client.get("/api/tasks/list/").json()["tasks"]
+
+        first = self.client.get("/api/tasks/list/?limit=25").json()
+        second = self.client.get(f"/api/tasks/list/?limit=25&after={first['next']}").json()
+
+        self.assertEqual(first["tasks"] + second["tasks"], full)
+        self.assertIsNone(second["next"])
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?limit=5&cursor=nope").status_code, 400)
+
+    def test_bad_limit_and_after(self):
+        for query in ["limit=0", "limit=²", "limit=2.5", "limit=5&after=²", "limit=5&after=x"]:
+            self.assertEqual(self.client.get(f"/api/tasks/list/?{query}").status_code, 400, query)
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?limit=²").status_code, 400)
+
+
+class PageCostTests(TransactionTestCase):
+    # commits for real, the staleness check is only skipped outside a transaction
+
+    def test_later_pages_read_only_their_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        tasks = [{"title": f"T{i}", "estimated_hours": i % 5 + 1, "importance": 5,
+                  "due_date": "2030-01-01" if i % 2 else None, "dependencies": []} for i in range(30)]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json")
+        first = self.client.get("/api/tasks/analyze_db/?limit=5").json()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"/api/tasks/analyze_db/?limit=5&cursor={first['next']}")
+
+        sql = [query["sql"] for query in queries.captured_queries]
+        # no anti-join for tasks without scores
+        self.assertFalse([q for q in sql if "LEFT OUTER JOIN" in q])
+        # the expiry checks are range reads of an index
+        expiry = [q for q in sql if "WHERE" in q and ("scored_on" in q.split("WHERE")[1] or "urgency_valid_until" in q.split("WHERE")[1])]
+        self.assertEqual(len(expiry), 2)
+        with connection.cursor() as cursor:
+            for query in expiry:
+                cursor.execute("EXPLAIN QUERY PLAN " + query)
+                self.assertIn("USING INDEX", cursor.fetchall()[0][-1])
+
+
+class SQLEngineTests(TestCase):
+    """
+    engine=sql scores in the database, same answers as the python engine
+    """
+
+    setUp = KeysetPaginationTests.setUp
+
+    def test_ranking_matches_python_engine(self):
+        for as_of in ["", "&as_of=2000-01-01"]:
+            for mode in ["fastest", "impact", "deadline"]:
+                python = self.client.get(f"/api/tasks/analyze_db/?mode={mode}&engine=python{as_of}").json()
+                sql = self.client.get(f"/api/tasks/analyze_db/?mode={mode}&engine=sql{as_of}").json()
+                self.assertEqual(sql, python)
+
+                python = self.client.get(f"/api/tasks/suggest/?mode={mode}&k=5&engine=python{as_of}").json()
+                sql = self.client.get(f"/api/tasks/suggest/?mode={mode}&k=5&engine=sql{as_of}").json()
+                self.assertEqual(sql, python)
+
+            # smart ties on the rounded score are ordered by the exact score instead of id
+            python = self.client.get(f"/api/tasks/analyze_db/?engine=python{as_of}").json()
+            sql = self.client.get(f"/api/tasks/analyze_db/?engine=sql{as_of}").json()
+            by_id = sorted(sql["ranked_tasks"], key=lambda t: (t["depth"], -t["priority_score"], t["id"]))
+            self.assertEqual(by_id, python["ranked_tasks"])
+            self.assertEqual(sql["warnings"], python["warnings"])
+            self.assertEqual(sql["valid_until"], python["valid_until"])
+
+    def test_sql_pages_concatenate_to_full_ranking(self):
+        for mode in ["smart", "deadline"]:
+            full = self.client.get(f"/api/tasks/analyze_db/?mode={mode}&engine=sql&as_of=2000-01-01").json()
+
+            pages = []
+            url = f"/api/tasks/analyze_db/?mode={mode}&engine=sql&as_of=2000-01-01&limit=7"
+            while url:
+                res = self.client.get(url).json()
+                self.assertLessEqual(len(res["ranked_tasks"]), 7)
+                pages.extend(res["ranked_tasks"])
+                url = res["next"] and f"{url.split('&cursor=')[0]}&cursor={res['next']}"
+
+            self.assertEqual(pages, full["ranked_tasks"])
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        from datetime import date, timedelta
+
+        today = date.today()
+        tasks = [
+            {"ref": i, "title": f"T{i}", "estimated_hours": i % 6 + 1, "importance": i % 5 + 3,
+             "due_date": str(today + timedelta(days=i % 7 - 1)) if i % 3 else None,
+             "dependencies": [i - 3] if i >= 3 and i % 2 else []}
+            for i in range(15)
+        ]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json")
+
+    async def test_async_reads_match_sync_views(self):
+        from asgiref.sync import sync_to_async
+
+        urls = [
+            "analyze_db/?mode=smart", "analyze_db/?mode=deadline&engine=vectorized",
+            "analyze_db/?mode=smart,fastest", "analyze_db/?mode=all&engine=sql",
+            "analyze_db/?limit=4", "analyze_db/?limit=4&engine=sql", "analyze_db/?format=columnar",
+            "suggest/?mode=fastest&k=4", "suggest/?engine=python", "suggest/?engine=sql",
+            "list/", "list/?limit=4&after=2",
+            "analyze_db/?mode=nope", "analyze_db/?limit=4&engine=python", "suggest/?k=²", "list/?after=x",
+        ]
+        for url in urls:
+            expected = await sync_to_async(self.client.get)(f"/api/tasks/{url}")
+            res = await self.async_client.get(f"/api/tasks/async/{url}")
+            self.assertEqual(res.status_code, expected.status_code, url)
+            self.assertEqual(res.content, expected.content, url)
+            self.assertEqual(res.get("ETag"), expected.get("ETag"), url)
+
+        first = (await self.async_client.get("/api/tasks/async/analyze_db/?limit=4")).json()
+        second = await self.async_client.get(f"/api/tasks/async/analyze_db/?limit=4&cursor={first['next']}")
+        self.assertEqual(len(second.json()["ranked_tasks"]), 4)
+
+        etag = second["ETag"]
+        res = await self.async_client.get(f"/api/tasks/async/analyze_db/?limit=4&cursor={first['next']}",
+                                          headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+
+    async def test_async_add_task(self):
+        from .models import Task
+
+        first = await Task.objects.afirst()
+        res = await self.async_client.post(
+            "/api/tasks/async/add/",
+            data={"task": {"title": "New", "estimated_hours": 2, "dependencies": [first.id]}},
+            content_type="application/json"
+        )
+        self.assertEqual(res.status_code, 200)
+
+        task = await Task.objects.aget(id=res.json()["id"])
+        self.assertEqual([dep async for dep in task.dependencies.values_list("id", flat=True)], [first.id])
+
+        res = await self.async_client.post(
+            "/api/tasks/async/add/",
+            data={"task": {"title": "Orphan", "estimated_hours": 2, "dependencies": [99999]}},
+            content_type="application/json"
+        )
+        self.assertEqual(res.status_code, 400)
+
+
+class BatchAnalysisTests(TestCase):
+
+    sets = {
+        "team-a": [
+            {"id": 1, "title": "Deploy", "estimated_hours": 1, "importance": 9, "dependencies": [2]},
+            {"id": 2, "title": "Fix bug", "estimated_hours": 2, "importance": 8, "dependencies": []},
+        ],
+        "team-b": [
+            {"id": 1, "title": "A", "estimated_hours": 1, "dependencies": [2]},
+            {"id": 2, "title": "B", "estimated_hours": 1, "dependencies": [1]},
+        ],
+        "team-c": [{"id": 1, "title": "", "estimated_hours": 1, "dependencies": []}],
+        "team-d": [],
+    }
+
+    def test_results_match_single_analysis_and_errors_stay_per_set(self):
+        from django.test import override_settings
+
+        with override_settings(ANALYZE_BATCH_WORKERS=2):
+            res = self.client.post("/api/tasks/analyze_batch/?mode=fastest", data={"sets": self.sets},
+                                   content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        results = res.json()["results"]
+
+        self.assertEqual(list(results), list(self.sets))
+        single = self.client.post("/api/tasks/analyze/?mode=fastest", data={"tasks": self.sets["team-a"]},
+                                  content_type="application/json").json()
+        self.assertEqual(results["team-a"], single)
+        self.assertIn("Circular dependency", results["team-b"]["error"])
+        self.assertIn("error", results["team-c"])
+        self.assertEqual(results["team-d"]["ranked_tasks"], [])
+
+    def test_inline_and_pooled_runs_agree(self):
+        from .batch import analyze_sets
+
+        many = {f"set-{i}": self.sets["team-a"] for i in range(20)}
+        self.assertEqual(analyze_sets(many, workers=1), analyze_sets(many, workers=3))
+
+    def test_pooled_workers_use_the_current_weights_of_a_custom_mode(self):
+        from .batch import analyze_sets
+        from .scoring import register_weight_mode, WEIGHT_METHOD, PRIORITY_TABLES
+
+        register_weight_mode("lazy", {"urgency": 0, "importance": 0, "effort": 1, "dependency": 0})
+        self.addCleanup(WEIGHT_METHOD.pop, "lazy")
+        self.addCleanup(PRIORITY_TABLES.pop, "lazy")
+
+        many = {f"set-{i}": self.sets["team-a"] for i in range(20)}
+        analyze_sets(many, mode="lazy", workers=2)
+        # the workers of the pool already know the mode, with the old weights
+        register_weight_mode("lazy", {"urgency": 0, "importance": 1, "effort": 0, "dependency": 0})
+        self.assertEqual(analyze_sets(many, mode="lazy", workers=2), analyze_sets(many, mode="lazy", workers=1))
+
+
+class SyntheticGraphTests(TestCase):
+
+    def test_shapes_are_valid_and_only_late_cycle_has_a_cycle(self):
+        from .synthetic import SHAPES
+
+        for name, make in SHAPES.items():
+            tasks, _ = validate_tasks(make(300))
+            graph = build_graph(tasks)
+            if name == "late_cycle":
+                with self.assertRaises(CycleError):
+                    detect_cycle(graph)
+            else:
+                depths = detect_cycle(graph)
+                self.assertEqual(len(tasks), 300)
+                if name == "chain":
+                    self.assertEqual(max(depths.values()), 299)
+
+    def test_generators_are_deterministic(self):
+        from .synthetic import random_dag
+
+        self.assertEqual(random_dag(200, seed=3), random_dag(200, seed=3))
+        self.assertNotEqual(random_dag(200, seed=3), random_dag(200, seed=4))
+
+
+class TimingTests(TestCase):
+
+    tasks = [
+        {"id": 1, "title": "Deploy", "estimated_hours": 1, "importance": 9, "dependencies": [2]},
+        {"id": 2, "title": "Fix bug", "estimated_hours": 2, "importance": 8, "dependencies": []},
+    ]
+
+    def setUp(self):
+        from . import cache, timing
+        timing.reset()
+        cache.clear()
+
+    def test_stages_reported_in_header_and_metrics(self):
+        from django.test import override_settings
+
+        with override_settings(TASK_TIMING=True):
+            res = self.client.post("/api/tasks/analyze/", data={"tasks": self.tasks}, content_type="application/json")
+            self.client.get("/api/tasks/analyze_db/")
+            metrics = self.client.get("/api/tasks/metrics/").json()
+
+        stages = [part.split(";")[0] for part in res["Server-Timing"].split(", ")]
+        self.assertEqual(stages, ["parse", "validate", "cache", "graph", "cycle", "score", "serialize", "total"])
+
+        analyze = metrics["endpoints"]["/api/tasks/analyze/"]
+        self.assertEqual(analyze["requests"], 1)
+        self.assertEqual(analyze["status"], {"200": 1})
+        self.assertEqual(analyze["latency_ms"]["buckets"]["+Inf"], 1)
+        self.assertIn("score", analyze["stages_ms"])
+        self.assertIn("/api/tasks/analyze_db/", metrics["endpoints"])
+
+    def test_disabled_by_default(self):
+        res = self.client.post("/api/tasks/analyze/", data={"tasks": self.tasks}, content_type="application/json")
+
+        self.assertNotIn("Server-Timing", res)
+        metrics = self.client.get("/api/tasks/metrics/").json()
+        self.assertEqual((metrics["enabled"], metrics["endpoints"]), (False, {}))
+
+
+class ColumnarFormatTests(TestCase):
+
+    def setUp(self):
+        from datetime import date, timedelta
+
+        today = date.today()
+        self.tasks = [
+            {"id": i, "title": f"T{i}", "estimated_hours": i % 5 + 1, "importance": i % 9 + 1,
+             "due_date": str(today + timedelta(days=i % 6 - 2)) if i % 3 else None,
+             "dependencies": [i - 1] if i % 4 == 0 else []}
+            for i in range(1, 30)
+        ]
+
+    def decode(self, body):
+        from datetime import date, timedelta
+
+        ranking = body["ranked_tasks"]
+        columns = ranking["columns"]
+        base = date.fromisoformat(ranking["date_base"]) if ranking["date_base"] else None
+        decoded = []
+        for i in range(ranking["count"]):
+            task = {name: values[i] for name, values in columns.items()}
+            if task["due_date"] is not None:
+                task["due_date"] = str(base + timedelta(days=task["due_date"])) if base else task["due_date"]
+            task["reasons"] = [ranking["reason_table"][code] for code in task["reasons"]]
+            decoded.append(task)
+        return decoded
+
+    def test_columnar_decodes_to_default_format(self):
+        url = "/api/tasks/analyze/?mode=impact"
+        default = self.client.post(url, data={"tasks": self.tasks}, content_type="application/json").json()
+
+        for dates in ["offset", "iso"]:
+            body = self.client.post(f"{url}&format=columnar&dates={dates}", data={"tasks": self.tasks},
+                                    content_type="application/json").json()
+            self.assertEqual(body["format"], "columnar")
+            self.assertEqual(body["warnings"], default["warnings"])
+            self.assertEqual(self.decode(body), default["ranked_tasks"])
+
+    def test_stored_ranking_and_pages(self):
+        bulk = [{**task, "ref": task.pop("id")} for task in self.tasks]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": bulk}, content_type="application/json")
+
+        default = self.client.get("/api/tasks/analyze_db/").json()
+        body = self.client.get("/api/tasks/analyze_db/?format=columnar").json()
+        self.assertEqual(self.decode(body), default["ranked_tasks"])
+
+        page = self.client.get("/api/tasks/analyze_db/?format=columnar&limit=10").json()
+        self.assertEqual(self.decode(page), default["ranked_tasks"][:10])
+        self.assertIsNotNone(page["next"])
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?format=xml").status_code, 400)
+
+
+class TaskValidatorTests(TestCase):
+
+    def test_dates_parse_like_strptime(self):
+        from datetime import datetime
+        from .scoring import TaskValidator, ValidationError
+
+        validator = TaskValidator()
+        for value in ["2024-01-05", "2024-1-5", "2024-02-29", "2023-02-29", "+024-01-05", "2024/01/05", "2024-13-01"]:
+            try:
+                expected = datetime.strptime(value, "%Y-%m-%d").date()
+            except ValueError:
+                with self.assertRaises(ValidationError):
+                    validator.parse_date(value)
+            else:
+                self.assertEqual(validator.parse_date(value), expected)
+
+    def test_collect_errors_reports_every_invalid_task(self):
+        tasks = [
+            {"id": 1, "title": "", "estimated_hours": 1, "dependencies": []},
+            {"id": 2, "title": "Fine", "estimated_hours": 1, "dependencies": [9]},
+            {"id": 3, "title": "Bad date", "estimated_hours": 1, "due_date": "soon", "dependencies": []},
+            "not a task",
+            {"id": 5, "title": "No hours", "dependencies": []},
+        ]
+
+        res = self.client.post("/api/tasks/analyze/?errors=all", data={"tasks": tasks}, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json()["errors"], [
+            "Task 1: Invalid title",
+            "Task 3: invalid due_date format (use YYYY-MM-DD)",
+            "Task 4: Task must be an object",
+            "Task 5: missing field 'estimated_hours'",
+            "Task 2: unknown dependency '9'",
+        ])
+
+        res = self.client.post("/api/tasks/analyze/", data={"tasks": tasks}, content_type="application/json")
+        self.assertEqual(res.json(), {"error": "Invalid title"})
+
+    def test_records_leave_input_untouched(self):
+        from datetime import date
+        from .scoring import TaskRecord
+
+        raw = {"id": 1, "title": "Fix bug", "estimated_hours": 2, "due_date": "2030-01-05", "dependencies": []}
+        [task], _ = validate_tasks([raw])
+
+        self.assertIsInstance(task, TaskRecord)
+        self.assertEqual(raw["due_date"], "2030-01-05")
+        self.assertNotIn("importance", raw)
+        # still reads like the dict it replaces
+        self.assertEqual(task["due_date"], date(2030, 1, 5))
+        self.assertEqual({**task}, {**raw, "importance": 5, "due_date": date(2030, 1, 5)})
+        with self.assertRaises(KeyError):
+            task["ref"]
+
+
+class UrgencyExpiryTests(TestCase):
+
+    def test_expiry_is_the_next_bucket_change(self):
+        from datetime import date, timedelta
+        from .scoring import urgent_score_fun, urgency_expires
+
+        today = date(2025, 3, 10)
+        for days_left in range(-3, 30):
+            due = today + timedelta(days=days_left)
+            expires = urgency_expires(due, today)
+
+            # the score holds every day until expires, and changes on it
+            last = expires or today + timedelta(days=60)
+            for day in range((last - today).days):
+                self.assertEqual(urgent_score_fun(due, today + timedelta(days=day)), urgent_score_fun(due, today))
+            if expires:
+                self.assertNotEqual(urgent_score_fun(due, expires), urgent_score_fun(due, today))
+
+        self.assertIsNone(urgency_expires(None, today))
+
+    def test_as_of_and_stored_rows_outlive_the_day(self):
+        from datetime import date, timedelta
+        from .models import TaskScore
+
+        today = date.today()
+        tasks = [
+            {"ref": 1, "title": "Soon", "estimated_hours": 1, "due_date": str(today + timedelta(days=5)), "dependencies": []},
+            {"ref": 2, "title": "Later", "estimated_hours": 3, "due_date": str(today + timedelta(days=20)), "dependencies": [1]},
+        ]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json")
+
+        res = self.client.get("/api/tasks/analyze_db/").json()
+        self.assertEqual(res["valid_until"], str(today + timedelta(days=2)))
+
+        # a row scored yesterday whose bucket hasn't changed is kept as is
+        TaskScore.objects.update(scored_on=today - timedelta(days=1))
+        self.client.get("/api/tasks/analyze_db/")
+        self.assertEqual(TaskScore.objects.filter(scored_on=today).count(), 0)
+
+        for as_of in [today + timedelta(days=3), today + timedelta(days=16)]:
+            for view in ["analyze_db", "suggest"]:
+                stored = self.client.get(f"/api/tasks/{view}/?as_of={as_of}").json()
+                full = self.client.get(f"/api/tasks/{view}/?engine=python&as_of={as_of}").json()
+                self.assertEqual(stored, full)
+
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?as_of=tomorrow").status_code, 400)
+
+
+class AnalysisCacheTests(TestCase):
+
+    tasks = [
+        {"id": 1, "title": "Deploy", "estimated_hours": 1, "importance": 9, "due_date": "2030-01-20", "dependencies": [2]},
+        {"id": 2, "title": "Fix bug", "estimated_hours": 2, "importance": 8, "due_date": "2030-01-02", "dependencies": []},
+    ]
+
+    def setUp(self):
+        from . import cache
+        cache.clear()
+
+    def analyze(self, tasks, query=""):
+        return self.client.post(f"/api/tasks/analyze/?{query}", data={"tasks": tasks}, content_type="application/json")
+
+    def test_repeated_analysis_is_served_from_cache(self):
+        from unittest import mock
+
+        first = self.analyze(self.tasks, "as_of=2029-12-01").json()
+        # same tasks with keys reordered, on a later day the ranking still holds
+        reordered = [dict(reversed(list(task.items()))) for task in self.tasks]
+        with mock.patch("tasks.views.build_graph", side_effect=AssertionError("recomputed")):
+            again = self.analyze(reordered, "as_of=2029-12-10").json()
+        self.assertEqual(again["ranked_tasks"], first["ranked_tasks"])
+
+        # past valid_until the ranking is recomputed
+        later = self.analyze(self.tasks, f"as_of={first['valid_until']}").json()
+        self.assertNotEqual(later["valid_until"], first["valid_until"])
+
+        stats = self.client.get("/api/tasks/metrics/").json()["analysis_cache"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_mode_and_content_are_part_of_the_key(self):
+        from .cache import ranking_key
+        from .scoring import validate_tasks
+
+        tasks, _ = validate_tasks([dict(task) for task in self.tasks])
+        changed, _ = validate_tasks([dict(self.tasks[0], importance=3), dict(self.tasks[1])])
+
+        self.assertNotEqual(ranking_key(tasks, "smart"), ranking_key(tasks, "fastest"))
+        self.assertNotEqual(ranking_key(tasks, "smart"), ranking_key(changed, "smart"))
+
+
+class ConditionalGetTests(TestCase):
+
+    def add(self, title, dependencies=()):
+        res = self.client.post("/api/tasks/add/", data={"task": {
+            "title": title, "due_date": "2030-01-10", "estimated_hours": 2,
+            "importance": 5, "dependencies": list(dependencies)
+        }}, content_type="application/json")
+        return res.json()["id"]
+
+    def test_unchanged_table_answers_304_without_scoring(self):
+        from unittest import mock
+
+        self.add("Fix bug")
+        first = self.client.get("/api/tasks/analyze_db/?mode=fastest")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+
+        with mock.patch("tasks.views.stored_rankings", side_effect=AssertionError("scored")):
+            again = self.client.get("/api/tasks/analyze_db/?mode=fastest", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        # another mode is another representation
+        other = self.client.get("/api/tasks/analyze_db/?mode=smart", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        first_id = self.add("Fix bug")
+        etags = {self.client.get(url)["ETag"] for url in ("/api/tasks/suggest/", "/api/tasks/list/")}
+
+        self.add("Deploy", [first_id])
+        for url in ("/api/tasks/suggest/", "/api/tasks/list/"):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=", ".join(etags))
+            self.assertEqual(res.status_code, 200)
+
+        etag = self.client.get("/api/tasks/list/")["ETag"]
+        self.client.post("/api/tasks/clear/")
+        res = self.client.get("/api/tasks/list/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["tasks"], [])
+
+
+class PriorityTableTests(TestCase):
+
+    def test_tables_match_the_formula_exactly(self):
+        from itertools import product
+        from .scoring import (
+            PRIORITY_TABLES, WEIGHT_METHOD, URGENCY_LEVELS, IMPORTANCE_LEVELS, EFFORT_LEVELS,
+            DEPENDENCY_LEVELS, DOWNSTREAM_LEVELS, bucket_index, priority_score_fun
+        )
+
+        all_levels = (URGENCY_LEVELS, IMPORTANCE_LEVELS, EFFORT_LEVELS, DEPENDENCY_LEVELS, DOWNSTREAM_LEVELS)
+        for mode, WEIGHTS in WEIGHT_METHOD.items():
+            table = PRIORITY_TABLES[mode]
+            for levels in product(*(range(len(levels)) for levels in all_levels), (0, 1)):
+                u, i, e, d, w, blocked = levels
+                expected = priority_score_fun(
+                    URGENCY_LEVELS[u], IMPORTANCE_LEVELS[i], EFFORT_LEVELS[e], DEPENDENCY_LEVELS[d], blocked, WEIGHTS,
+                    DOWNSTREAM_LEVELS[w]
+                )
+                index = bucket_index(*levels)
+                self.assertEqual(table.priority[index], expected)
+                self.assertEqual(table.score[index], round(expected, 2))
+
+    def test_buckets_match_the_score_functions(self):
+        from datetime import date, timedelta
+        from .scoring import (
+            urgency_bucket, effort_bucket, dependency_bucket, URGENCY_LEVELS, EFFORT_LEVELS, DEPENDENCY_LEVELS
+        )
+
+        today = date(2030, 1, 10)
+        expected_urgency = {-3: 1.00, -1: 1.00, 0: 0.95, 1: 0.85, 2: 0.65, 3: 0.65, 4: 0.40, 7: 0.40, 8: 0.20, 14: 0.20, 15: 0.10}
+        for days, score in expected_urgency.items():
+            self.assertEqual(URGENCY_LEVELS[urgency_bucket(today + timedelta(days=days), today)], score)
+        self.assertEqual(URGENCY_LEVELS[urgency_bucket(None, today)], 0.05)
+
+        for hours, score in {1: 1.00, 2: 0.70, 4: 0.70, 5: 0.40, 8: 0.40, 9: 0.20}.items():
+            self.assertEqual(EFFORT_LEVELS[effort_bucket(hours)], score)
+        for count, score in {0: 0.0, 1: 0.4, 2: 0.7, 3: 1.0, 12: 1.0}.items():
+            self.assertEqual(DEPENDENCY_LEVELS[dependency_bucket(count)], score)
+
+    def test_custom_mode(self):
+        from .scoring import register_weight_mode, WEIGHT_METHOD, PRIORITY_TABLES
+
+        with self.assertRaises(ValueError):
+            register_weight_mode("smart", {"urgency": 1, "importance": 0, "effort": 0, "dependency": 0})
+        with self.assertRaises(ValueError):
+            register_weight_mode("lazy", {"effort": 1})
+
+        register_weight_mode("lazy", {"urgency": 0, "importance": 0, "effort": 1, "dependency": 0})
+        self.addCleanup(WEIGHT_METHOD.pop, "lazy")
+        self.addCleanup(PRIORITY_TABLES.pop, "lazy")
+
+        tasks = [
+            {"id": 1, "title": "Long", "estimated_hours": 20, "importance": 10, "due_date": None, "dependencies": []},
+            {"id": 2, "title": "Short", "estimated_hours": 1, "importance": 1, "due_date": None, "dependencies": []},
+        ]
+        for engine in ["python", "vectorized"]:
+            res = self.client.post(f"/api/tasks/analyze/?mode=lazy&engine={engine}", data={"tasks": tasks},
+                                   content_type="application/json").json()
+            self.assertEqual([t["id"] for t in res["ranked_tasks"]], [2, 1])
+            self.assertEqual(res["ranked_tasks"][0]["priority_score"], 1.0)
+
+        # registered again with other weights, neither the cache nor an ETag
+        # still answers with the old ranking
+        etag = self.client.get("/api/tasks/analyze_db/?mode=lazy")["ETag"]
+        register_weight_mode("lazy", {"urgency": 0, "importance": 1, "effort": 0, "dependency": 0})
+        res = self.client.post("/api/tasks/analyze/?mode=lazy", data={"tasks": tasks},
+                               content_type="application/json").json()
+        self.assertEqual([t["id"] for t in res["ranked_tasks"]], [1, 2])
+        res = self.client.get("/api/tasks/analyze_db/?mode=lazy", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+
+
+class MultiModeTests(TestCase):
+
+    setUp = KeysetPaginationTests.setUp
+
+    def test_all_modes_match_single_mode_rankings(self):
+        from . import cache
+        from .scoring import BUILTIN_MODES
+
+        tasks = self.client.get("/api/tasks/list/").json()["tasks"]
+        for engine in ["python", "vectorized"]:
+            cache.clear()
+            res = self.client.post(f"/api/tasks/analyze/?mode=all&engine={engine}&as_of=2030-01-01",
+                                   data={"tasks": tasks}, content_type="application/json").json()
+            self.assertEqual(res["modes"], list(BUILTIN_MODES))
+            for mode in BUILTIN_MODES:
+                cache.clear()
+                single = self.client.post(f"/api/tasks/analyze/?mode={mode}&engine={engine}&as_of=2030-01-01",
+                                          data={"tasks": tasks}, content_type="application/json").json()
+                self.assertEqual(res["rankings"][mode], single["ranked_tasks"])
+
+        for engine in ["stored", "python", "vectorized"]:
+            res = self.client.get(f"/api/tasks/analyze_db/?mode=impact,deadline&engine={engine}").json()
+            self.assertEqual(res["modes"], ["impact", "deadline"])
+            for mode in res["modes"]:
+                single = self.client.get(f"/api/tasks/analyze_db/?mode={mode}&engine={engine}").json()
+                self.assertEqual(res["rankings"][mode], single["ranked_tasks"])
+
+    def test_mode_lists_are_validated(self):
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?mode=smart,nope").status_code, 400)
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?mode=all&limit=5").status_code, 400)
+
+
+class DependencyIndexTests(TransactionTestCase):
+    # commits for real, the index only keeps what was committed
+
+    def setUp(self):
+        from . import dag
+        dag.reset()
+        self.addCleanup(dag.reset)
+
+    def add(self, title, dependencies=()):
+        res = self.client.post("/api/tasks/add/", data={"task": {
+            "title": title, "due_date": "2030-01-10", "estimated_hours": 2,
+            "importance": 5, "dependencies": list(dependencies)
+        }}, content_type="application/json")
+        return res
+
+    def test_writes_update_the_index_without_reloading(self):
+        from unittest import mock
+        from .dag import DependencyIndex, dependency_index, bump_version
+
+        first = self.add("Fix bug").json()["id"]
+        self.client.get("/api/tasks/analyze_db/")
+
+        with mock.patch.object(DependencyIndex, "load", side_effect=AssertionError("reloaded")):
+            second = self.add("Deploy", [first]).json()["id"]
+            self.client.post("/api/tasks/add_bulk/", data={"tasks": [
+                {"ref": "a", "title": "Docs", "estimated_hours": 1, "importance": 3, "dependencies": [second]},
+                {"title": "Announce", "estimated_hours": 1, "importance": 3, "dependencies": ["a"]},
+            ]}, content_type="application/json")
+            self.assertEqual(self.add("Nope", [999]).status_code, 400)
+
+            for engine in ["stored", "python"]:
+                ranked = self.client.get(f"/api/tasks/analyze_db/?engine={engine}").json()["ranked_tasks"]
+                self.assertEqual([task["depth"] for task in ranked], [0, 1, 2, 3])
+
+        index = dependency_index()
+        self.assertEqual(index.dependents[first], 1)
+
+        # a write the index didn't see (another worker) makes it reload
+        bump_version()
+        self.assertIsNot(dependency_index(), index)
+
+    def test_index_loaded_between_a_row_and_its_edges(self):
+        from .dag import DependencyIndex
+        from .models import Task, TaskDependency
+
+        first = self.add("Fix bug").json()["id"]
+        # the async add: row, then edges, then the version
+        task = Task.objects.create(title="Deploy", estimated_hours=1, importance=5)
+        index = DependencyIndex.load()
+        index.depths
+        TaskDependency.objects.create(task=task, depends_on_id=first)
+
+        index.add([{"id": task.id, "dependencies": [first]}])
+        self.assertEqual((index.deps[task.id], index.dependents[first], index.depths[task.id]), ([first], 1, 1))
+
+    def test_new_edges_closing_a_cycle_are_rejected(self):
+        from .dag import dependency_index
+        from .scoring import CycleError
+
+        a = self.add("A").json()["id"]
+        b = self.add("B", [a]).json()["id"]
+        c = self.add("C", [b]).json()["id"]
+        d = self.add("D").json()["id"]
+
+        index = dependency_index()
+        with self.assertRaises(CycleError) as raised:
+            index.check_edges(a, [d, c])
+        self.assertEqual(raised.exception.path, [a, c, b, a])
+
+        index.check_edges(a, [d])
+        index.check_edges(c, [a, d])
+        with self.assertRaises(CycleError):
+            index.check_edges(b, [b])
+
+    def test_stored_cycle_only_fails_rankings(self):
+        from .dag import dependency_index
+        from .models import TaskDependency
+        from .store import invalidate
+
+        a = self.add("A").json()["id"]
+        b = self.add("B", [a]).json()["id"]
+        # written around the checks, like a hand edit of the database
+        TaskDependency.objects.create(task_id=a, depends_on_id=b)
+        invalidate()
+
+        self.assertEqual(len(self.client.get("/api/tasks/list/").json()["tasks"]), 2)
+        self.assertEqual(self.add("C").status_code, 200)
+        d = self.add("D", [b]).json()["id"]
+        res = self.client.post("/api/tasks/add_bulk/", data=[
+            {"title": "E", "estimated_hours": 1, "importance": 3, "dependencies": [d]},
+        ], content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        dependency_index().check_edges(d, [a])
+
+        for url in ["analyze_db/", "analyze_db/?engine=python", "analyze_db/?engine=sql",
+                    "suggest/", "plan/", "async/analyze_db/", "async/suggest/"]:
+            res = self.client.get(f"/api/tasks/{url}")
+            self.assertEqual(res.status_code, 400, url)
+            self.assertTrue(res.json()["error"].startswith("Circular dependency detected"), url)
+
+
+class PlanTests(TestCase):
+
+    def setUp(self):
+        tasks = [
+            {"ref": "design", "title": "Design", "estimated_hours": 3, "importance": 8, "due_date": "2030-01-01", "dependencies": []},
+            {"ref": "build", "title": "Build", "estimated_hours": 20, "importance": 9, "due_date": "2030-01-02", "dependencies": ["design"]},
+            {"ref": "docs", "title": "Docs", "estimated_hours": 6, "importance": 2, "dependencies": ["design"]},
+            {"ref": "fix", "title": "Fix", "estimated_hours": 2, "importance": 7, "dependencies": []},
+            {"ref": "ship", "title": "Ship", "estimated_hours": 1, "importance": 10, "dependencies": ["build", "docs"]},
+        ]
+        res = self.client.post("/api/tasks/add_bulk/", data={"tasks": tasks}, content_type="application/json").json()
+        self.ids = dict(zip([task["ref"] for task in tasks], res["ids"]))
+
+    def test_plan_respects_budget_dependencies_and_critical_path(self):
+        ids = self.ids
+        plan = self.client.get("/api/tasks/plan/?hours_per_day=8&start=2030-01-01&as_of=2030-01-01").json()
+
+        self.assertEqual(plan["critical_path"], {"hours": 24, "tasks": [ids["design"], ids["build"], ids["ship"]]})
+        self.assertEqual(plan["start"], "2030-01-01")
+        days = plan["days"]
+        self.assertEqual(days["hours"], [8, 8, 8, 8])
+        self.assertEqual(days["ends"][-1], len(days["tasks"]))
+
+        # every task after its dependencies
+        worked = days["tasks"]
+        first = {task_id: worked.index(task_id) for task_id in ids.values()}
+        last = {task_id: len(worked) - 1 - worked[::-1].index(task_id) for task_id in ids.values()}
+        for task, deps in {"build": ["design"], "docs": ["design"], "ship": ["build", "docs"]}.items():
+            self.assertTrue(all(last[ids[dep]] < first[ids[task]] for dep in deps))
+        # Build starts in what's left of the first day and runs over four
+        self.assertEqual([worked[begin:end] for begin, end in zip([0, *days["ends"]], days["ends"])], [
+            [ids["design"], ids["fix"], ids["build"]], [ids["build"]], [ids["build"]],
+            [ids["build"], ids["docs"], ids["ship"]],
+        ])
+
+        self.assertEqual(plan["late"], [ids["build"]])
+        self.assertEqual(plan["end"], "2030-01-04")
+
+    def test_plan_past_the_last_date(self):
+        self.client.post("/api/tasks/add/", data={"task": {
+            "title": "Forever", "estimated_hours": 2**63 - 1, "importance": 5, "dependencies": []
+        }}, content_type="application/json")
+        res = self.client.get("/api/tasks/plan/")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("9999-12-31", res.json()["error"])
+
+    def test_bad_parameters(self):
+        for query in ["hours_per_day=0", "hours_per_day=25", "hours_per_day=7.5", "hours_per_day=²", "start=soon", "mode=nope"]:
+            self.assertEqual(self.client.get(f"/api/tasks/plan/?{query}").status_code, 400)
+
+
+class DownstreamImpactTests(TestCase):
+
+    def test_buckets_match_full_reachability(self):
+        import random
+        from .scoring import TaskRecord, downstream_bucket, downstream_buckets
+
+        rng = random.Random(7)
+        tasks = [
+            TaskRecord(i, str(i), None, rng.randint(1, 12), 5, rng.sample(range(i), min(i, rng.randint(0, 3))))
+            for i in range(300)
+        ]
+        dependents = {task.id: [] for task in tasks}
+        for task in tasks:
+            for dep in task.dependencies:
+                dependents[dep].append(task.id)
+
+        buckets = downstream_buckets(tasks)
+        for task in tasks:
+            reach, stack = set(), [task.id]
+            while stack:
+                for dependent in dependents[stack.pop()]:
+                    if dependent not in reach:
+                        reach.add(dependent)
+                        stack.append(dependent)
+            hours = sum(tasks[i].estimated_hours for i in reach)
+            self.assertEqual(buckets[task.id], downstream_bucket(len(reach), hours))
+
+    def test_mode_weighing_downstream_work(self):
+        from .scoring import register_weight_mode, WEIGHT_METHOD, PRIORITY_TABLES
+
+        register_weight_mode("unblock", {"urgency": 0, "importance": 0, "effort": 0, "dependency": 0, "downstream": 1})
+        self.addCleanup(WEIGHT_METHOD.pop, "unblock")
+        self.addCleanup(PRIORITY_TABLES.pop, "unblock")
+
+        # three 8 hour tasks wait on Root one after the other: 3 tasks, 24 hours downstream
+        tasks = [
+            {"id": 1, "title": "Root", "estimated_hours": 2, "importance": 1, "dependencies": []},
+            {"id": 2, "title": "Next", "estimated_hours": 8, "importance": 1, "dependencies": [1]},
+            {"id": 3, "title": "Later", "estimated_hours": 8, "importance": 1, "dependencies": [2]},
+            {"id": 4, "title": "Last", "estimated_hours": 8, "importance": 1, "dependencies": [3]},
+            {"id": 5, "title": "Lone", "estimated_hours": 1, "importance": 10, "dependencies": []},
+        ]
+        rankings = []
+        for engine in ["python", "vectorized"]:
+            res = self.client.post(f"/api/tasks/analyze/?mode=unblock,smart&engine={engine}", data={"tasks": tasks},
+                                   content_type="application/json").json()
+            rankings.append(res["rankings"])
+        self.assertEqual([t["title"] for t in rankings[0]["unblock"]], ["Root", "Lone", "Next", "Later", "Last"])
+        self.assertEqual(rankings[0]["unblock"][0]["priority_score"], 0.5)
+        self.assertEqual([t["title"] for t in rankings[0]["smart"]][:2], ["Lone", "Root"])
+        self.assertEqual(rankings[0], rankings[1])
+
+        stored = [
+            {"ref": str(task_id), **task, "dependencies": [str(dep) for dep in task["dependencies"]]}
+            for task_id, task in ((task.pop("id"), task) for task in tasks)
+        ]
+        self.client.post("/api/tasks/add_bulk/", data={"tasks": stored}, content_type="application/json")
+        res = self.client.get("/api/tasks/analyze_db/?mode=unblock&as_of=2030-01-01").json()
+        self.assertEqual([(t["title"], t["priority_score"]) for t in res["ranked_tasks"]],
+                         [(t["title"], t["priority_score"]) for t in rankings[0]["unblock"]])
+
+        # both only read part of the tasks
+        self.assertEqual(self.client.get("/api/tasks/suggest/?mode=unblock").status_code, 400)
+        self.assertEqual(self.client.get("/api/tasks/analyze_db/?mode=unblock&engine=sql").status_code, 400)
+
+
+class WriteBehindTests(TransactionTestCase):
+
+    def setUp(self):
+        from . import dag, ingest
+        ingest.reset()
+        dag.reset()
+        self.addCleanup(dag.reset)
+        self.addCleanup(ingest.reset)
+
+    def stop_worker(self):
+        # reads and a full queue write it out from this thread instead, the
+        # shared in-memory test database doesn't take writes from two threads
+        from . import ingest
+        queue = ingest.get_queue()
+        with queue.changed:
+            queue.closed = True
+            queue.changed.notify_all()
+        queue.thread.join()
+
+    def add(self, title, deps=()):
+        return self.client.post("/api/tasks/add/", data={"task": {
+            "title": title, "estimated_hours": 2, "importance": 5, "dependencies": list(deps)
+        }}, content_type="application/json")
+
+    def test_read_after_write_sees_queued_tasks(self):
+        from django.test import override_settings
+        from . import ingest
+
+        with override_settings(TASK_WRITE_BEHIND=True):
+            self.stop_worker()
+            res = self.add("A")
+            self.assertEqual(res.status_code, 202)
+            a = res.json()["id"]
+            # depends on a task still in the queue
+            b = self.add("B", [a]).json()["id"]
+            self.assertEqual(self.add("C", [b + 1]).status_code, 400)
+            self.assertEqual(ingest.stats()["queued"], 2)
+
+            # a direct insert meanwhile never takes a reserved id
+            [direct] = self.client.post("/api/tasks/add_bulk/", data={"tasks": [
+                {"title": "Direct", "estimated_hours": 1, "importance": 5, "dependencies": []}
+            ]}, content_type="application/json").json()["ids"]
+            self.assertNotIn(direct, (a, b))
+
+            tasks = self.client.get("/api/tasks/list/").json()["tasks"]
+            self.assertEqual({task["id"]: task["dependencies"] for task in tasks}, {a: [], b: [a], direct: []})
+            ranked = self.client.get("/api/tasks/analyze_db/").json()["ranked_tasks"]
+            self.assertEqual(len(ranked), 3)
+
+            stats = self.client.get("/api/tasks/metrics/").json()["write_behind"]
+            self.assertEqual((stats["queued"], stats["written"], stats["batches"]), (0, 2, 1))
+            self.assertEqual(stats["flush_latency_ms"]["count"], 2)
+
+            # a bulk import depending on a task still in the queue
+            c = self.add("C").json()["id"]
+            res = self.client.post("/api/tasks/add_bulk/", data={"tasks": [
+                {"title": "After C", "estimated_hours": 1, "importance": 5, "dependencies": [c]}
+            ]}, content_type="application/json")
+            self.assertEqual(res.status_code, 200)
+            [after] = res.json()["ids"]
+            tasks = self.client.get("/api/tasks/list/").json()["tasks"]
+            self.assertEqual({task["id"]: task["dependencies"] for task in tasks}[after], [c])
+
+    def test_full_queue_and_dropped_tasks(self):
+        from django.test import override_settings
+        from . import ingest
+        from .models import Task
+
+        with override_settings(TASK_WRITE_BEHIND=True, TASK_WRITE_BEHIND_QUEUE=3, TASK_WRITE_BEHIND_BATCH=2):
+            self.stop_worker()
+            ids = [self.add(f"Task {i}").json()["id"] for i in range(7)]
+            stats = ingest.stats()
+            self.assertEqual((stats["full"], stats["queued"]), (2, 1))
+
+            # its dependency goes before the queue is written out
+            orphan = self.add("Orphan", [ids[0]]).json()["id"]
+            Task.objects.filter(id=ids[0]).delete()
+            with self.assertLogs("tasks.ingest", "ERROR"):
+                tasks = self.client.get("/api/tasks/list/").json()["tasks"]
+
+            self.assertEqual([task["id"] for task in tasks], ids[1:])
+            self.assertNotIn(orphan, [task["id"] for task in tasks])
+            stats = ingest.stats()
+            self.assertEqual((stats["submitted"], stats["written"], stats["failed"]), (8, 8, 1))
+
+
+class WriteBehindWorkerTests(TransactionTestCase):
+    """
+    The worker thread writing batches itself. The shared in-memory test
+    database doesn't take writes from two threads, the default connection
+    points to a file database for these tests
+    """
+
+    def setUp(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.db import connections
+        from . import dag, ingest
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        # new connections of every thread read the same settings dict
+        conn = connections["default"]
+        memory, name = conn.connection, conn.settings_dict["NAME"]
+        conn.connection = None
+        conn.settings_dict["NAME"] = os.path.join(directory.name, "db.sqlite3")
+
+        def restore():
+            conn.close()
+            conn.settings_dict["NAME"] = name
+            conn.connection = memory
+        self.addCleanup(restore)
+
+        call_command("migrate", verbosity=0)
+        ingest.reset()
+        dag.reset()
+        self.addCleanup(dag.reset)
+        self.addCleanup(ingest.reset)
+
+    def test_worker_writes_batches(self):
+        import time
+        from django.test import override_settings
+        from . import ingest
+        from .models import Task
+
+        with override_settings(TASK_WRITE_BEHIND=True, TASK_WRITE_BEHIND_BATCH=4, TASK_WRITE_BEHIND_DELAY=0.05):
+            ids = [
+                self.client.post("/api/tasks/add/", data={"task": {
+                    "title": f"Task {i}", "estimated_hours": 2, "importance": 5, "dependencies": []
+                }}, content_type="application/json").json()["id"]
+                for i in range(10)
+            ]
+
+            # no read barrier here, only the worker writes
+            deadline = time.monotonic() + 10
+            while ingest.stats()["written"] < len(ids) and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            stats = ingest.stats()
+            self.assertEqual((stats["queued"], stats["written"], stats["failed"]), (0, 10, 0))
+            self.assertGreaterEqual(stats["batches"], 3)
+            self.assertEqual(list(Task.objects.filter(id__in=ids).order_by("id").values_list("id", flat=True)), ids)
@@ -0,0 +1,213 @@
+"""
+Per request stage timings, sent back in a Server-Timing header and
+aggregated into per endpoint latency histograms served by /metrics/.
+
+Code marks its stages with `with stage("score"):` or `@timed("score")`.
+Outside a timed request (TASK_TIMING off, management commands, batch
+workers) a stage is one context variable lookup and does nothing else.
+Metrics are kept per process.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+_timer = ContextVar("task_timer", default=None)
+
+# upper bounds in milliseconds, the last bucket takes everything slower
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+class RequestTimer:
+    __slots__ = ("durations", "active")
+
+    def __init__(self):
+        self.durations = {}
+        self.active = set()
+
+
+class Stage:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        if self.name in self.timer.active:
+            # already inside the same stage (score_tasks computing its own depths), count it once
+            self.timer = None
+            return self
+        self.timer.active.add(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timer is not None:
+            elapsed = time.perf_counter() - self.start
+            durations = self.timer.durations
+            durations[self.name] = durations.get(self.name, 0.0) + elapsed
+            self.timer.active.discard(self.name)
+        return False
+
+
+class NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_STAGE = NoStage()
+
+
+def stage(name):
+    """
+    Context manager timing the block as stage name of the current request
+    """
+    timer = _timer.get()
+    if timer is None:
+        return NO_STAGE
+    return Stage(timer, name)
+
+def timed(name):
+    """
+    Decorator timing every call as stage name of the current request
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = _timer.get()
+            if timer is None:
+                return func(*args, **kwargs)
+            with Stage(timer, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += ms
+
+    def as_dict(self):
+        # cumulative, like Prometheus "le" buckets
+        buckets, total = {}, 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            total += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = total
+        return {"count": self.count, "sum_ms": round(self.sum, 3), "buckets": buckets}
+
+
+class EndpointMetrics:
+    __slots__ = ("status", "latency", "stages")
+
+    def __init__(self):
+        self.status = {}
+        self.latency = Histogram()
+        self.stages = {}
+
+    def as_dict(self):
+        return {
+            "requests": self.latency.count,
+            "status": dict(self.status),
+            "latency_ms": self.latency.as_dict(),
+            "stages_ms": {name: hist.as_dict() for name, hist in self.stages.items()},
+        }
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def record(endpoint, status, total_ms, durations):
+    with _metrics_lock:
+        metrics = _metrics.get(endpoint)
+        if metrics is None:
+            metrics = _metrics[endpoint] = EndpointMetrics()
+        metrics.status[str(status)] = metrics.status.get(str(status), 0) + 1
+        metrics.latency.observe(total_ms)
+        for name, seconds in durations.items():
+            hist = metrics.stages.get(name)
+            if hist is None:
+                hist = metrics.stages[name] = Histogram()
+            hist.observe(seconds * 1000)
+
+def snapshot():
+    with _metrics_lock:
+        return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(_metrics.items())}
+
+def reset():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def server_timing(durations, total):
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in durations.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Time every request, add the Server-Timing header and record the
+    metrics. Only installed when settings.TASK_TIMING is on
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "TASK_TIMING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = RequestTimer()
+        token = _timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - start)
+
+    def finish(self, request, response, timer, total):
+        response["Server-Timing"] = server_timing(timer.durations, total)
+        match = request.resolver_match
+        endpoint = f"/{match.route}" if match else "unmatched"
+        record(endpoint, response.status_code, total * 1000, timer.durations)
+        return response
@@ -1,11 +1,22 @@
 from django.urls import path
-from .views import analyze_tasks, suggest_tasks, add_task, clear_tasks, list_tasks, analyze_db
+from . import async_views
+from .views import analyze_tasks, analyze_batch, suggest_tasks, add_task, add_tasks_bulk, clear_tasks, list_tasks, analyze_db, plan_tasks, metrics
 
 urlpatterns = [
     path("add/", add_task),
+    path("add_bulk/", add_tasks_bulk),
     path("list/", list_tasks),
     path("clear/", clear_tasks),
     path("analyze/", analyze_tasks),
+    path("analyze_batch/", analyze_batch),
     path("analyze_db/", analyze_db),
     path("suggest/", suggest_tasks),
+    path("plan/", plan_tasks),
+    path("metrics/", metrics),
+
+    # async ORM versions for ASGI servers
+    path("async/add/", async_views.add_task),
+    path("async/list/", async_views.list_tasks),
+    path("async/analyze_db/", async_views.analyze_db),
+    path("async/suggest/", async_views.suggest_tasks),
 ]
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Column oriented version of scoring.score_tasks.
+
+Every task field is pulled into a NumPy array once, classified into its
+component levels and the priority of the whole list is looked up in the
+mode's PriorityTable in bulk. The output is identical to score_tasks.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from .scoring import (
+    PRIORITY_TABLES, URGENCY_LEVELS, IMPORTANCE_LEVELS, EFFORT_LEVELS, DEPENDENCY_LEVELS,
+    URGENCY_BOUNDARIES, bucket_index, topological_depths, dependents_counts, downstream_buckets, weighs_downstream
+)
+from .timing import timed
+
+SORT_COLUMN = {
+    "fastest": "effort",
+    "impact": "importance",
+    "deadline": "urgency",
+}
+
+
+def urgency_buckets(due_ordinals, has_due, today):
+    days_left = due_ordinals - today.toordinal()
+
+    buckets = np.select(
+        [
+            days_left < 0,   # Overdue
+            days_left == 0,  # Due today
+            days_left == 1,  # Due tomorrow
+            days_left <= 3,
+            days_left <= 7,
+            days_left <= 14,
+        ],
+        [7, 6, 5, 4, 3, 2],
+        default=1
+    )
+    return np.where(has_due, buckets, 0)
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def date_ordinals(iso_dates):
+    # date.toordinal() of ISO date strings in one pass, 0 for None
+    dates = np.array(iso_dates, dtype="datetime64[D]")
+    return np.where(np.isnat(dates), 0, dates.astype(np.int64) + EPOCH_ORDINAL)
+
+def urgency_expiry(due_ordinals, today):
+    """
+    scoring.ranking_expires of tasks from the ordinals of their due dates
+    (0: none): for each bucket boundary, the earliest due date still beyond it
+    """
+    expiries = []
+    for boundary in URGENCY_BOUNDARIES:
+        beyond = due_ordinals[due_ordinals > today.toordinal() + boundary]
+        if beyond.size:
+            expiries.append(int(beyond.min()) - boundary)
+    return date.fromordinal(min(expiries)) if expiries else None
+
+
+# hours from which every task is in the last effort bucket
+EFFORT_CAP = 9
+
+def effort_buckets(hours):
+    return np.select(
+        [hours <= 1, hours <= 4, hours <= 8],
+        [0, 1, 2],
+        default=3
+    )
+
+
+def dependency_buckets(no_of_dependents):
+    return np.minimum(no_of_dependents, 3)
+
+
+LEVELS = {
+    "urgency": URGENCY_LEVELS,
+    "importance": IMPORTANCE_LEVELS,
+    "effort": EFFORT_LEVELS,
+    "dependency": DEPENDENCY_LEVELS,
+}
+
+def task_buckets(tasks, modes, today):
+    """
+    The level of every task in each component as arrays (downstream is
+    only classified when one of modes weighs it).
+    Return: ({component: buckets}, bucket_index array, blocked array)
+    """
+    count = len(tasks)
+    dependents_count = dependents_counts(tasks)
+
+    due_ordinals = np.fromiter(
+        (task.due_date.toordinal() if task.due_date else 0 for task in tasks),
+        dtype=np.int64, count=count
+    )
+    has_due = np.fromiter((bool(task.due_date) for task in tasks), dtype=bool, count=count)
+    # effort only tells hours up to EFFORT_CAP apart, capped they fit in
+    # int64 whatever size the validator let through
+    hours = np.fromiter((min(task.estimated_hours, EFFORT_CAP) for task in tasks), dtype=np.int64, count=count)
+    importance = np.fromiter((task.importance for task in tasks), dtype=np.int64, count=count)
+    dependents = np.fromiter((dependents_count[task.id] for task in tasks), dtype=np.int64, count=count)
+    blocked = np.fromiter((len(task.dependencies) > 0 for task in tasks), dtype=bool, count=count)
+    if any(map(weighs_downstream, modes)):
+        downstream_count = downstream_buckets(tasks)
+        downstream = np.fromiter((downstream_count.get(task.id, 0) for task in tasks), dtype=np.int64, count=count)
+    else:
+        downstream = np.zeros(count, dtype=np.int64)
+
+    buckets, index = column_buckets(due_ordinals, has_due, hours, importance, dependents, downstream, blocked, today)
+    return buckets, index, blocked
+
+def column_buckets(due_ordinals, has_due, hours, importance, dependents, downstream, blocked, today):
+    """
+    task_buckets of tasks already pulled into arrays (hours capped at EFFORT_CAP).
+    Return: ({component: buckets}, bucket_index array)
+    """
+    buckets = {
+        "urgency": urgency_buckets(due_ordinals, has_due, today),
+        "importance": importance - 1,
+        "effort": effort_buckets(hours),
+        "dependency": dependency_buckets(dependents),
+        "downstream": downstream,
+    }
+    index = bucket_index(
+        buckets["urgency"], buckets["importance"], buckets["effort"], buckets["dependency"],
+        buckets["downstream"], blocked.astype(np.int64)
+    )
+    return buckets, index
+
+def rank_keys(tasks, mode, as_of=None):
+    """
+    scoring.rank_key(mode) of every task without its depth, as an array
+    (smaller ranks first): minus the rounded score, or minus the level the
+    mode sorts by
+    """
+    buckets, index, _ = task_buckets(tasks, [mode], as_of or date.today())
+    return bucket_rank_keys(buckets, index, mode)
+
+def bucket_rank_keys(buckets, index, mode):
+    # rank_keys from the column_buckets of the tasks
+    if mode in SORT_COLUMN:
+        column = SORT_COLUMN[mode]
+        return -np.asarray(LEVELS[column])[buckets[column]]
+    return -np.asarray(PRIORITY_TABLES[mode].score)[index]
+
+
+@timed("score")
+def score_tasks_vectorized(tasks, graph, mode, depths=None, as_of=None):
+    return score_tasks_vectorized_modes(tasks, graph, [mode], depths, as_of)[mode]
+
+@timed("score")
+def score_tasks_vectorized_modes(tasks, graph, modes, depths=None, as_of=None):
+    """
+    Rankings of the same tasks for several modes. The columns, levels
+    and reasons are computed once, each mode only looks up its priorities
+    Return: {mode: ranked}
+    """
+    count = len(tasks)
+    today = as_of or date.today()
+
+    if depths is None:
+        depths = topological_depths(graph)
+    depth = np.fromiter((depths.get(task.id, 0) for task in tasks), dtype=np.int64, count=count)
+
+    buckets, index, blocked = task_buckets(tasks, modes, today)
+    columns = {
+        name: np.asarray(LEVELS[name])[buckets[name]]
+        for name in ("urgency", "importance", "effort", "dependency")
+    }
+
+    reasons = task_reasons(tasks, columns, blocked)
+    depth_list = depth.tolist()
+
+    rankings = {}
+    for mode in modes:
+        table = PRIORITY_TABLES[mode]
+        priority_score = np.asarray(table.priority)[index]
+        rounded = np.asarray(table.score)[index]
+
+        priority_indicator = np.where(
+            priority_score >= 0.75, "High",
+            np.where(priority_score >= 0.40, "Medium", "Low")
+        )
+
+        sort_column = columns[SORT_COLUMN[mode]] if mode in SORT_COLUMN else rounded
+        order = np.lexsort((-sort_column, depth))
+
+        rounded_list = rounded.tolist()
+        indicator_list = priority_indicator.tolist()
+
+        rankings[mode] = [
+            {
+                "id": tasks[i].id,
+                "title": tasks[i].title,
+                "due_date": tasks[i].due_date,
+                "effort": tasks[i].estimated_hours,
+                "importance": tasks[i].importance,
+                "priority_score": rounded_list[i],
+                "priority_indicator": indicator_list[i],
+                "depth": depth_list[i],
+                # the same list in every mode's entry, reasons don't depend on the mode
+                "reasons": reasons[i]
+            }
+            for i in order.tolist()
+        ]
+
+    return rankings
+
+
+def task_reasons(tasks, columns, blocked):
+    urgent_list = columns["urgency"].tolist()
+    urgent_reason = (columns["urgency"] >= 0.85).tolist()
+    important_reason = (columns["importance"] >= 0.8).tolist()
+    effort_reason = (columns["effort"] >= 0.7).tolist()
+    dependency_reason = (columns["dependency"] >= 0.7).tolist()
+    blocked_list = blocked.tolist()
+
+    all_reasons = []
+    for i, task in enumerate(tasks):
+        reasons = []
+        if urgent_reason[i]:
+            if urgent_list[i] == 1.0:
+                reasons.append("Deadline crossed")
+            else:
+                reasons.append(f"Urgent Deadline {task.due_date}")
+        if important_reason[i]:
+            reasons.append("High importance")
+        if effort_reason[i]:
+            reasons.append("Quick win")
+        if dependency_reason[i]:
+            reasons.append("Unblocks other tasks")
+        if blocked_list[i]:
+            reasons.append(f"Currently blocked by task/s {task.dependencies}")
+        all_reasons.append(reasons)
+
+    return all_reasons
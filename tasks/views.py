@@ -1,12 +1,31 @@
-from django.shortcuts import render
 import json
+import hashlib
+from datetime import date
+from urllib.parse import urlencode
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from .scoring import validate_tasks, score_tasks, ValidationError, CycleError
-from collections import defaultdict
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from .scoring import WEIGHT_METHOD, weights_digest, ranking_expires, validate_tasks, validate_task_stream, TaskValidator, top_executable, build_graph, detect_cycle, ValidationError, CycleError
+from .batch import SCORING_ENGINES, MULTI_MODE_ENGINES, analyze_sets
+from .streaming import is_ndjson, read_ndjson, ndjson_response
+from .timing import stage, snapshot
+from .formats import response_format, columnar_response, columnar_rankings_response
+from .cache import ranking_keys, get_ranking, set_ranking, stats as cache_stats
+from .store import (
+    load_tasks, check_dependencies, due_warnings, existing_ids, create_tasks, LocalRef,
+    stored_rankings, stored_top_k, stored_plan, stored_page, list_page, bump_version, table_version
+)
+from .plan import MAX_HOURS_PER_DAY
+from .dag import dependency_index, tasks_cleared
+from .query import sql_ranking, sql_top_k
+from . import ingest
 from tasks.models import Task
 
 
+
 @csrf_exempt
 def add_task(request):
     if request.method != "POST":
@@ -24,21 +43,7 @@ def add_task(request):
             })
 
         tasks, Warnings = validate_tasks([raw_data], require_id=False)
-        task = tasks[0]
-
-        obj = Task.objects.create(
-            title = task["title"],
-            due_date=task.get("due_date"),
-            estimated_hours=task["estimated_hours"],
-            importance=task["importance"],
-            dependencies=task["dependencies"]
-        )
-
-        return JsonResponse({
-            "message": 'Task added successfully',
-            "id": obj.id,
-            "Warnings": Warnings
-        })
+        return store_task(tasks[0], Warnings)
 
     except json.JSONDecodeError:
         return JsonResponse({
@@ -49,44 +54,204 @@ def add_task(request):
             "error": str(e)
         }, status=400)
 
-def build_graph(tasks):
+def store_task(task, Warnings):
     """
-    Returns adjacency list: task -> dependencies
+    Insert a validated task, or queue it with write behind on, and answer
+    add_task (the async one too). Raises ValidationError
+    """
+    if ingest.enabled():
+        task.dependencies = ingest.check_dependencies(task.dependencies)
+        return JsonResponse({
+            "message": "Task accepted",
+            "id": ingest.submit(task),
+            "Warnings": Warnings
+        }, status=202)
+
+    # checked against the dependency index, before the transaction so a
+    # reload it needs is kept
+    task.dependencies = check_dependencies(task.dependencies)
+
+    try:
+        with transaction.atomic():
+            [task_id] = create_tasks([task])
+    except IntegrityError:
+        # a dependency was deleted after the check above
+        raise ValidationError("unknown dependency")
+
+    return JsonResponse({
+        "message": 'Task added successfully',
+        "id": task_id,
+        "Warnings": Warnings
+    })
+
+def validate_batch(items):
     """
-    graph = defaultdict(list)
+    Validate a batch of new tasks in one pass, collecting errors per item.
+    A dependency naming the "ref" of another item points to that item
+    (refs win over stored ids), any other must be the id of a stored task.
+    Return: (tasks, results) with one {"index", "warnings", "errors"} per item
+    """
+
+    results = [{"index": i, "warnings": [], "errors": []} for i in range(len(items))]
+    refs = {}
+
+    for i, item in enumerate(items):
+        ref = item.get("ref") if isinstance(item, dict) else None
+        if ref is None:
+            continue
+        if not isinstance(ref, (str, int)) or isinstance(ref, bool):
+            results[i]["errors"].append("ref must be string or number")
+        elif ref in refs:
+            results[i]["errors"].append(f"Duplicate ref: {ref}")
+        else:
+            refs[ref] = i
+            results[i]["ref"] = ref
+
+    validator = TaskValidator(require_id=False)
+    tasks = []
+    for i, item in enumerate(items):
+        try:
+            tasks.append(validator.validate(item, i, None, results[i]["warnings"]))
+        except ValidationError as e:
+            tasks.append(None)
+            results[i]["errors"].append(str(e))
+
+    external = set()
+    for i, task in enumerate(tasks):
+        if task is None:
+            continue
+
+        if not all(isinstance(dep, (str, int)) and not isinstance(dep, bool) for dep in task.dependencies):
+            results[i]["errors"].append("dependencies must be task ids or refs")
+            continue
+
+        resolved = []
+        for dep in dict.fromkeys(task.dependencies):
+            if dep in refs:
+                if refs[dep] == i:
+                    results[i]["errors"].append("task cannot depend on itself")
+                resolved.append(LocalRef(refs[dep]))
+            elif isinstance(dep, int):
+                external.add(dep)
+                resolved.append(dep)
+            else:
+                results[i]["errors"].append(f"unknown dependency '{dep}'")
+        task.dependencies = resolved
+
+    found = existing_ids(external)
+    local_graph = {}
+    for i, task in enumerate(tasks):
+        if task is None:
+            continue
+        for dep in task.dependencies:
+            if not isinstance(dep, LocalRef) and dep not in found:
+                results[i]["errors"].append(f"unknown dependency '{dep}'")
+        local_graph[i] = [dep.index for dep in task.dependencies if isinstance(dep, LocalRef)]
+
+    if not any(result["errors"] for result in results):
+        try:
+            detect_cycle(local_graph)
+        except CycleError as e:
+            message = "Circular dependency detected: " + " → ".join(str(items[i]["ref"]) for i in e.path)
+            for i in set(e.path):
+                results[i]["errors"].append(message)
+
+    return tasks, results
+
+@csrf_exempt
+def add_tasks_bulk(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        if is_ndjson(request):
+            items = list(read_ndjson(request))
+        else:
+            body = json.loads(request.body)
+            # {"tasks": [...]} or the list itself
+            items = body.get("tasks", []) if isinstance(body, dict) else body
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    for task in tasks:
-        graph[task["id"]] = task["dependencies"]
+    if not isinstance(items, list):
+        return JsonResponse({"error": "tasks must be a list"}, status=400)
+    if not items:
+        return JsonResponse({"message": "No tasks provided"})
 
-    return graph
+    # tasks still queued by write behind must be committed before the
+    # batch can check for them and store edges to them
+    ingest.flush()
+    tasks, results = validate_batch(items)
+    if any(result["errors"] for result in results):
+        return JsonResponse({
+            "error": "Some tasks are invalid, nothing was added",
+            "results": results
+        }, status=400)
 
-def detect_cycle(graph):
-    visited = set()
-    stack = []
-    in_stack = set()
+    # one transaction for the whole batch, inserted in chunks
+    with transaction.atomic():
+        ids = create_tasks(tasks)
 
-    def dfs(node):
-        if node in in_stack:
-            # return actual cycle path
-            i = stack.index(node)
-            cycle_path = stack[i:] + [node]
-            raise CycleError(" → ".join(map(str, cycle_path)))
+    for result, task_id in zip(results, ids):
+        result["id"] = task_id
 
-        if node in visited:
-            return
+    return JsonResponse({
+        "message": f"{len(ids)} tasks added successfully",
+        "ids": ids,
+        "results": results
+    })
 
-        visited.add(node)
-        stack.append(node)
-        in_stack.add(node)
+def as_of_date(request):
+    """
+    ?as_of=YYYY-MM-DD, the date urgency is computed for (today by default)
+    """
+    as_of = request.GET.get("as_of")
+    if as_of is None:
+        return date.today()
+    try:
+        return date.fromisoformat(as_of)
+    except ValueError:
+        raise ValidationError("as_of must be a date (YYYY-MM-DD)")
 
-        for neighbor in graph[node]:
-            dfs(neighbor)
+def suggestion_count(request):
+    """
+    ?k=, how many tasks suggest returns (3 by default)
+    """
+    k = request.GET.get("k", "3")
+    # isdigit alone takes "²", which int() doesn't
+    if not (k.isascii() and k.isdigit()) or int(k) < 1:
+        raise ValidationError("k must be a positive integer")
+    return int(k)
 
-        stack.pop()
-        in_stack.remove(node)
+def iso(day):
+    return day.isoformat() if day else None
 
-    for node in graph:
-        dfs(node)
+def request_modes(request, message="Invalid sort mode"):
+    """
+    ?mode= as a list of modes: one mode, a comma separated list or "all".
+    Return: (modes, multiple), multiple when a list or "all" was asked for
+    even if it names a single mode, so the response shape follows the request
+    """
+    mode = request.GET.get("mode", "smart")
+    if mode == "all":
+        return list(WEIGHT_METHOD), True
+
+    modes = list(dict.fromkeys(mode.split(",")))
+    if any(m not in WEIGHT_METHOD for m in modes):
+        raise ValidationError(message)
+    return modes, "," in mode
+
+def rankings_response(header, rankings, fmt, dates):
+    """
+    Several modes ranked at once, {"modes": [...], "rankings": {mode: ranked}}
+    """
+    header = {"modes": list(rankings), **header}
+    with stage("serialize"):
+        if fmt == "columnar":
+            return columnar_rankings_response(header, rankings, dates)
+        return JsonResponse({**header, "rankings": rankings})
 
 @csrf_exempt
 def analyze_tasks(request):
@@ -96,13 +261,32 @@ def analyze_tasks(request):
         })
 
     try:
-        data = json.loads(request.body)
-        raw_tasks = data.get("tasks", [])
-        if not raw_tasks:
+        fmt, dates = response_format(request)
+        as_of = as_of_date(request)
+        # ?errors=all reports every invalid task instead of the first one
+        collect_errors = request.GET.get("errors") == "all"
+        streaming = is_ndjson(request)
+        if streaming:
+            # one task per line, validated as the lines are read
+            tasks, Warnings = validate_task_stream(read_ndjson(request), collect_errors=collect_errors, as_of=as_of)
+        else:
+            with stage("parse"):
+                data = json.loads(request.body)
+            tasks = data.get("tasks", [])
+
+        if not tasks:
             return JsonResponse({
                 "Message": "No tasks available to analyze"
             })
-        tasks, Warnings = validate_tasks(raw_tasks)
+
+        if not streaming:
+            tasks, Warnings = validate_tasks(tasks, collect_errors=collect_errors, as_of=as_of)
+
+        modes, multiple = request_modes(request)
+
+        engine = request.GET.get("engine", "python")
+        if engine not in SCORING_ENGINES:
+            raise ValidationError("Invalid scoring engine")
 
         """
         build graph and detech cycle
@@ -110,20 +294,55 @@ def analyze_tasks(request):
         else -> continue with the ranking
         """
 
-        graph = build_graph(tasks)
-
         try:
-            detect_cycle(graph)
-            mode = request.GET.get("mode", "smart")
-            if mode not in ["smart", "fastest", "impact", "deadline"]:
-                raise ValidationError("Invalid sort mode")
-            
-            ranked = score_tasks(tasks, graph, mode)
-
-            return JsonResponse({
-                "warnings": Warnings,
-                "ranked_tasks": ranked
-            })
+            # the same tasks were ranked before for a date range covering as_of
+            rankings, expiries = {}, []
+            with stage("cache"):
+                keys = ranking_keys(tasks, modes)
+                for mode in modes:
+                    cached = get_ranking(keys[mode], as_of)
+                    if cached:
+                        rankings[mode], valid_until = cached
+                        expiries.append(valid_until)
+
+            missing = [mode for mode in modes if mode not in rankings]
+            if missing:
+                graph = build_graph(tasks)
+                depths = detect_cycle(graph)
+
+                # the modes not cached are scored together, sharing the component scores
+                computed = MULTI_MODE_ENGINES[engine](tasks, graph, missing, depths, as_of)
+                valid_until = ranking_expires(tasks, as_of)
+                for mode, ranked in computed.items():
+                    set_ranking(keys[mode], as_of, ranked, valid_until)
+                    rankings[mode] = ranked
+                expiries.append(valid_until)
+
+            valid_until = min((day for day in expiries if day), default=None)
+            header = {"warnings": Warnings, "valid_until": iso(valid_until)}
+
+            if multiple:
+                if streaming:
+                    return ndjson_response(
+                        {**header, "modes": modes},
+                        ({"mode": mode, **entry} for mode in modes for entry in rankings[mode])
+                    )
+                return rankings_response(header, {mode: rankings[mode] for mode in modes}, fmt, dates)
+
+            ranked = rankings[modes[0]]
+
+            if fmt == "columnar":
+                with stage("serialize"):
+                    return columnar_response(header, ranked, dates)
+
+            if streaming:
+                return ndjson_response(header, ranked)
+
+            with stage("serialize"):
+                return JsonResponse({
+                    **header,
+                    "ranked_tasks": ranked
+                })
         
         except CycleError as e:
             raise ValidationError(f"Circular dependency detected: {e}")
@@ -133,57 +352,287 @@ def analyze_tasks(request):
             "error": "Invalid JSON"
         }, status=400)
     except ValidationError as e:
+        response = {"error": str(e)}
+        if hasattr(e, "errors"):
+            response["errors"] = e.errors
+        return JsonResponse(response, status=400)
+
+@csrf_exempt
+def analyze_batch(request):
+    """
+    Rank many independent task lists, {"sets": {set_id: [tasks]}}, in parallel.
+    A set that fails validation gets an error of its own, the rest are still ranked
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        sets = data.get("sets")
+        if not isinstance(sets, dict):
+            raise ValidationError("sets must be an object of set id to task list")
+
+        mode = request.GET.get("mode", "smart")
+        if mode not in WEIGHT_METHOD:
+            raise ValidationError("Invalid sort mode")
+
+        engine = request.GET.get("engine", "python")
+        if engine not in SCORING_ENGINES:
+            raise ValidationError("Invalid scoring engine")
+
         return JsonResponse({
-            "error": str(e)
-        }, status=400)
+            "mode": mode,
+            "results": analyze_sets(sets, mode, engine, as_of=as_of_date(request))
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
+
+MAX_PAGE_SIZE = 1000
+
+def page_limit(request):
+    """
+    ?limit= page size, None when the whole list is asked for.
+    A cursor alone pages with the maximum size
+    """
+    limit = request.GET.get("limit")
+    if limit is None:
+        if request.GET.get("cursor") or request.GET.get("after"):
+            return MAX_PAGE_SIZE
+        return None
+
+    if not (limit.isascii() and limit.isdigit()) or int(limit) < 1:
+        raise ValidationError("limit must be a positive integer")
+    return min(int(limit), MAX_PAGE_SIZE)
+
+# engines only analyze_db and suggest have, on top of SCORING_ENGINES
+DB_ENGINES = ("stored", "sql")
+
+def rank_db_modes(modes, engine, as_of=None):
+    """
+    Rank the stored tasks in each of modes. "stored" ranks from the
+    materialized scores, "sql" scores and orders in the database (one
+    query per mode), the other engines rerun the whole pipeline over
+    every row. Rows are read and their component scores computed once.
+    Return: ({mode: ranked}, warnings, valid_until)
+    """
+    if engine == "stored":
+        return stored_rankings(modes, as_of)
+    if engine == "sql":
+        rankings = {}
+        for mode in modes:
+            rankings[mode], warnings, _, valid_until = sql_ranking(mode, as_of)
+        return rankings, warnings, valid_until
+
+    tasks = load_tasks()
+    return rank_loaded_modes(tasks, modes, engine, as_of, dependency_index().depths)
+
+def rank_loaded_modes(tasks, modes, engine, as_of=None, depths=None):
+    """
+    depths: of the stored graph when tasks are every stored task,
+    otherwise the cycle check computes them
+    """
+    tasks, warnings = validate_tasks(tasks, require_id=True, as_of=as_of)
+
+    graph = build_graph(tasks)
+    if depths is None:
+        depths = detect_cycle(graph)
+
+    rankings = MULTI_MODE_ENGINES[engine](tasks, graph, modes, depths, as_of)
+    return rankings, warnings, ranking_expires(tasks, as_of)
+
+def top_db_tasks(mode, engine, k, as_of=None):
+    """
+    Best k executable tasks, only tasks without dependencies get scored.
+    Return: (top, warnings, valid_until)
+    """
+    if engine == "stored":
+        return stored_top_k(mode, k, as_of)
+    if engine == "sql":
+        return sql_top_k(mode, k, as_of)
+
+    tasks = load_tasks()
+    return top_loaded_tasks(tasks, mode, engine, k, as_of, dependency_index().depths)
+
+def top_loaded_tasks(tasks, mode, engine, k, as_of=None, depths=None):
+    """
+    Return: (top, warnings for the top tasks, valid_until), like stored_top_k
+    """
+    as_of = as_of or date.today()
+    tasks, _ = validate_tasks(tasks, require_id=True, as_of=as_of)
+
+    graph = build_graph(tasks)
+    if depths is None:
+        depths = detect_cycle(graph)
+
+    # only the executable tasks compete for the top k
+    valid_until = ranking_expires([t for t in tasks if not t.dependencies], as_of)
+
+    if engine == "python":
+        top = top_executable(tasks, mode, k, as_of)
+    else:
+        ranked = SCORING_ENGINES[engine](tasks, graph, mode, depths, as_of)
+        top = [t for t in ranked if t["depth"] == 0][:k]
+    return top, due_warnings(top, as_of), valid_until
+
+def table_etag(request, *args, **kwargs):
+    """
+    Changes with every write to the tasks, every day (urgency moves with
+    the date), with the weights of the modes (register_weight_mode) and
+    with the query string (mode, engine, as_of, page...), so
+    a matching If-None-Match is answered 304 without scoring anything.
+    Runs before every database backed GET, so it is also where queued
+    tasks get written out first (ingest.flush)
+    """
+    ingest.flush()
+    query = urlencode(sorted(request.GET.items()))
+    return (f"{table_version()}-{date.today().isoformat()}-{weights_digest(WEIGHT_METHOD)}"
+            f"-{hashlib.sha1(query.encode()).hexdigest()[:16]}")
+
+def db_ranking_query(request):
+    """
+    ?mode= and ?engine= of analyze_db.
+    Return: (modes, multiple, engine)
+    """
+    modes, multiple = request_modes(request, "Invalid sorting mode")
+    engine = request.GET.get("engine", "stored")
+    if engine not in DB_ENGINES and engine not in SCORING_ENGINES:
+        raise ValidationError("Invalid scoring engine")
+    return modes, multiple, engine
+
+def db_ranking_options(request, multiple, engine):
+    """
+    The rest of analyze_db's query string, read once there are tasks.
+    Return: (fmt, dates, as_of, limit), raises ValidationError
+    """
+    fmt, dates = response_format(request)
+    as_of = as_of_date(request)
+    limit = page_limit(request)
+    if limit is not None:
+        if multiple:
+            raise ValidationError("Pagination ranks one mode at a time")
+        if engine not in DB_ENGINES:
+            raise ValidationError("Pagination needs the stored or sql engine")
+        if engine == "stored" and as_of != date.today():
+            raise ValidationError("Pagination with the stored engine is only available as of today")
+    return fmt, dates, as_of, limit
+
+def db_page(request, mode, engine, as_of, limit):
+    """
+    One page of the ranking, read off the database.
+    Return: (ranked, warnings, next cursor, valid_until)
+    """
+    if engine == "sql":
+        return sql_ranking(mode, as_of, limit, request.GET.get("cursor"))
+    return stored_page(mode, limit, request.GET.get("cursor"))
+
+def page_response(mode, page, fmt, dates):
+    ranked, warnings, next_cursor, valid_until = page
+    header = {"mode": mode, "warnings": warnings, "valid_until": iso(valid_until)}
+    with stage("serialize"):
+        if fmt == "columnar":
+            return columnar_response({**header, "next": next_cursor}, ranked, dates)
+        return JsonResponse({
+            **header,
+            "ranked_tasks": ranked,
+            "next": next_cursor
+        })
+
+def db_rankings_response(modes, multiple, result, fmt, dates):
+    """
+    Response of rank_db_modes' result, several modes or one
+    """
+    rankings, warnings, valid_until = result
+    if multiple:
+        return rankings_response({"warnings": warnings, "valid_until": iso(valid_until)}, rankings, fmt, dates)
+
+    mode = modes[0]
+    header = {"mode": mode, "warnings": warnings, "valid_until": iso(valid_until)}
+    with stage("serialize"):
+        if fmt == "columnar":
+            return columnar_response(header, rankings[mode], dates)
+        return JsonResponse({
+            **header,
+            "ranked_tasks": rankings[mode]
+        })
+
+def db_ranking_response(request, modes, multiple, engine):
+    """
+    Body of analyze_db once there are tasks: the ranking, a page of it or
+    several modes. Raises ValidationError
+    """
+    fmt, dates, as_of, limit = db_ranking_options(request, multiple, engine)
+    if limit is not None:
+        return page_response(modes[0], db_page(request, modes[0], engine, as_of, limit), fmt, dates)
+    return db_rankings_response(modes, multiple, rank_db_modes(modes, engine, as_of), fmt, dates)
 
 @csrf_exempt
+@cache_control(no_cache=True)
+@condition(etag_func=table_etag)
 def analyze_db(request):
     if request.method != "GET":
         return JsonResponse({"error": "Only GET allowed"}, status=405)
 
-    mode = request.GET.get("mode", "smart")
-    ALLOWED = {"smart", "fastest", "impact", "deadline"}
-    if mode not in ALLOWED:
-        return JsonResponse({"error": "Invalid sorting mode"}, status=400)
+    try:
+        modes, multiple, engine = db_ranking_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     
     db_data = Task.objects.all()
 
     if not db_data.exists():
         return JsonResponse({"ranked_tasks": [], "message": "No tasks available"}, status=200)
 
-    data = [
-        {
-            "id": t.id,
-            "title": t.title,
-            "due_date": t.due_date,
-            "estimated_hours": t.estimated_hours,
-            "importance": t.importance,
-            "dependencies": t.dependencies
-        }
-        for t in db_data
-    ]
-
     try:
-        tasks, warnings = validate_tasks(data, require_id=True)
-
-        graph = build_graph(tasks)
-        detect_cycle(graph)
-
-        ranked = score_tasks(tasks, graph, mode)
-    
-        return JsonResponse({
-            "mode": mode,
-            "warnings": warnings,
-            "ranked_tasks": ranked
-        })
+        return db_ranking_response(request, modes, multiple, engine)
     except ValidationError as e:
         return JsonResponse({"error": str(e)}, status=400)
+    except CycleError as e:
+        # a cycle stored around the checks, only rankings need a DAG
+        return JsonResponse({"error": f"Circular dependency detected: {e}"}, status=400)
 
     except Exception as e:
         return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
 
+def suggest_query(request):
+    """
+    ?mode=, ?engine= and ?k= of suggest.
+    Return: (mode, engine, k)
+    """
+    mode = request.GET.get("mode", "smart")
+    if mode not in WEIGHT_METHOD:
+        raise ValidationError("Invalid sorting mode")
+
+    engine = request.GET.get("engine", "stored")
+    if engine not in DB_ENGINES and engine not in SCORING_ENGINES:
+        raise ValidationError("Invalid scoring engine")
+
+    return mode, engine, suggestion_count(request)
+
+def suggest_response(request, mode, engine, k):
+    """
+    Body of suggest once there are tasks. Raises ValidationError
+    """
+    return suggest_body(mode, k, *top_db_tasks(mode, engine, k, as_of_date(request)))
+
+def suggest_body(mode, k, top, warnings, valid_until):
+    # send top k (3 by default), still under top_<k> too for older clients
+    return JsonResponse({
+        "mode": mode,
+        "k": k,
+        "warnings": warnings,
+        "valid_until": iso(valid_until),
+        "top": top,
+        f"top_{k}": top
+    })
+
 @csrf_exempt
+@cache_control(no_cache=True)
+@condition(etag_func=table_etag)
 def suggest_tasks(request):
 
     if request.method != "GET":
@@ -191,65 +640,139 @@ def suggest_tasks(request):
             "error": "Only GET method allowed"
         })
     
-    mode = request.GET.get("mode", "smart")
-    ALLOWED = {"smart", "fastest", "impact", "deadline"}
-    if mode not in ALLOWED:
-        return JsonResponse({"error": "Invalid sorting mode"}, status=400)
+    try:
+        mode, engine, k = suggest_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     
     db_data = Task.objects.all()
     if not db_data.exists():
-        return JsonResponse({"top_3": [], "message": "No tasks available"}, status=200)
+        return JsonResponse({"k": k, "top": [], f"top_{k}": [], "message": "No tasks available"}, status=200)
 
+    try:
+        return suggest_response(request, mode, engine, k)
 
-    data = [
-        {
-            "id": t.id,
-            "title": t.title,
-            "due_date": t.due_date,
-            "estimated_hours": t.estimated_hours,
-            "importance": t.importance,
-            "dependencies": t.dependencies
-        }
-        for t in db_data
-    ]
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except CycleError as e:
+        return JsonResponse({"error": f"Circular dependency detected: {e}"}, status=400)
 
+    except Exception as e:
+        return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
+    
+def plan_start(request, as_of):
+    """
+    ?start=YYYY-MM-DD, the first day of the plan (as_of by default)
+    """
+    start = request.GET.get("start")
+    if start is None:
+        return as_of
     try:
-        tasks, warnings = validate_tasks(data, require_id=True)
+        return date.fromisoformat(start)
+    except ValueError:
+        raise ValidationError("start must be a date (YYYY-MM-DD)")
 
-        graph = build_graph(tasks)
-        detect_cycle(graph)
+@csrf_exempt
+@cache_control(no_cache=True)
+@condition(etag_func=table_etag)
+def plan_tasks(request):
+    """
+    Every stored task laid out over days of ?hours_per_day= (8 by default),
+    each after its dependencies and in the order of the mode, with the
+    critical path of the backlog
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET allowed"}, status=405)
 
-        ranked = score_tasks(tasks, graph, mode)
+    mode = request.GET.get("mode", "smart")
+    if mode not in WEIGHT_METHOD:
+        return JsonResponse({"error": "Invalid sorting mode"}, status=400)
 
-        executable = [t for t in ranked if t["depth"] == 0]
+    hours_per_day = request.GET.get("hours_per_day", "8")
+    if not (hours_per_day.isascii() and hours_per_day.isdigit()) or not 1 <= int(hours_per_day) <= MAX_HOURS_PER_DAY:
+        return JsonResponse({"error": f"hours_per_day must be a whole number of hours from 1 to {MAX_HOURS_PER_DAY}"}, status=400)
+    hours_per_day = int(hours_per_day)
 
-        # send top 3
-        return JsonResponse({
-            "mode": mode,
-            "warnings": warnings,
-            "top_3": executable[:3]
-        })
+    if not Task.objects.exists():
+        return JsonResponse({"days": {"hours": [], "ends": [], "tasks": []}, "message": "No tasks available"}, status=200)
+
+    try:
+        as_of = as_of_date(request)
+        start = plan_start(request, as_of)
+        plan, warnings, valid_until = stored_plan(mode, hours_per_day, start, as_of)
+
+        with stage("serialize"):
+            return JsonResponse({
+                "mode": mode,
+                "hours_per_day": hours_per_day,
+                "start": start,
+                "warnings": warnings,
+                "valid_until": iso(valid_until),
+                **plan
+            })
 
     except ValidationError as e:
         return JsonResponse({"error": str(e)}, status=400)
+    except CycleError as e:
+        return JsonResponse({"error": f"Circular dependency detected: {e}"}, status=400)
 
     except Exception as e:
         return JsonResponse({"error": "Internal server error", "detail": str(e)}, status=500)
-    
+
 @csrf_exempt
 def clear_tasks(request):
     if request.method != "POST":
         return JsonResponse({"error": "Only POST allowed"}, status=405)
 
-    Task.objects.all().delete()
+    # tasks queued before the clear go with it
+    ingest.flush()
+    with transaction.atomic():
+        Task.objects.all().delete()
+        tasks_cleared(bump_version())
     return JsonResponse({"message": "All tasks cleared"})
 
+def list_query(request):
+    """
+    ?limit= and ?after= of list.
+    Return: (limit, after), each None when not given
+    """
+    limit = page_limit(request)
+    after = request.GET.get("after")
+    if after is not None and not (after.isascii() and after.isdigit()):
+        raise ValidationError("after must be a task id")
+    return limit, int(after) if after else None
+
+def list_response(limit, after):
+    if limit is None:
+        return JsonResponse({"tasks": load_tasks()})
+
+    tasks, next_after = list_page(limit, after)
+    return JsonResponse({"tasks": tasks, "next": next_after})
+
 @csrf_exempt
+@cache_control(no_cache=True)
+@condition(etag_func=table_etag)
 def list_tasks(request):
     if request.method != "GET":
         return JsonResponse({"error": "Only GET allowed"}, status=405)
 
-    data = list(Task.objects.values(
-        "id", "title", "due_date", "estimated_hours", "importance", "dependencies"
-    ))
-    return JsonResponse({"tasks": data})
\ No newline at end of file
+    try:
+        limit, after = list_query(request)
+    except ValidationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return list_response(limit, after)
+
+
+def metrics(request):
+    """
+    Per endpoint latency histograms and stage timings of this process
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET allowed"}, status=405)
+
+    return JsonResponse({
+        "enabled": getattr(settings, "TASK_TIMING", False),
+        "endpoints": snapshot(),
+        "analysis_cache": cache_stats(),
+        "write_behind": ingest.stats()
+    })